@@ -2,6 +2,7 @@ from . import activity
 from . import anesthesia
 from . import staffing
 from . import utils
+from . import parallel
 from . import stats
 from . import viz
 
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+from .utils import sweep_concurrency, merge_intervals
+
+
+class ActivityArray(object):
+    """
+    Compact, array-backed representation of activity spans, meant to sit beneath an ActivityDataSet.
+
+    Holds:
+        * starts and ends, as int64 nanoseconds since the epoch (missing values are numpy's NaT sentinel)
+        * codes, a dictionary of int32 category codes per categorical column (e.g. activity or strata), where -1
+          marks a missing value, and categories, a dictionary of the matching category labels
+        * weights, an optional float array
+        * tz, the timezone of the start and end columns it was built from, if any; starts and ends are then UTC
+
+    Operations work on whole arrays at once, with no per-row Python objects. Building one from a DataFrame with
+    datetime64[ns] columns, and turning one back into a DataFrame, does not copy the start and end data.
+    """
+
+    __slots__ = ('starts', 'ends', 'codes', 'categories', 'weights', 'tz')
+
+    def __init__(self, starts, ends, codes=None, categories=None, weights=None, tz=None):
+        """
+        :param starts: int64 (or datetime64[ns]) array of activity starts
+        :param ends: int64 (or datetime64[ns]) array of activity ends, aligned with starts
+        :param codes: optional dictionary of {column label: int32 code array}
+        :param categories: optional dictionary of {column label: array-like of labels for the codes}
+        :param weights: optional float array, aligned with starts
+        :param tz: optional timezone for to_df() to give starts and ends, which are then taken to be UTC
+        """
+        self.starts = self._as_int64(starts)
+        self.ends = self._as_int64(ends)
+        self.codes = {} if codes is None else codes
+        self.categories = {} if categories is None else categories
+        self.weights = weights
+        self.tz = tz
+
+    @staticmethod
+    def _as_int64(values):
+        values = np.asarray(values)
+        if values.dtype.kind == 'M':
+            values = values.astype('datetime64[ns]', copy=False).view(np.int64)
+        return values.astype(np.int64, copy=False)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __repr__(self):
+        return f'<ActivityArray: {len(self)} activities, categories={list(self.codes.keys())}, ' \
+               f'weighted={self.weights is not None}>'
+
+    @property
+    def start_datetimes(self):
+        return self.starts.view('datetime64[ns]')
+
+    @property
+    def end_datetimes(self):
+        return self.ends.view('datetime64[ns]')
+
+    @classmethod
+    def from_df(cls, df, start_col='activity_start', end_col='activity_end', category_cols=(), weight_col=None):
+        """
+        Build an ActivityArray from DataFrame df. Start and end columns are viewed, not copied, when they are already
+        datetime64[ns] (timezone-aware columns are held as UTC, with their timezone kept in tz); category columns are
+        factorized in order of first appearance.
+        """
+        codes = {}
+        categories = {}
+        for c in category_cols:
+            column_codes, column_categories = pd.factorize(df[c], sort=False)
+            codes[c] = column_codes.astype(np.int32, copy=False)
+            categories[c] = column_categories
+
+        weights = None
+        if weight_col is not None:
+            weights = df[weight_col].values.astype(np.float64, copy=False)
+
+        return cls(df[start_col].values, df[end_col].values, codes=codes, categories=categories, weights=weights,
+                   tz=getattr(df[start_col].dtype, 'tz', None))
+
+    def to_df(self, start_col='activity_start', end_col='activity_end', weight_col='weight'):
+        """
+        A DataFrame over the same memory: start and end columns are datetime64[ns] views of the held arrays (in tz,
+        if set), and category columns are pandas Categoricals over the held codes.
+        """
+        data = {
+            start_col: self._localized(self.start_datetimes),
+            end_col: self._localized(self.end_datetimes)
+        }
+        for c, column_codes in self.codes.items():
+            data[c] = pd.Categorical.from_codes(column_codes, categories=self.categories[c])
+
+        if self.weights is not None:
+            data[weight_col] = self.weights
+
+        return pd.DataFrame(data, copy=False)
+
+    def _localized(self, values):
+        if self.tz is None:
+            return values
+
+        return pd.arrays.DatetimeArray(values, dtype=pd.DatetimeTZDtype(tz=self.tz))
+
+    def _replace(self, starts=None, ends=None):
+        """
+        A new ActivityArray sharing everything but the replaced starts or ends.
+        """
+        return type(self)(
+            self.starts if starts is None else starts,
+            self.ends if ends is None else ends,
+            codes=self.codes,
+            categories=self.categories,
+            weights=self.weights,
+            tz=self.tz
+        )
+
+    def group_codes(self, category_cols):
+        """
+        One int64 group code per row for the combination of codes in category_cols, numbered in order of first
+        appearance; rows missing any of them get -1.
+        """
+        combined = np.zeros(len(self), dtype=np.int64)
+        missing = np.zeros(len(self), dtype=bool)
+        for c in category_cols:
+            column_codes = self.codes[c].astype(np.int64)
+            missing |= column_codes < 0
+            # refactorize after each column so the combined codes stay below len(self) * (number of categories + 1)
+            combined = pd.factorize(combined * (len(self.categories[c]) + 1) + column_codes + 1, sort=False)[0]
+
+        group_codes = np.full(len(self), -1, dtype=np.int64)
+        group_codes[~missing] = pd.factorize(combined[~missing], sort=False)[0]
+        return group_codes
+
+    def concurrency_at(self, points, include_left=True, include_right=False):
+        """
+        Number of activities underway at each of points, or the sum of their weights if this ActivityArray holds
+        weights; see activity.utils.sweep_concurrency().
+        """
+        return sweep_concurrency(self.start_datetimes, self.end_datetimes, points,
+                                 include_left=include_left, include_right=include_right, weights=self.weights)
+
+    def merge(self, by=None, merge_gap=None):
+        """
+        Unduplicate overlapping activities within each combination of the category columns in by; see
+        activity.utils.merge_intervals().
+
+        :return: a new ActivityArray of merged spans, carrying the codes of the columns in by
+        """
+        by = [] if by is None else list(by)
+        group_codes = self.group_codes(by) if by else None
+
+        merged_codes, starts, ends = merge_intervals(self.start_datetimes, self.end_datetimes,
+                                                     group_codes=group_codes, merge_gap=merge_gap)
+
+        codes = {}
+        if by:
+            # the codes of each merged span are those of the first row in its group
+            unique_codes, first_rows = np.unique(group_codes, return_index=True)
+            first_rows = first_rows[unique_codes >= 0]
+            codes = {c: self.codes[c][first_rows[merged_codes]] for c in by}
+
+        return type(self)(starts, ends, codes=codes, categories={c: self.categories[c] for c in by}, tz=self.tz)
+
+    def offset(self, td_offset, apply_to_start=True):
+        """
+        A new ActivityArray with td_offset added to starts (or, if apply_to_start is False, to ends).
+        """
+        td_offset = pd.to_timedelta(td_offset).to_timedelta64()
+        if apply_to_start:
+            return self._replace(starts=self._as_int64(self.start_datetimes + td_offset))
+        else:
+            return self._replace(ends=self._as_int64(self.end_datetimes + td_offset))
+
+    def cap_duration(self, maximum_duration):
+        """
+        A new ActivityArray where ends are moved back to start + maximum_duration wherever an activity lasts longer.
+
+        :param maximum_duration: timedelta-like, or an array of one per activity (NaT for no limit)
+        """
+        maximum_duration = np.asarray(pd.to_timedelta(maximum_duration), dtype='timedelta64[ns]')
+        starts, ends = self.start_datetimes, self.end_datetimes
+        too_long = (ends - starts) > maximum_duration
+        return self._replace(ends=self._as_int64(np.where(too_long, starts + maximum_duration, ends)))
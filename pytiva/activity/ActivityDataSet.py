@@ -1,15 +1,22 @@
-import itertools
-import multiprocessing
-import os
+import inspect
+from functools import partial
 
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
-from .utils import value_between_row_values, check_start_of_concurrent_activity, check_end_of_concurrent_activity
+from .utils import value_between_row_values, check_start_of_concurrent_activity, check_end_of_concurrent_activity, \
+    iter_chunked_concurrency, iter_merged_chunks, chunk_rows_for_memory_budget, stratified_sweep_concurrency, \
+    exceedance_episodes, top_peaks, time_at_level, interval_set_operation, overlap_pairs, distinct_key_concurrency, \
+    pairwise_overlap, _stratified_sweep_batch
+from .ActivityArray import ActivityArray
+from .ActivityIntervalIndex import ActivityIntervalIndex
+from .ConcurrencyDeltaMap import ConcurrencyDeltaMap
+from ..utils import iter_strata, content_fingerprint
+from ..parallel import Executor, EXECUTOR, PROCESS_EXECUTOR
 from ..viz import activity_data_to_gantt_data, gantt_plot
 
-from ..dataset import DataSet
+from ..dataset import DataSet, RunLengthSeries, TimeSeriesPyramid
 
 
 class ActivityDataSet(DataSet):
@@ -30,10 +37,25 @@ class ActivityDataSet(DataSet):
     _datetime_columns = [_activity_start_col, _activity_end_col]
     _concurrency_ts_start_col = 'is_start'
     _concurrency_ts_end_col = 'is_end'
+    _concurrency_count_col = 'concurrent_activity_count'
+    _concurrency_weight_col = 'concurrent_activity_weight'
     _ts_index_label = 'timestamp'
 
     _forbidden_columns = []#['duration']
 
+    # optional pytiva.utils.ResultCache memoizing concurrency_ts(), distinct_concurrency() and
+    # fetch_unduplicated_concurrency() by content, e.g. pytiva.utils.RESULT_CACHE; None (default) always recomputes
+    _result_cache = None
+
+    # built lazily from self._df and dropped whenever self._df changes; see _invalidate_derived()
+    _interval_index = None
+    _interval_index_source = None
+    _concurrency_deltas = None
+
+    # the held DataFrame, and frames appended by add_activities() since it was last read; see _df
+    _df_held = None
+    _df_pending = None
+
     def __init__(
             self,
             data,
@@ -46,12 +68,8 @@ class ActivityDataSet(DataSet):
 
         super_init_return_val = super().__init__(data=data, *args, **kwargs)
 
-        self._df[self._activity_start_col] = self._df[self._activity_start_col].apply(
-            lambda x: x.floor(self._default_resolution)
-        )
-        self._df[self._activity_end_col] = self._df[self._activity_end_col].apply(
-            lambda x: x.ceil(self._default_resolution)
-        )
+        self._df[self._activity_start_col] = self._df[self._activity_start_col].dt.floor(self._default_resolution)
+        self._df[self._activity_end_col] = self._df[self._activity_end_col].dt.ceil(self._default_resolution)
 
         if generate_duration_on_init:
             self.generate_duration()
@@ -61,23 +79,235 @@ class ActivityDataSet(DataSet):
 
         self._resort_columns()
 
+    def _derived(self, df):
+        """
+        As DataSet._derived(), with the index reset and the columns sorted as __init__() leaves them.
+        """
+        return super()._derived(df.reset_index(drop=True))._resort_columns()
+
+    @property
+    def _df(self):
+        """
+        The held DataFrame. Activities appended by add_activities() are concatenated onto it only when it is next
+        read, all at once, so that appending repeatedly does not copy every earlier row each time.
+        """
+        if self._df_pending:
+            held = pd.concat([self._df_held] + self._df_pending, ignore_index=True)
+            super().__setattr__('_df_held', held)
+            super().__setattr__('_df_pending', None)
+
+        return self._df_held
+
+    @_df.setter
+    def _df(self, value):
+        super().__setattr__('_df_held', value)
+        super().__setattr__('_df_pending', None)
+
+    def __setattr__(self, name, value):
+        # reassigning the held DataFrame (e.g. by limit_by_list()), or its activity start or end column through
+        # DataSet.__setattr__() (e.g. ds.activity_end = ...), makes anything derived from it stale
+        if name in ('_df', self._activity_start_col, self._activity_end_col):
+            self._invalidate_derived()
+
+        super().__setattr__(name, value)
+
+    def _invalidate_derived(self):
+        """
+        Drop structures built from self._df, so they are rebuilt on next use. Call this after changing self._df in
+        place.
+        """
+        super().__setattr__('_interval_index', None)
+        super().__setattr__('_concurrency_deltas', None)
+
+    @property
+    def interval_index(self):
+        """
+        An ActivityIntervalIndex over the activity start and end columns, built on first use, and built again if
+        either column has since been replaced, e.g. by self._df[activity_start] = ... (values changed inside the
+        same column still need _invalidate_derived()).
+        """
+        source = (self._df[self._activity_start_col].values, self._df[self._activity_end_col].values)
+        built_from = self._interval_index_source
+        if self._interval_index is None or built_from is None \
+                or not all(len(a) == len(b) and np.may_share_memory(a, b) for a, b in zip(built_from, source)):
+            self._interval_index = ActivityIntervalIndex(*source)
+            self._interval_index_source = source
+
+        return self._interval_index
+
+    def active_at(self, ts):
+        """
+        Row positions (for use with .iloc) of activities underway at ts, i.e. activity_start <= ts < activity_end.
+        """
+        return self.interval_index.active_at(ts)
+
+    def overlapping(self, start, end):
+        """
+        Row positions (for use with .iloc) of activities sharing any time with the window [start, end).
+        """
+        return self.interval_index.overlapping(start, end)
+
+    @property
+    def concurrency_deltas(self):
+        """
+        A ConcurrencyDeltaMap over the activity start and end columns, built on first use and then kept up to date by
+        add_activities() and remove_activities().
+        """
+        if self._concurrency_deltas is None:
+            self._concurrency_deltas = ConcurrencyDeltaMap(
+                self._df[self._activity_start_col].values,
+                self._df[self._activity_end_col].values
+            )
+
+        return self._concurrency_deltas
+
+    def add_activities(self, data):
+        """
+        Append activities to this DataSet. The new rows are only concatenated onto the held DataFrame when it is next
+        read (see _df), and if concurrency_deltas has been built, it is updated for just the new activities rather
+        than rebuilt. Passing the returned time as concurrency_ts(start=...) then gives the part of the series the new
+        activities can have changed, without reading the rest.
+
+        :param data: anything ActivityDataSet() accepts, e.g. a DataFrame with activity_start and activity_end columns
+        :return: the earliest activity start among the new activities (NaT if there is none), from which concurrency
+            may have changed
+        """
+        added = self._self_type(data, default_resolution=self._default_resolution)
+        super().__setattr__('_df_pending', (self._df_pending or []) + [added._df])
+        super().__setattr__('_interval_index', None)
+
+        if self._concurrency_deltas is not None:
+            self._concurrency_deltas.add(added[self._activity_start_col].values, added[self._activity_end_col].values)
+
+        return added[self._activity_start_col].min()
+
+    def remove_activities(self, mask):
+        """
+        Remove the activities selected by boolean mask (aligned with the rows of this DataSet). As with
+        add_activities(), concurrency_deltas is updated rather than rebuilt.
+
+        :param mask: boolean array-like, True for rows to remove
+        :return: removed items, in an object of the same type as self
+        """
+        mask = np.asarray(mask, dtype=bool)
+        removed = self._df.loc[mask]
+        deltas = self._concurrency_deltas
+
+        self._df = self._df.loc[~mask].reset_index(drop=True)
+
+        if deltas is not None:
+            deltas.remove(removed[self._activity_start_col].values, removed[self._activity_end_col].values)
+            self._concurrency_deltas = deltas
+
+        return self._derived(removed.reset_index(drop=True))
+
+    def to_activity_array(self, category_cols=(), weight_col=None):
+        """
+        An ActivityArray over this data. Activity start and end columns are shared rather than copied.
+
+        :param category_cols: optional collection of column labels to carry along as category codes, e.g. strata
+        :param weight_col: optional label of a numeric column to carry along as weights
+        :return: ActivityArray
+        """
+        return ActivityArray.from_df(self._df, self._activity_start_col, self._activity_end_col,
+                                     category_cols=category_cols, weight_col=weight_col)
+
+    @classmethod
+    def from_activity_array(cls, activity_array, default_resolution='1Min', generate_duration_on_init=True):
+        """
+        Build an object of this type around an ActivityArray without copying or revalidating its start and end data;
+        category columns come back as pandas Categoricals.
+        """
+        ds = cls.from_validated(activity_array.to_df(cls._activity_start_col, cls._activity_end_col),
+                                _default_resolution=default_resolution)
+
+        if generate_duration_on_init:
+            ds.generate_duration()
+
+        return ds
+
     def generate_duration(self):
         self._df[self._duration_col] = self._df[self._activity_end_col] - self._df[self._activity_start_col]
         pass
 
     def apply_offset(self, td_offset, apply_to_start=True, regenerate_duration=True):
-        if apply_to_start:
-            self._df[self._activity_start_col] = self._df[self._activity_start_col] + td_offset
-        else:
-            self._df[self._activity_end_col] = self._df[self._activity_end_col] + td_offset
+        column = self._activity_start_col if apply_to_start else self._activity_end_col
+        shifted = self.to_activity_array().offset(td_offset, apply_to_start=apply_to_start)
+        # .array keeps any timezone, which .values would drop
+        self._df[column] = shifted.to_df(self._activity_start_col, self._activity_end_col)[column].array
+
+        self._invalidate_derived()
 
         if regenerate_duration:
             self.generate_duration()
 
         pass
 
-    def enforce_maximum_duration(self, maximum_duration, regenerate_duration=True):
-        self._df.loc[self._df['duration'] > maximum_duration, 'activity_end'] = self._df['activity_start'].apply(lambda x: x + maximum_duration)
+    def _duration_limits(self, maximum_duration=None, by=None, quantile=None, factor=1, lookup=None, on='case_id'):
+        """
+        Largest allowed duration for each row as an array of timedelta64 (NaT where there is no limit); see
+        enforce_maximum_duration(). Group quantiles come from one groupby over group codes and are broadcast back to
+        rows by indexing with those codes.
+        """
+        if by is None:
+            codes = np.zeros(len(self._df), dtype=np.int64)
+            keys = [None]
+        else:
+            by = [by] if isinstance(by, str) else list(by)
+            df_strata = pd.DataFrame({c: self._stratum_values(c, lookup=lookup, on=on) for c in by})
+            codes = df_strata.groupby(by, sort=False, dropna=False).ngroup().values
+            _, first_rows = np.unique(codes, return_index=True)
+            keys = list(df_strata.iloc[first_rows].itertuples(index=False, name=None))
+            keys = [k[0] for k in keys] if len(by) == 1 else keys
+
+        limits = np.full(len(keys), np.nan)
+
+        if quantile is not None:
+            durations = (self._df[self._activity_end_col] - self._df[self._activity_start_col]).values
+            durations = np.where(np.isnat(durations), np.nan, durations.astype(np.int64).astype(np.float64))
+            group_quantiles = pd.Series(durations).groupby(codes).quantile(quantile)
+            limits[group_quantiles.index.values] = group_quantiles.values * factor
+
+        if isinstance(maximum_duration, dict):
+            if by is None:
+                raise Exception('maximum_duration can only be given per group when by is given')
+            given = pd.to_timedelta(pd.Series([maximum_duration.get(k) for k in keys], dtype=object)).values
+            given = np.where(np.isnat(given), np.nan, given.astype(np.int64).astype(np.float64))
+            limits = np.fmin(limits, given)
+        elif maximum_duration is not None:
+            limits = np.fmin(limits, float(pd.to_timedelta(maximum_duration).value))
+
+        row_limits = limits[codes]
+        return np.where(np.isnan(row_limits), np.timedelta64('NaT', 'ns'),
+                        np.nan_to_num(row_limits).astype(np.int64).astype('timedelta64[ns]'))
+
+    def enforce_maximum_duration(self, maximum_duration=None, regenerate_duration=True, *, by=None, quantile=None,
+                                 factor=1, lookup=None, on='case_id'):
+        """
+        Move activity ends back so that no activity lasts longer than a maximum duration, either one for all
+        activities or one per group of activities sharing values of the by columns (e.g. per location or procedure).
+
+        Where both maximum_duration and quantile are given, the smaller limit applies.
+
+        :param maximum_duration: optional timedelta-like limit; with by, optionally a dict of limits per group key
+            (a tuple of values when there are several by columns), groups without a key being left uncapped
+        :param regenerate_duration:
+        :param by: keyword only; optional column label or list of labels to cap within, from this DataSet or lookup
+        :param quantile: optional quantile of durations (within each group, if by is given) to cap at
+        :param factor: multiplier applied to the quantile limit
+        :param lookup: optional DataFrame to find by columns missing from this DataSet in, e.g. cases by case_id
+        :param on: label of the column matching rows of this DataSet to rows of lookup
+        """
+        if maximum_duration is None and quantile is None:
+            raise Exception('enforce_maximum_duration() needs a maximum_duration, a quantile or both')
+
+        limits = self._duration_limits(maximum_duration=maximum_duration, by=by, quantile=quantile, factor=factor,
+                                       lookup=lookup, on=on)
+        # NaT limits leave activities uncapped; .array keeps any timezone, which .values would drop
+        capped = self.to_activity_array().cap_duration(limits)
+        self._df[self._activity_end_col] = capped.to_df(self._activity_start_col,
+                                                        self._activity_end_col)[self._activity_end_col].array
+        self._invalidate_derived()
 
         if regenerate_duration:
             self.generate_duration()
@@ -109,9 +339,10 @@ class ActivityDataSet(DataSet):
 
         return date_range
 
-    # TODO: functools.partial
-    def _mp_concurrency_helper(self, args):
-        data_df, datetime, column_left, column_right, func, ts_index_label = args
+    @staticmethod
+    def _mp_concurrency_helper(frame, column_left, column_right, func, ts_index_label, datetime):
+        # runs in a worker, reading the activities published once in SharedFrame frame
+        data_df = frame.to_df()
 
         # filter to the concurrent records of interest
         df_filter = data_df.apply(
@@ -135,7 +366,8 @@ class ActivityDataSet(DataSet):
             column_right = _activity_end_col,
             func = value_between_row_values,
             limit = None,
-            mp = True
+            mp = True,
+            executor = None
     ):
         """
         :param date_range:
@@ -143,7 +375,10 @@ class ActivityDataSet(DataSet):
         :param column_right:
         :param func:
         :param limit:
-        :param mp:
+        :param mp: spread timestamps over worker processes (unless executor is given): those of
+            pytiva.parallel.EXECUTOR if it has been switched to a parallel mode, otherwise a pool started for this
+            call and shut down after it
+        :param executor: optional pytiva.parallel.Executor to use instead; func must be picklable in 'process' mode
         :return:
         """
         concurrency_collection = []
@@ -156,14 +391,16 @@ class ActivityDataSet(DataSet):
         if limit is None:
             limit = len(date_range)
 
-        if mp:
-            # iterable for data_df, datetime, column_left, column_right, func , ts_index_label
-            # note to self: do not pass self
-            concurrency_iterator = [(self._df, datetime, column_left, column_right, func, self._ts_index_label)
-                                    for datetime in date_range[:limit]]
+        if executor is None and mp:
+            # the process pool is started on first use and kept for later calls
+            executor = EXECUTOR if EXECUTOR.parallel else PROCESS_EXECUTOR
 
-            with multiprocessing.Pool(processes=os.cpu_count()-1) as pool:
-                concurrency_collection = pool.map(self._mp_concurrency_helper, concurrency_iterator)
+        if executor is not None:
+            # publish the activities once, rather than pickling them into the task for every timestamp
+            with executor.share(self._df) as frame:
+                helper = partial(self._mp_concurrency_helper, frame, column_left, column_right, func,
+                                 self._ts_index_label)
+                concurrency_collection = executor.map(helper, list(date_range[:limit]))
         else:
             for d in tqdm(date_range[:limit]):
                 # TODO: multithread this, perhaps separate out a generator from the rest to hand off
@@ -183,84 +420,595 @@ class ActivityDataSet(DataSet):
 
         return concurrency_collection
 
-    def concurrency_ts(self, resolution=None, *args, **kwargs):
+    def _sweep_concurrency(
+            self,
+            date_range=None,
+            column_left=_activity_start_col,
+            column_right=_activity_end_col,
+            include_left=True,
+            include_right=False,
+            limit=None,
+            weight_col=None
+    ):
+        """
+        Same result as _collect_concurrency() with value_between_row_values(), but counted with
+        activity.utils.sweep_concurrency() over sorted start and end events rather than row-by-row.
+
+        With weight_col, returns the sum of that column over the activities underway at each timestamp instead.
+
+        :param date_range: timestamps at which to count; by default, every activity start and end point
+        :param column_left: label of the column holding interval starts
+        :param column_right: label of the column holding interval ends
+        :param include_left: count an activity at exactly its start
+        :param include_right: count an activity at exactly its end
+        :param limit: only count the first limit timestamps in date_range
+        :param weight_col: optional label of a numeric column to sum, e.g. capacity or effort
+        :return: a DataFrame with a timestamp column and a concurrent activity count (or weight) column
         """
+        if date_range is None:
+            date_range = self._date_range_from_start_and_end_points()
 
-        :param resolution:
-        :param args:
-        :param kwargs:
-        :return:
+        if limit is None:
+            limit = len(date_range)
+
+        points = pd.Series(date_range[:limit]).reset_index(drop=True)
+
+        # counted from the columns as they are now, rather than from concurrency_deltas, which changes to self._df in
+        # place would leave stale; concurrency_ts(start=...) reads the maintained delta map instead
+        activity_array = ActivityArray.from_df(self._df, column_left, column_right, weight_col=weight_col)
+        concurrency = activity_array.concurrency_at(
+            points.values,
+            include_left=include_left,
+            include_right=include_right
+        )
+
+        return pd.DataFrame({
+            self._ts_index_label: points,
+            self._concurrency_count_col if weight_col is None else self._concurrency_weight_col: concurrency
+        })
+
+    def _cached(self, label, columns, compute, *args, **kwargs):
+        """
+        compute(), memoized in self._result_cache under a fingerprint of label, the type and default resolution of
+        self, the content of columns, and args and kwargs (the parameters of the call). Callers name every column
+        compute() reads in columns; nothing in args or kwargs is taken to be a column.
+
+        Calls with a function among their parameters (e.g. a custom func for the 'apply' engine) are never memoized,
+        since a function's repr does not identify what it computes.
+        """
+        if self._result_cache is None or any(callable(p) for p in list(args) + list(kwargs.values())):
+            return compute()
+
+        columns = [c for c in dict.fromkeys(columns) if c in self._df.columns]
+        key = content_fingerprint(
+            type(self).__name__, label, self._default_resolution, self._df[columns],
+            *args, *[p for item in sorted(kwargs.items()) for p in item]
+        )
+
+        def copy_func(result):
+            if isinstance(result, DataSet):
+                return result._derived(result._df.copy())
+            return self._result_cache._copy(result)
+
+        return self._result_cache.get_or_compute(key, compute, copy_func=copy_func)
+
+    def concurrency_ts(self, resolution=None, *args, engine='sweep', run_length=False, how=None, start=None, **kwargs):
         """
-        # by default, use the... self.default_resolution
-        cc = pd.DataFrame(self._collect_concurrency(*args, **kwargs)).set_index(self._ts_index_label)
+        Concurrent activity count at every timestamp between the earliest and latest activity start or end point,
+        spaced by resolution.
+
+        With run_length, returns the count only where it changes, as a RunLengthSeries; densify(resolution) on the
+        result gives back the dense series.
+
+        Sampling at a coarse resolution (e.g. '15Min') reports whatever count held at each timestamp, missing
+        anything shorter in between. With how, each bin of resolution instead gets the exact time-weighted mean
+        (and/or maximum and minimum) of the count over the whole bin, from the change points via
+        RunLengthSeries.resample().
+
+        :param resolution: spacing of the returned time series; by default, self._default_resolution
+        :param engine: 'sweep' (default) counts from sorted start and end events via _sweep_concurrency(); 'apply'
+            evaluates every row at every timestamp via _collect_concurrency(), and is kept for verification and for
+            custom row functions
+        :param run_length: return a RunLengthSeries of change points instead of a dense DataFrame; resolution is
+            then not used
+        :param how: optional 'mean', 'max' or 'min', giving a DataFrame indexed by bin start with that aggregation
+            in the usual column, or a list of these, giving a column named for each
+        :param start: optional time from which to return the series, e.g. as returned by add_activities(); only the
+            changes in concurrency_deltas from there onward are read. Only for plain counts from the 'sweep' engine
+            at the default resolution, and not with how
+        :param args: passed along to the engine positionally, e.g. date_range
+        :param kwargs: passed along to the engine, e.g. weight_col for a weighted sum with the 'sweep' engine
+        :return: DataFrame indexed by timestamp, or a RunLengthSeries
+        """
+        # the columns the engine reads, from its parameters
+        engine_func = {'sweep': self._sweep_concurrency, 'apply': self._collect_concurrency}.get(engine)
+        params = {} if engine_func is None else inspect.signature(engine_func).bind_partial(*args, **kwargs).arguments
+        columns = [params.get('column_left', self._activity_start_col),
+                   params.get('column_right', self._activity_end_col)]
+        if params.get('weight_col') is not None:
+            columns.append(params['weight_col'])
+
+        return self._cached(
+            'concurrency_ts', columns,
+            lambda: self._concurrency_ts(resolution, *args, engine=engine, run_length=run_length, how=how, start=start,
+                                         **kwargs),
+            resolution, *args, engine=engine, run_length=run_length, how=how, start=start, **kwargs
+        )
+
+    def _concurrency_ts(self, resolution=None, *args, engine='sweep', run_length=False, how=None, start=None,
+                        **kwargs):
+        if start is not None:
+            if engine != 'sweep' or args or kwargs or how is not None:
+                raise Exception('start is only supported for plain counts from the "sweep" engine, without how')
 
+            return self._concurrency_ts_from(start, resolution, run_length)
+
+        if engine == 'sweep':
+            cc = self._sweep_concurrency(*args, **kwargs)
+        elif engine == 'apply':
+            cc = pd.DataFrame(self._collect_concurrency(*args, **kwargs))
+        else:
+            raise Exception(f'engine must be "sweep" or "apply" (got "{engine}")')
+
+        return self._concurrency_ts_from_points(cc.set_index(self._ts_index_label), resolution, run_length, how)
+
+    def _concurrency_ts_from(self, start, resolution=None, run_length=False):
+        """
+        concurrency_ts() from start onward, read off concurrency_deltas: the count at each timestamp of the series
+        from start, or with run_length, the count at start followed by the change points after it.
+
+        The timestamps are those of the whole series, counted from the first change in concurrency_deltas, so
+        activities ending before they start are left out of the extent. Only for self._default_resolution, on which
+        every activity start and end falls, so that the count at each timestamp is the one concurrency_ts() reports.
+        """
+        if resolution is None:
+            resolution = self._default_resolution
+
+        if not run_length and resolution != self._default_resolution \
+                and pd.to_timedelta(resolution) != pd.to_timedelta(self._default_resolution):
+            raise Exception(f'start is only supported at the default resolution ({self._default_resolution}, got '
+                            f'{resolution})')
+
+        deltas = self.concurrency_deltas
+        first, last = deltas.first_time, deltas.last_time
+        start = pd.Timestamp(start).to_datetime64().astype('datetime64[ns]')
+        if len(deltas) == 0:
+            first_point = start
+        elif run_length:
+            first_point = max(start, first)
+        else:
+            step = pd.to_timedelta(resolution).to_timedelta64()
+            first_point = first + max(-(-(start - first) // step), 0) * step
+
+        if len(deltas) == 0 or first_point > last:
+            cc = pd.DataFrame({self._concurrency_count_col: np.array([], dtype=np.int64)},
+                              index=pd.DatetimeIndex([], name=self._ts_index_label))
+            return self._concurrency_ts_from_points(cc, resolution, run_length) if run_length else cc
+
+        if not run_length:
+            grid = pd.date_range(first_point, last, freq=resolution, name=self._ts_index_label)
+            return pd.DataFrame({self._concurrency_count_col: deltas.level_at(grid.values)}, index=grid)
+
+        times, levels = deltas.changes_from(first_point)
+        cc = pd.DataFrame(
+            {self._concurrency_count_col: np.concatenate([deltas.level_at([first_point]), levels])},
+            index=pd.DatetimeIndex(np.concatenate([[first_point], times]), name=self._ts_index_label)
+        )
+        return self._concurrency_ts_from_points(cc, resolution, run_length)
+
+    def _concurrency_ts_from_points(self, cc, resolution=None, run_length=False, how=None):
+        """
+        Shape a DataFrame of levels indexed by the timestamps where they are known into what concurrency_ts() returns:
+        forward-filled at resolution, aggregated per bin of resolution, or a RunLengthSeries.
+        """
         if resolution is None:
             resolution = self._default_resolution
 
+        if run_length or how is not None:
+            if run_length and how is not None:
+                raise Exception('run_length and how cannot be combined; use how with the default run_length=False')
+
+            cc = cc.sort_index()
+            value_col = cc.columns[0]
+            series = RunLengthSeries(cc.index.values, cc[value_col].values, end=cc.index.max(), name=value_col)
+            if run_length:
+                return series
+
+            # nothing is underway before the first start or after the last end, so edge bins are filled with 0
+            binned = series.resample(resolution, how=how, fill_value=0)
+            binned = binned.to_frame(value_col) if isinstance(how, str) else binned
+            binned.index.name = self._ts_index_label
+            return binned
+
         reindexed = cc.reindex(pd.date_range(start=cc.index.min(), end=cc.index.max(), freq=resolution))
         reindexed.index.name = self._ts_index_label
         return reindexed.fillna(method='ffill')
 
-    def _generate_stratified_df_slices(self, strata_cols, strip_forbidden_cols=True):
+    def distinct_concurrency(self, key='case_id', resolution=None, run_length=False, how=None):
         """
-        Generate slices of data in self using unique combinations of values in columns named by strata_cols.
+        Number of distinct values of key (e.g. cases, or providers) with any activity underway at each timestamp, in
+        one sweep over start and end events with a running count of open activities per key (see
+        activity.utils.distinct_key_concurrency()). Gives the same series as fetch_unduplicated_concurrency() with key
+        as strata followed by concurrency_ts(), without building the unduplicated activities in between.
+
+        Activities with a missing key value are not counted.
+
+        :param key: column label, or list of column labels whose combinations count as one key
+        :param resolution: spacing of the returned time series; by default, self._default_resolution
+        :param run_length: return a RunLengthSeries of the change points instead of a dense DataFrame
+        :param how: optional aggregation(s) per bin of resolution; see concurrency_ts()
+        :return: DataFrame indexed by timestamp, or a RunLengthSeries
+        """
+        keys = [key] if isinstance(key, str) else list(key)
+
+        return self._cached(
+            'distinct_concurrency', [self._activity_start_col, self._activity_end_col] + keys,
+            lambda: self._distinct_concurrency(keys, resolution, run_length, how),
+            keys, resolution, run_length, how
+        )
+
+    def _distinct_concurrency(self, keys, resolution=None, run_length=False, how=None):
+        activity_array = self.to_activity_array(category_cols=keys)
+        times, levels = distinct_key_concurrency(activity_array.start_datetimes, activity_array.end_datetimes,
+                                                 activity_array.group_codes(keys))
+
+        index = pd.DatetimeIndex(times, name=self._ts_index_label)
+        cc = pd.DataFrame({self._concurrency_count_col: levels}, index=index)
+        return self._concurrency_ts_from_points(cc, resolution, run_length, how)
+
+    def concurrency_pyramid(self, levels=('5Min', '15Min', 'H', 'D')):
+        """
+        A TimeSeriesPyramid over concurrency_ts(run_length=True): the time-weighted mean, maximum and minimum
+        concurrency per bin at each of levels, computed once, for answering zoomed (start, end, max_points) queries
+        without going back to the activities.
+
+        :param levels: frequencies to summarize at, from finest to coarsest
+        :return: TimeSeriesPyramid
+        """
+        return TimeSeriesPyramid(self.concurrency_ts(run_length=True), levels=levels)
+
+    def _stratum_values(self, column, lookup=None, on='case_id'):
+        """
+        Values of column for each row of this DataSet: from self._df if it has that column, otherwise looked up in
+        lookup by matching self._df[on] against lookup[on], one column at a time rather than merging whole frames.
+        Where lookup has several rows for one on value, the first is used; rows without a match get a missing value.
+        """
+        if column in self._df.columns:
+            return self._df[column].values
 
+        if lookup is None or column not in lookup.columns:
+            raise Exception(f'column {column} is neither in this DataSet nor in the supplied lookup')
+
+        keys = pd.Index(lookup[on])
+        first_rows = np.flatnonzero(~keys.duplicated())
+        matches = keys[first_rows].get_indexer(self._df[on])
+
+        positions = np.where(matches >= 0, first_rows[matches], -1)
+        values = pd.Series(lookup[column].values.take(positions)).where(positions >= 0)
+        return values.values
+
+    def concurrency_by(self, strata, lookup=None, on='case_id', total=True, resolution=None, executor=None):
+        """
+        Concurrent activity count per stratum, as a wide DataFrame with one column per combination of values in
+        strata that occurs in the data, plus a total column. All strata are counted in a single sorted sweep rather
+        than one concurrency_ts() per slice, straight onto the returned timestamps, so that nothing but the result is
+        held per stratum. Timestamps match concurrency_ts(), as do the counts at self._default_resolution; at a
+        coarser resolution, each timestamp holds the exact count at that moment, as in iter_concurrency_chunks().
+
+        Columns not held by this DataSet (e.g. location) can come from lookup, such as the AnesthesiaCaseDataSet of
+        the same study, matched on the on column. Activities with a missing stratum value count toward total only.
+
+        :param strata: column label, or list of column labels, whose value combinations become columns
+        :param lookup: optional DataFrame or DataSet holding strata columns, e.g. ds_cases
+        :param on: label of the column matching rows of this DataSet to rows of lookup
+        :param total: include a total column, equal to concurrency_ts()
+        :param resolution: spacing of the returned time series; by default, self._default_resolution
+        :param executor: optional pytiva.parallel.Executor to split the strata into batches swept by its workers
+        :return: DataFrame indexed by timestamp, with a column per stratum (a MultiIndex if strata has several labels)
         """
-        combinations = [{
-            strata_cols[i]: x[i] for i in range(len(x))
-        } for x in itertools.product(*[self._df[c].unique() for c in strata_cols])]
+        strata = [strata] if isinstance(strata, str) else list(strata)
+        df_strata = pd.DataFrame({c: self._stratum_values(c, lookup=lookup, on=on) for c in strata})
+
+        grouped = df_strata.groupby(strata, sort=True)
+        codes = grouped.ngroup().fillna(-1).values.astype(np.int64)
+        labels = grouped.size().index
+        n_strata = len(labels)
+
+        # activities without a stratum go in one extra column, kept only for the total
+        codes[codes < 0] = n_strata
+        starts = self._df[self._activity_start_col].values
+        ends = self._df[self._activity_end_col].values
+
+        if resolution is None:
+            resolution = self._default_resolution
 
-        for c in combinations:
-            df_slice = self._df
-            for k, v in c.items():
-                df_slice = df_slice[df_slice[k] == v]
+        # levels are swept straight onto the returned grid, with no table at every change point in between
+        both = np.concatenate([starts, ends])
+        both = both[~np.isnat(both)]
+        grid = pd.date_range(start=both.min(), end=both.max(), freq=resolution, name=self._ts_index_label)
+
+        if executor is None or not executor.parallel:
+            _, levels = stratified_sweep_concurrency(starts, ends, codes, n_strata + 1, times=grid.values,
+                                                     dtype=np.float64)
+        else:
+            n_batches = min(n_strata + 1, executor.n_workers * executor.chunks_per_worker)
+            code_ranges = [(b[0], b[-1] + 1) for b in np.array_split(np.arange(n_strata + 1), n_batches)]
+            with executor.share(pd.DataFrame({'start': starts, 'end': ends, 'code': codes})) as events, \
+                    executor.share(pd.DataFrame({'time': grid.values})) as shared_times:
+                batches = executor.map(partial(_stratified_sweep_batch, events, shared_times), code_ranges,
+                                       chunksize=1)
+
+            levels = np.empty((len(grid), n_strata + 1), dtype=np.float64)
+            for (lo, hi), batch in zip(code_ranges, batches):
+                levels[:, lo:hi] = batch
+
+        cc = pd.DataFrame(levels[:, :n_strata], index=grid, columns=labels)
+        if total:
+            total_label = 'total' if len(strata) == 1 else ('total',) + ('',) * (len(strata) - 1)
+            cc[total_label] = levels.sum(axis=1)
+
+        return cc
+
+    def peaks(self, k=10, min_separation=None):
+        """
+        The k busiest moments, read off the sorted start and end events in concurrency_deltas: spans where
+        concurrency reaches a local peak, highest first, each at least min_separation away from any other returned.
+
+        :param k: number of peaks to return, at most
+        :param min_separation: optional timedelta, e.g. '4H', so that one busy stretch does not fill every slot
+        :return: DataFrame with start, end, duration, peak (concurrent activity count) and rows (row positions of the
+            activities underway throughout the span, for use with .iloc)
+        """
+        times, levels = self.concurrency_deltas.times, self.concurrency_deltas.levels
+        positions = top_peaks(times, levels, k, min_separation=min_separation)
+
+        starts, ends = times[positions], times[positions + 1]
+        return pd.DataFrame({
+            'start': starts,
+            'end': ends,
+            'duration': ends - starts,
+            'peak': levels[positions],
+            'rows': [self.active_at(s) for s in starts]
+        })
+
+    def exceedances(self, threshold):
+        """
+        Every episode where concurrency exceeded threshold, read off the sorted start and end events in
+        concurrency_deltas.
+
+        :param threshold: episodes are maximal spans with concurrent activity count > threshold
+        :return: DataFrame with start, end, duration, peak, peak_start (when peak is first reached) and rows (row
+            positions of the activities overlapping the episode, for use with .iloc)
+        """
+        starts, ends, peaks, peak_starts = exceedance_episodes(
+            self.concurrency_deltas.times,
+            self.concurrency_deltas.levels,
+            threshold
+        )
+
+        return pd.DataFrame({
+            'start': starts,
+            'end': ends,
+            'duration': ends - starts,
+            'peak': peaks,
+            'peak_start': peak_starts,
+            'rows': [self.overlapping(s, e) for s, e in zip(starts, ends)]
+        })
+
+    def concurrency_distribution(self, by=None, normalize=False, at_least=False):
+        """
+        Exact time spent at each concurrency level between the earliest and latest activity start or end point,
+        integrated from the sorted start and end events in concurrency_deltas rather than from a dense series, so
+        the result does not depend on self._default_resolution.
+
+        :param by: None for overall totals, or 'hour', 'day_of_week' or 'hour_of_week' for one column per bin; see
+            activity.utils.time_at_level()
+        :param normalize: report each column as fractions of its total time instead of hours
+        :param at_least: report time at each level or higher, e.g. the fraction of the time with >= k concurrent
+            activities when combined with normalize
+        :return: DataFrame with a row per concurrency level and a column per bin
+        """
+        table = time_at_level(self.concurrency_deltas.times, self.concurrency_deltas.levels, by=by)
+        table.index.name = self._concurrency_count_col
+
+        if at_least:
+            table = table.iloc[::-1].cumsum().iloc[::-1]
+
+        if normalize:
+            table = table / table.sum() if not at_least else table / table.iloc[0]
+
+        return table
+
+    def iter_strata(self, strata_cols):
+        """
+        Iterate over the combinations of values in columns named by strata_cols that actually occur in this data, in
+        order of first appearance. Yields 2-tuples of (key tuple, row positions for use with .iloc).
+
+        See pytiva.utils.iter_strata().
+        """
+        return iter_strata(self._df, strata_cols)
+
+    def iter_concurrency_chunks(self, window='MS', memory_budget=None, resolution=None, weight_col=None,
+                                unduplicate_by=None, activities=None, merge_gap=None):
+        """
+        Generate the concurrency_ts() series in consecutive pieces, working through activities one chunk at a time so
+        that neither a dense series for the whole span nor a second copy of all activities is held at once; see
+        activity.utils.iter_chunked_concurrency(). Concatenated at self._default_resolution, the pieces equal
+        concurrency_ts(), except that activities ending before they start are left out of the extent of the series.
+        At a coarser resolution, each timestamp holds the exact count at that moment, where concurrency_ts()
+        forward-fills from the nearest earlier timestamp that coincides with an activity start or end.
+
+        With unduplicate_by, each chunk is unduplicated within those strata as it is read (see
+        activity.utils.iter_merged_chunks()), giving the pieces of fetch_unduplicated_concurrency().concurrency_ts()
+        without building the unduplicated activities first.
+
+        :param window: chunk activities by their start into windows of this frequency, e.g. 'MS' for calendar months
+        :param memory_budget: optional size in bytes; if given, chunk by a number of activities that fits instead, and
+            keep each yielded piece of the series within it too
+        :param resolution: spacing of the series; by default, self._default_resolution
+        :param weight_col: optional label of a numeric column to sum instead of counting activities
+        :param unduplicate_by: optional collection of column labels to unduplicate within, e.g. ['case_id']; an empty
+            one unduplicates across all activities
+        :param activities: optional collection of activity labels to limit to
+        :param merge_gap: optional timedelta; with unduplicate_by, spans separated by no more than this are also
+            combined
+        :return: generator of DataFrames indexed by timestamp
+        """
+        if unduplicate_by is not None and weight_col is not None:
+            raise Exception('weight_col cannot be used along with unduplicate_by')
+
+        if resolution is None:
+            resolution = self._default_resolution
+
+        rows = np.arange(len(self._df))
+        if activities is not None:
+            rows = np.flatnonzero(self._df['activity'].isin(activities).values)
+
+        if len(rows) == 0:
+            return iter(())
+
+        starts = self._df[self._activity_start_col]
+        order = rows[np.argsort(starts.values[rows], kind='stable')]
+        sorted_starts = starts.values[order]
+
+        if memory_budget is not None:
+            bounds = np.arange(0, len(order), chunk_rows_for_memory_budget(memory_budget))
+        else:
+            window_starts = pd.date_range(start=sorted_starts[0], end=sorted_starts[-1], freq=window)
+            bounds = np.searchsorted(sorted_starts, window_starts.values)
+
+        bounds = np.unique(np.concatenate([[0], bounds, [len(order)]]))
+        columns = [self._activity_start_col, self._activity_end_col] + \
+                  ([] if weight_col is None else [weight_col]) + list(unduplicate_by or [])
+        # take each chunk's rows and columns together, so no more than a chunk is copied at a time
+        positions = self._df.columns.get_indexer(columns)
+        chunks = (self._df.iloc[order[lo:hi], positions] for lo, hi in zip(bounds[:-1], bounds[1:]))
+
+        if unduplicate_by is not None:
+            chunks = iter_merged_chunks(chunks, strata_cols=unduplicate_by, start_col=self._activity_start_col,
+                                        end_col=self._activity_end_col, merge_gap=merge_gap)
+
+        return iter_chunked_concurrency(
+            chunks,
+            resolution=resolution,
+            start_col=self._activity_start_col,
+            end_col=self._activity_end_col,
+            weight_col=weight_col,
+            value_label=self._concurrency_count_col if weight_col is None else self._concurrency_weight_col,
+            ts_index_label=self._ts_index_label,
+            align=False,
+            memory_budget=memory_budget
+        )
+
+    def _generate_stratified_df_slices(self, strata_cols, strip_forbidden_cols=True):
+        """
+        Generate slices of data in self using unique combinations of values in columns named by strata_cols.
 
-                if strip_forbidden_cols:
-                    df_slice = df_slice[ [c for c in df_slice.columns if c not in self._forbidden_columns] ]
+        """
+        columns = self._df.columns
+        if strip_forbidden_cols:
+            columns = [c for c in columns if c not in self._forbidden_columns]
 
-                yield df_slice
+        for key, positions in self.iter_strata(strata_cols):
+            yield self._df.iloc[positions][columns]
 
     def fetch_unduplicated_concurrency(self, activities=None, activity_out_label='activity',
-                                       strata=None):
+                                       strata=None, engine='merge', merge_gap=None, executor=None):
         """
-        Make use of _unduplicated_concurrency_to_df(), using it to generate unduplicated concurrency
-        for an arbitrary collection of activities (e.g., medication, procedure, etc.), sliced according to strata.
+        Unduplicate an arbitrary collection of activities (e.g., medication, procedure, etc.), sliced according to
+        strata: overlapping activity spans within a stratum are combined into one span from the earliest start to the
+        latest end.
 
-        Strata, if provided, should be a collection of column labels. These will be used with
-        activity.utils.col_val_combinations_to_dicts() to generate a slice of unique values for the provided columns
-        and perform unduplication at that level.
+        Strata, if provided, should be a collection of column labels. Unduplication is performed separately for each
+        combination of values in those columns.
 
         For example, the unduplication of concurrency could be performed at the level of case_id, or med_label and
         provider, or something else.
 
-        :param activities:
-        :param activity_out_label:
-        :param strata:
-        :return: a concatenated DataFrame of the unduplicated activity data
+        :param activities: optional collection of activity labels to limit the unduplication to
+        :param activity_out_label: activity label applied to every unduplicated span
+        :param strata: optional collection of column labels
+        :param engine: 'merge' (default) merges sorted intervals for every stratum at once via
+            activity.utils.merge_intervals(); 'concurrency' builds a concurrency time series per stratum via
+            _unduplicated_concurrency_to_df() and is kept for verification
+        :param merge_gap: optional timedelta; with the 'merge' engine, spans separated by no more than this are also
+            combined
+        :param executor: optional pytiva.parallel.Executor; with the 'concurrency' engine, strata are unduplicated by
+            its workers
+        :return: an object of the same type as self holding the unduplicated activity data
         """
-        target = self
+        columns = [self._activity_start_col, self._activity_end_col, 'activity']
+        columns += [] if strata is None else list(strata)
+
+        return self._cached(
+            'fetch_unduplicated_concurrency', columns,
+            lambda: self._fetch_unduplicated_concurrency(activities, activity_out_label, strata, engine, merge_gap,
+                                                         executor),
+            activities, activity_out_label, strata, engine, merge_gap
+        )
 
-        if activities is not None:
-            target = target[target.activity.isin(activities)]
+    def _fetch_unduplicated_concurrency(self, activities=None, activity_out_label='activity',
+                                        strata=None, engine='merge', merge_gap=None, executor=None):
+        if engine == 'merge':
+            df_out = self._merged_intervals_to_df(activities=activities, strata=strata, merge_gap=merge_gap)
 
-        if strata is None:
-            # no strata to group this stuff by
-            df_out = self._unduplicated_concurrency_to_df(target)
+        elif engine == 'concurrency':
+            if merge_gap is not None:
+                raise Exception(f'merge_gap is only supported by the "merge" engine')
 
-        else:
-            # stratify the unduplication
-            # (great candidate for parallelization)
-            slices = []
-            for df_slice in self._generate_stratified_df_slices(strata):
-                if len(df_slice) > 0:
-                    slices.append(self._unduplicated_concurrency_to_df(ActivityDataSet(df_slice)))
+            target = self
+
+            if activities is not None:
+                target = target[target.activity.isin(activities)]
+
+            if strata is None:
+                # no strata to group this stuff by
+                df_out = self._unduplicated_concurrency_to_df(target)
+
+            else:
+                # stratify the unduplication, one task per stratum, on the activities published once to the workers
+                executor = Executor() if executor is None else executor
+                columns = [c for c in self._df.columns if c not in self._forbidden_columns]
+                positions = [p for key, p in self.iter_strata(strata) if len(p) > 0]
+
+                with executor.share(self._df[columns]) as frame:
+                    slices = executor.map(partial(self._unduplicate_stratum, frame, self._default_resolution),
+                                          positions)
 
-            df_out = pd.concat(slices, ignore_index=True)
+                df_out = pd.concat(slices, ignore_index=True)
+
+        else:
+            raise Exception(f'engine must be "merge" or "concurrency" (got "{engine}")')
 
         df_out['activity'] = activity_out_label
 
         return type(self)(df_out)
 
+    def _merged_intervals_to_df(self, activities=None, strata=None, merge_gap=None):
+        """
+        Unduplicate activity in one pass over all strata using ActivityArray.merge(), without building any
+        concurrency time series. Strata are returned in order of first appearance, and spans by start within each.
+        """
+        df = self._df
+
+        if activities is not None:
+            df = df[df['activity'].isin(activities)]
+
+        strata = [] if strata is None else list(strata)
+        merged = ActivityArray.from_df(df, self._activity_start_col, self._activity_end_col, category_cols=strata)
+        merged = merged.merge(by=strata, merge_gap=merge_gap)
+
+        return pd.DataFrame({
+            self._activity_start_col: merged.start_datetimes,
+            self._activity_end_col: merged.end_datetimes
+        })
+
+    @classmethod
+    def _unduplicate_stratum(cls, frame, default_resolution, positions):
+        # runs in a worker: unduplicate the rows at positions of the activities published in SharedFrame frame
+        ads = cls.from_validated(frame.to_df().iloc[positions], _default_resolution=default_resolution)
+        return ads._unduplicated_concurrency_to_df(ads)
+
     def _unduplicated_concurrency_to_df(self, ads):
         """
         Generate concurrency time series for provided ActivityDataSet ads, then unduplicate that activity.
@@ -282,6 +1030,197 @@ class ActivityDataSet(DataSet):
 
         return paired_df
 
+    @staticmethod
+    def _joint_group_codes(df_a, df_b, by):
+        """
+        Number the combinations of values in columns by across the rows of both df_a and df_b, so equal combinations
+        get equal codes; rows missing any of them get -1. Without by, every row gets 0.
+
+        :return: 2-tuple of (the by columns of df_a and df_b stacked, int64 codes for those stacked rows)
+        """
+        df_keys = pd.concat([df_a[by], df_b[by]], ignore_index=True)
+
+        if by:
+            codes = df_keys.groupby(by, sort=False).ngroup().fillna(-1).values.astype(np.int64)
+        else:
+            codes = np.zeros(len(df_keys), dtype=np.int64)
+
+        return df_keys, codes
+
+    def _set_operation(self, df_a, df_b, operation, by=None, activity_out_label=None):
+        """
+        Apply activity.utils.interval_set_operation() to the activity spans of DataFrames df_a and df_b, separately
+        for each combination of values in columns named by by, and wrap the result in an object of the same type as
+        self. The by columns are carried into the result.
+        """
+        by = [] if by is None else list(by)
+        df_keys, codes = self._joint_group_codes(df_a, df_b, by)
+
+        group_codes, starts, ends = interval_set_operation(
+            df_a[self._activity_start_col].values, df_a[self._activity_end_col].values, codes[:len(df_a)],
+            df_b[self._activity_start_col].values, df_b[self._activity_end_col].values, codes[len(df_a):],
+            operation
+        )
+
+        # the by values of each span are those of the first row in its group
+        unique_codes, first_rows = np.unique(codes, return_index=True)
+        first_rows = first_rows[unique_codes >= 0]
+        df_out = df_keys.iloc[first_rows[group_codes]].reset_index(drop=True)
+
+        df_out[self._activity_start_col] = starts
+        df_out[self._activity_end_col] = ends
+        if activity_out_label is not None:
+            df_out['activity'] = activity_out_label
+
+        return self._self_type(df_out, default_resolution=self._default_resolution)
+
+    def union(self, other, by=None, activity_out_label=None):
+        """
+        Time covered by activity in self or in other, as merged spans, separately for each combination of values in
+        columns named by by (e.g. ['location']).
+
+        :param other: an ActivityDataSet
+        :param by: optional collection of column labels present in both
+        :param activity_out_label: optional activity label applied to every resulting span
+        :return: an object of the same type as self, with by columns and activity start and end
+        """
+        return self._set_operation(self._df, other._df, 'union', by=by, activity_out_label=activity_out_label)
+
+    def intersect(self, other, by=None, activity_out_label=None):
+        """
+        Time covered by activity in both self and other, separately for each combination of values in columns named
+        by by; see union().
+        """
+        return self._set_operation(self._df, other._df, 'intersect', by=by, activity_out_label=activity_out_label)
+
+    def subtract(self, other, by=None, activity_out_label=None):
+        """
+        Time covered by activity in self but not in other, separately for each combination of values in columns
+        named by by; see union(). E.g. time with an OR case but no regional procedure.
+        """
+        return self._set_operation(self._df, other._df, 'subtract', by=by, activity_out_label=activity_out_label)
+
+    def complement(self, within=None, by=None, activity_out_label=None):
+        """
+        Time not covered by activity in self, e.g. idle time between cases per room with by=['location'].
+
+        :param within: the time to take the complement in; by default, each group's own span from its earliest
+            activity start to its latest activity end. Either a (start, end) tuple applied to every group, or an
+            ActivityDataSet (with the by columns, if any)
+        :param by: optional collection of column labels; the complement is taken separately per combination of values
+        :param activity_out_label: optional activity label applied to every resulting span
+        :return: an object of the same type as self, with by columns and activity start and end
+        """
+        by = [] if by is None else list(by)
+        df_extents = self._df.groupby(by, sort=False) if by else self._df.groupby(np.zeros(len(self._df)))
+        df_extents = df_extents.agg({self._activity_start_col: 'min', self._activity_end_col: 'max'})
+        df_extents = df_extents.reset_index(drop=not by)
+
+        if within is None:
+            df_within = df_extents
+        elif isinstance(within, tuple):
+            df_within = df_extents.assign(**{
+                self._activity_start_col: pd.to_datetime(within[0]),
+                self._activity_end_col: pd.to_datetime(within[1])
+            })
+        else:
+            df_within = within._df
+
+        return self._set_operation(df_within, self._df, 'subtract', by=by, activity_out_label=activity_out_label)
+
+    def overlap_join(self, other, on=None, how='inner', suffixes=('_left', '_right')):
+        """
+        Pair each activity in self with every activity in other that shares time with it, optionally only within
+        equal values of columns named by on (e.g. ['case_id']). Pairs are found by sort-and-sweep (see
+        activity.utils.overlap_pairs()), never by a cross merge.
+
+        E.g. attach each clinical activity to the staffing shifts covering it, or, with how='left' and on=['case_id']
+        against case windows, find medications given outside of their case (rows with no overlap).
+
+        :param other: an ActivityDataSet
+        :param on: optional collection of column labels present in both
+        :param how: 'inner' for overlapping pairs only; 'left' to also keep activities in self overlapping nothing
+        :param suffixes: appended to column labels (other than on) found in both self and other
+        :return: DataFrame with the columns of self, then of other, then overlap_start, overlap_end and
+            overlap_duration; sorted by row of self, then start in other
+        """
+        if how not in ['inner', 'left']:
+            raise Exception(f'how must be "inner" or "left" (got "{how}")')
+
+        on = [] if on is None else list(on)
+        df_left, df_right = self._df, other._df
+        _, codes = self._joint_group_codes(df_left, df_right, on)
+
+        left_rows, right_rows = overlap_pairs(
+            df_left[self._activity_start_col].values, df_left[self._activity_end_col].values, codes[:len(df_left)],
+            df_right[other._activity_start_col].values, df_right[other._activity_end_col].values, codes[len(df_left):]
+        )
+
+        if how == 'left':
+            unmatched = np.setdiff1d(np.arange(len(df_left)), left_rows)
+            left_rows = np.concatenate([left_rows, unmatched])
+            right_rows = np.concatenate([right_rows, np.full(len(unmatched), -1)])
+            order = np.argsort(left_rows, kind='stable')
+            left_rows, right_rows = left_rows[order], right_rows[order]
+
+        df_left = df_left.iloc[left_rows].reset_index(drop=True)
+        df_right = df_right.reset_index(drop=True).reindex(right_rows).reset_index(drop=True).drop(columns=on)
+
+        shared = [c for c in df_left.columns if c in df_right.columns]
+        df_left = df_left.rename(columns={c: f'{c}{suffixes[0]}' for c in shared})
+        df_right = df_right.rename(columns={c: f'{c}{suffixes[1]}' for c in shared})
+
+        df_out = pd.concat([df_left, df_right], axis=1)
+        overlap_start = np.maximum(self._df[self._activity_start_col].values[left_rows],
+                                   other._df[other._activity_start_col].values[right_rows])
+        overlap_end = np.minimum(self._df[self._activity_end_col].values[left_rows],
+                                 other._df[other._activity_end_col].values[right_rows])
+
+        unmatched = right_rows < 0
+        df_out['overlap_start'] = np.where(unmatched, np.datetime64('NaT'), overlap_start)
+        df_out['overlap_end'] = np.where(unmatched, np.datetime64('NaT'), overlap_end)
+        df_out['overlap_duration'] = df_out['overlap_end'] - df_out['overlap_start']
+        return df_out
+
+    def overlap_matrix(self, by='activity', within='case_id', normalize=None):
+        """
+        Hours that each value of by (e.g. each activity type) is underway at the same time as each other value, within
+        each value of within (e.g. each case) and summed across them, e.g. how long medication is given during
+        regional procedures. Activities of one type are unduplicated per within value first, so overlapping activities
+        of the same type count once; then the time shared by each overlapping pair is totalled by type (see
+        activity.utils.pairwise_overlap()).
+
+        Activities with a missing by or within value are left out.
+
+        :param by: column label whose values label the rows and columns
+        :param within: optional column label, or list of labels, to only count overlap within; None for overlap
+            across all activities regardless of case
+        :param normalize: None for hours; 'row' to divide each row by its diagonal, i.e. the share of the row type's
+            time during which the column type is also underway; 'jaccard' for overlap over the time either is underway
+        :return: square DataFrame with a row and a column per value of by, sorted; the diagonal is each value's total
+            unduplicated time
+        """
+        within = [] if within is None else [within] if isinstance(within, str) else list(within)
+        if normalize not in [None, 'row', 'jaccard']:
+            raise Exception(f'normalize must be None, "row" or "jaccard" (got "{normalize}")')
+
+        merged = self.to_activity_array(category_cols=[by] + within).merge(by=[by] + within)
+        seconds = pairwise_overlap(merged.start_datetimes, merged.end_datetimes, merged.codes[by],
+                                   len(merged.categories[by]),
+                                   group_codes=merged.group_codes(within) if within else None)
+
+        hours = seconds / 3600
+        totals = np.diag(hours)
+        if normalize == 'row':
+            hours = np.divide(hours, totals[:, None], out=np.full_like(hours, np.nan), where=totals[:, None] > 0)
+        elif normalize == 'jaccard':
+            either = totals[:, None] + totals[None, :] - hours
+            hours = np.divide(hours, either, out=np.full_like(hours, np.nan), where=either > 0)
+
+        labels = pd.Index(merged.categories[by], name=by)
+        matrix = pd.DataFrame(hours, index=labels, columns=labels.copy())
+        return matrix.sort_index(axis=0).sort_index(axis=1)
+
     def hr_activity_summary(self, display_limit=3):
         """
         Returns a single string with the labels and counts for up to display_limit number
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+
+class ActivityIntervalIndex(object):
+    """
+    Index over [start, end) intervals for answering "which rows are active at a time" and "which rows overlap a
+    window" without scanning every row.
+
+    Intervals are kept sorted by start, alongside a running maximum of their ends. Every interval before the first
+    running maximum greater than a time t has ended by t, and every interval after the last start at or before t has
+    not begun, so a query only has to check the rows between those two binary searches.
+
+    Results are row positions (suitable for DataFrame.iloc) into the data the index was built from, in ascending order.
+    Rows with a missing start or end, or with an end not after their start, are never returned.
+    """
+
+    def __init__(self, starts, ends):
+        """
+        :param starts: datetime64 array-like of interval starts, one per row
+        :param ends: datetime64 array-like of interval ends, aligned with starts
+        """
+        starts = np.asarray(starts, dtype='datetime64[ns]')
+        ends = np.asarray(ends, dtype='datetime64[ns]')
+
+        positions = np.flatnonzero(starts < ends)
+        order = positions[np.argsort(starts[positions], kind='stable')]
+
+        self._positions = order
+        self._starts = starts[order]
+        self._ends = ends[order]
+        self._max_ends = np.maximum.accumulate(self._ends)
+
+    def __len__(self):
+        return len(self._positions)
+
+    @staticmethod
+    def _to_datetime64(ts):
+        return pd.Timestamp(ts).to_datetime64().astype('datetime64[ns]')
+
+    def _candidates(self, start, end, end_side):
+        lo = np.searchsorted(self._max_ends, start, side='right')
+        hi = np.searchsorted(self._starts, end, side=end_side)
+        if hi <= lo:
+            return np.array([], dtype=np.int64)
+
+        hits = self._ends[lo:hi] > start
+        return np.sort(self._positions[lo:hi][hits])
+
+    def active_at(self, ts):
+        """
+        Row positions of intervals with start <= ts < end.
+
+        :param ts: a timestamp-like value
+        :return: numpy array of row positions
+        """
+        ts = self._to_datetime64(ts)
+        return self._candidates(ts, ts, end_side='right')
+
+    def overlapping(self, start, end):
+        """
+        Row positions of intervals sharing any time with the window [start, end).
+
+        :param start: a timestamp-like value, the inclusive start of the window
+        :param end: a timestamp-like value, the exclusive end of the window
+        :return: numpy array of row positions
+        """
+        return self._candidates(self._to_datetime64(start), self._to_datetime64(end), end_side='left')
@@ -0,0 +1,197 @@
+import numpy as np
+
+
+class ConcurrencyDeltaMap(object):
+    """
+    Concurrency kept as the net change (+1 per activity start, -1 per activity end) at each distinct time, alongside
+    the running level those changes add up to. The level at times[i] holds until times[i + 1].
+
+    The changes are stored in segments of consecutive times, each holding its own levels counted from the start of the
+    segment, plus the level every segment starts from. Adding or removing activities rebuilds only the segments their
+    start and end times fall in (times after the last segment go into it, and split it once it grows past
+    2 * segment_size), and then moves the starting levels of the segments after them; the levels inside any other
+    segment are left alone. Appending a day of activity to a long history therefore costs about one day of changes
+    plus one addition per segment, rather than copying and summing the whole series again.
+
+    times, deltas and levels give the whole series as flat arrays, joined from the segments on first use after a
+    change.
+
+    Activities with a missing start or end, or with an end not after their start, are ignored.
+    """
+
+    def __init__(self, starts=None, ends=None, segment_size=4096):
+        """
+        :param starts: optional datetime64 array-like of activity starts
+        :param ends: optional datetime64 array-like of activity ends, aligned with starts
+        :param segment_size: number of distinct times per segment when a segment is built or split
+        """
+        self.segment_size = segment_size
+
+        # per segment: times, net changes, and levels counted from the start of the segment
+        self._segments = []
+        self._offsets = np.array([], dtype=np.int64)
+        self._flat = None
+
+        if starts is not None:
+            self.add(starts, ends)
+
+    def __len__(self):
+        return sum(len(times) for times, _, _ in self._segments)
+
+    @property
+    def times(self):
+        return self._flattened()[0]
+
+    @property
+    def deltas(self):
+        return self._flattened()[1]
+
+    @property
+    def levels(self):
+        return self._flattened()[2]
+
+    @property
+    def first_time(self):
+        """
+        Earliest time at which the level changes, or NaT if nothing is accounted for.
+        """
+        return self._segments[0][0][0] if self._segments else np.datetime64('NaT', 'ns')
+
+    @property
+    def last_time(self):
+        """
+        Latest time at which the level changes, or NaT if nothing is accounted for.
+        """
+        return self._segments[-1][0][-1] if self._segments else np.datetime64('NaT', 'ns')
+
+    def _flattened(self):
+        if self._flat is None:
+            if not self._segments:
+                self._flat = (np.array([], dtype='datetime64[ns]'), np.array([], dtype=np.int64),
+                              np.array([], dtype=np.int64))
+            else:
+                self._flat = (
+                    np.concatenate([times for times, _, _ in self._segments]),
+                    np.concatenate([deltas for _, deltas, _ in self._segments]),
+                    np.concatenate([levels + offset for (_, _, levels), offset in zip(self._segments, self._offsets)])
+                )
+
+        return self._flat
+
+    @staticmethod
+    def _events(starts, ends, sign):
+        starts = np.asarray(starts, dtype='datetime64[ns]')
+        ends = np.asarray(ends, dtype='datetime64[ns]')
+        valid = starts < ends
+
+        times = np.concatenate([starts[valid], ends[valid]])
+        deltas = np.concatenate([np.full(valid.sum(), sign), np.full(valid.sum(), -sign)]).astype(np.int64)
+
+        times, positions = np.unique(times, return_inverse=True)
+        return times, np.bincount(positions, weights=deltas, minlength=len(times)).astype(np.int64)
+
+    def _split(self, times, deltas):
+        """
+        Segments over sorted times and their net changes, dropping times where the changes cancel out: one segment
+        unless there are more than 2 * segment_size times, else segments of segment_size times.
+        """
+        kept = deltas != 0
+        times, deltas = times[kept], deltas[kept]
+        if len(times) <= 2 * self.segment_size:
+            return [(times, deltas, np.cumsum(deltas))] if len(times) > 0 else []
+
+        return [(times[i:i + self.segment_size], deltas[i:i + self.segment_size],
+                 np.cumsum(deltas[i:i + self.segment_size]))
+                for i in range(0, len(times), self.segment_size)]
+
+    def _update(self, times, deltas):
+        if len(times) == 0:
+            return self
+
+        if not self._segments:
+            self._segments = self._split(times, deltas)
+        else:
+            # each time goes to the last segment starting at or before it; anything earlier goes to the first
+            segment_starts = np.array([t[0] for t, _, _ in self._segments])
+            targets = np.maximum(np.searchsorted(segment_starts, times, side='right') - 1, 0)
+            bounds = np.flatnonzero(np.r_[True, targets[1:] != targets[:-1], True])
+
+            # rebuild touched segments from the back, so that splitting one does not shift the positions of the rest
+            for lo, hi in reversed(list(zip(bounds[:-1], bounds[1:]))):
+                k = targets[lo]
+                segment_times, segment_deltas, _ = self._segments[k]
+                merged_times, positions = np.unique(np.concatenate([segment_times, times[lo:hi]]),
+                                                    return_inverse=True)
+                merged_deltas = np.bincount(positions, weights=np.concatenate([segment_deltas, deltas[lo:hi]]),
+                                            minlength=len(merged_times)).astype(np.int64)
+                self._segments[k:k + 1] = self._split(merged_times, merged_deltas)
+
+        # a segment's net change is its last level; each segment starts from the net change of all before it
+        totals = np.array([levels[-1] for _, _, levels in self._segments], dtype=np.int64)
+        self._offsets = np.concatenate([[0], np.cumsum(totals)[:-1]]).astype(np.int64)
+        self._flat = None
+        return self
+
+    def add(self, starts, ends):
+        """
+        Account for new activities spanning [starts, ends).
+        """
+        return self._update(*self._events(starts, ends, 1))
+
+    def remove(self, starts, ends):
+        """
+        Stop accounting for activities spanning [starts, ends), which must have been added before.
+        """
+        return self._update(*self._events(starts, ends, -1))
+
+    def level_at(self, points):
+        """
+        Concurrency at each of points, counting an activity at its start but not at its end. Missing points (NaT)
+        get 0, as with activity.utils.sweep_concurrency().
+        """
+        points = np.asarray(points, dtype='datetime64[ns]')
+        result = np.zeros(len(points), dtype=np.int64)
+        if not self._segments:
+            return result
+
+        # NaT sorts after every time, so it would otherwise read the level after the last change
+        valid = ~np.isnat(points)
+        segment_starts = np.array([t[0] for t, _, _ in self._segments])
+        targets = np.searchsorted(segment_starts, points, side='right') - 1
+
+        # group the points by segment, then look each group up within its own segment
+        order = np.flatnonzero(valid & (targets >= 0))
+        order = order[np.argsort(targets[order], kind='stable')]
+        if len(order) == 0:
+            return result
+
+        bounds = np.flatnonzero(np.r_[True, targets[order][1:] != targets[order][:-1], True])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            selected = order[lo:hi]
+            k = targets[selected[0]]
+            segment_times, _, segment_levels = self._segments[k]
+            positions = np.searchsorted(segment_times, points[selected], side='right') - 1
+            result[selected] = self._offsets[k] + segment_levels[positions]
+
+        return result
+
+    def changes_from(self, time):
+        """
+        The times after time at which the level changes, with the level from each, reading only the segments from
+        the one holding time onward.
+
+        :param time: datetime64-like
+        :return: 2-tuple of numpy arrays (times, levels)
+        """
+        time = np.datetime64(time, 'ns')
+        segment_starts = np.array([t[0] for t, _, _ in self._segments], dtype='datetime64[ns]')
+        first = max(np.searchsorted(segment_starts, time, side='right') - 1, 0)
+
+        segments = self._segments[first:]
+        if not segments:
+            return np.array([], dtype='datetime64[ns]'), np.array([], dtype=np.int64)
+
+        times = np.concatenate([t for t, _, _ in segments])
+        levels = np.concatenate([levels + offset for (_, _, levels), offset in zip(segments, self._offsets[first:])])
+        after = times > time
+        return times[after], levels[after]
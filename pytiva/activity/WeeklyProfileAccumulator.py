@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from .utils import ORDERED_WEEKLY_DAY_NAME
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+class WeeklyProfileAccumulator(object):
+    """
+    Running count, mean and variance of a time series for each minute of the week (Sunday 00:00 through Saturday
+    23:59), the same bins as activity.utils.concurrent_weekly_activity().
+
+    Memory is fixed at three arrays of one entry per minute of the week, however much history is added. Chunks are
+    folded in with update() as they arrive, and accumulators built separately (e.g. per worker, per site or per year)
+    combine exactly with merge(), using the pairwise form of Welford's algorithm (Chan et al.).
+    """
+
+    def __init__(self):
+        self.n = np.zeros(MINUTES_PER_WEEK, dtype=np.int64)
+        self.mean = np.zeros(MINUTES_PER_WEEK, dtype=np.float64)
+        self.m2 = np.zeros(MINUTES_PER_WEEK, dtype=np.float64)
+
+    def __repr__(self):
+        return f'<WeeklyProfileAccumulator: {self.n.sum()} values in {np.count_nonzero(self.n)} minutes of the week>'
+
+    @staticmethod
+    def minute_of_week(index):
+        """
+        Minute of the week (0 for Sunday 00:00) for each timestamp in DatetimeIndex index.
+        """
+        day = (index.dayofweek.values + 1) % 7
+        return day * MINUTES_PER_DAY + index.hour.values * 60 + index.minute.values
+
+    def _combine(self, n, mean, m2):
+        total = self.n + n
+        delta = mean - self.mean
+        share = np.divide(n, total, out=np.zeros(MINUTES_PER_WEEK), where=total > 0)
+
+        self.m2 = self.m2 + m2 + delta ** 2 * self.n * share
+        self.mean = self.mean + delta * share
+        self.n = total
+        return self
+
+    def update(self, data, label='concurrent_activity_count'):
+        """
+        Fold in a chunk of the series.
+
+        :param data: Series, or DataFrame with a label column, indexed by a DatetimeIndex; missing values are skipped
+        :param label: column to use when data is a DataFrame
+        :return: self
+        """
+        series = data[label] if isinstance(data, pd.DataFrame) else data
+        series = series.dropna()
+
+        bins = self.minute_of_week(series.index)
+        values = series.values.astype(np.float64)
+
+        n = np.bincount(bins, minlength=MINUTES_PER_WEEK)
+        mean = np.divide(np.bincount(bins, weights=values, minlength=MINUTES_PER_WEEK), n,
+                         out=np.zeros(MINUTES_PER_WEEK), where=n > 0)
+        m2 = np.bincount(bins, weights=(values - mean[bins]) ** 2, minlength=MINUTES_PER_WEEK)
+
+        return self._combine(n, mean, m2)
+
+    def merge(self, other):
+        """
+        Fold in another WeeklyProfileAccumulator, as if its chunks had been added to this one.
+
+        :return: self
+        """
+        return self._combine(other.n, other.mean, other.m2)
+
+    def _table(self, values):
+        return pd.DataFrame(
+            values.reshape(7, MINUTES_PER_DAY).T,
+            index=pd.RangeIndex(MINUTES_PER_DAY, name='minute_of_day'),
+            columns=pd.Index(ORDERED_WEEKLY_DAY_NAME, name='day_name')
+        )
+
+    def mean_table(self):
+        """
+        Mean for each minute of the day (rows) and day of the week (columns, Sunday through Saturday); NaN where no
+        values have been added.
+        """
+        return self._table(np.where(self.n > 0, self.mean, np.nan))
+
+    def std_table(self, ddof=1):
+        """
+        Standard deviation, laid out as mean_table(); by default the sample standard deviation, as pandas computes.
+        """
+        dof = self.n - ddof
+        return self._table(np.sqrt(np.divide(self.m2, dof, out=np.full(MINUTES_PER_WEEK, np.nan), where=dof > 0)))
+
+    def n_table(self):
+        """
+        Number of values added, laid out as mean_table().
+        """
+        return self._table(self.n)
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+from .utils import ORDERED_WEEKLY_DAY_NAME
+from .WeeklyProfileAccumulator import WeeklyProfileAccumulator, MINUTES_PER_DAY, MINUTES_PER_WEEK
+
+
+class WeeklyQuantileSketch(object):
+    """
+    Mergeable quantile summaries of a time series for each cell of the week (e.g. each hour of each day), for tail
+    views such as the 90th or 95th percentile of concurrency that a mean heatmap hides.
+
+    Each cell holds a histogram of counts over value bins of width bin_width. Concurrency counts are integers, so with
+    the default bin_width of 1 the histogram is a lossless summary and quantiles are exact (interpolated as pandas
+    does); for other values, a quantile is within bin_width of the exact one. At most max_bins bins are kept: once the
+    values seen span more, neighbouring bins are merged in pairs, doubling the bin width (and so the error bound) as
+    often as needed, so memory is bounded by cells x max_bins whatever the values. Two sketches combine by adding
+    counts (after bringing them to the same bin width), unlike t-digest or KLL sketches, which only bound their error.
+    """
+
+    def __init__(self, cell_minutes=60, bin_width=1, max_bins=256):
+        """
+        :param cell_minutes: width of each cell of the week in minutes; must divide a day evenly (1 gives the same
+            cells as concurrent_weekly_activity())
+        :param bin_width: width of the value bins to start with
+        :param max_bins: most value bins to keep per cell; at least 2
+        """
+        if MINUTES_PER_DAY % cell_minutes != 0:
+            raise Exception(f'cell_minutes must divide {MINUTES_PER_DAY} evenly (got {cell_minutes})')
+
+        if max_bins < 2:
+            raise Exception(f'max_bins must be at least 2 (got {max_bins})')
+
+        self.cell_minutes = cell_minutes
+        self.bin_width = bin_width
+        self.max_bins = max_bins
+        self.width = bin_width
+        self.first_bin = 0
+        self.counts = np.zeros((MINUTES_PER_WEEK // cell_minutes, 0), dtype=np.int64)
+
+    def __repr__(self):
+        return f'<WeeklyQuantileSketch: {self.counts.sum()} values in {len(self.counts)} cells of ' \
+               f'{self.cell_minutes} minutes, {self.counts.shape[1]} bins of width {self.width}>'
+
+    @staticmethod
+    def _halved(counts, first_bin):
+        """
+        counts with neighbouring bins merged in pairs, and the index of the first merged bin; pairs start at even bin
+        indices, so that merged bin edges stay multiples of the doubled width.
+        """
+        before = first_bin % 2
+        after = (before + counts.shape[1]) % 2
+        counts = np.pad(counts, ((0, 0), (before, after)))
+        return counts[:, 0::2] + counts[:, 1::2], (first_bin - before) // 2
+
+    def _coarsen(self):
+        self.counts, self.first_bin = self._halved(self.counts, self.first_bin)
+        self.width *= 2
+
+    def _cover(self, first_bin, last_bin):
+        """
+        Widen the histograms so that bins first_bin through last_bin (at the current width) exist, coarsening as
+        needed to keep within max_bins.
+
+        :return: how many times the bins were coarsened, i.e. bin indices at the old width are to be divided by
+            2 to the power of this
+        """
+        halvings = 0
+        if self.counts.shape[1] > 0:
+            first_bin = min(first_bin, self.first_bin)
+            last_bin = max(last_bin, self.first_bin + self.counts.shape[1] - 1)
+
+        while last_bin - first_bin + 1 > self.max_bins:
+            if self.counts.shape[1] > 0:
+                self._coarsen()
+            else:
+                self.width *= 2
+            first_bin, last_bin = first_bin // 2, last_bin // 2
+            halvings += 1
+
+        if self.counts.shape[1] == 0:
+            self.first_bin = first_bin
+            self.counts = np.zeros((len(self.counts), last_bin - first_bin + 1), dtype=np.int64)
+        else:
+            before = self.first_bin - first_bin
+            after = last_bin - (self.first_bin + self.counts.shape[1] - 1)
+            if before or after:
+                self.counts = np.pad(self.counts, ((0, 0), (before, after)))
+                self.first_bin = first_bin
+
+        return halvings
+
+    def update(self, data, label='concurrent_activity_count'):
+        """
+        Fold in a chunk of the series, e.g. one piece from ActivityDataSet.iter_concurrency_chunks().
+
+        :param data: Series, or DataFrame with a label column, indexed by a DatetimeIndex; missing values are skipped
+        :param label: column to use when data is a DataFrame
+        :return: self
+        """
+        series = data[label] if isinstance(data, pd.DataFrame) else data
+        series = series.dropna()
+        if len(series) == 0:
+            return self
+
+        cells = WeeklyProfileAccumulator.minute_of_week(series.index) // self.cell_minutes
+        bins = np.floor(series.values.astype(np.float64) / self.width).astype(np.int64)
+
+        bins //= 2 ** self._cover(bins.min(), bins.max())
+        np.add.at(self.counts, (cells, bins - self.first_bin), 1)
+        return self
+
+    def merge(self, other):
+        """
+        Fold in another WeeklyQuantileSketch with the same cell_minutes and bin_width; the result has the coarser of
+        the two bin widths (or coarser still, to keep within max_bins).
+
+        :return: self
+        """
+        if (other.cell_minutes, other.bin_width) != (self.cell_minutes, self.bin_width):
+            raise Exception('only sketches with the same cell_minutes and bin_width can be merged')
+
+        if other.counts.shape[1] == 0:
+            return self
+
+        counts, first_bin, width = other.counts, other.first_bin, other.width
+        while self.width < width:
+            if self.counts.shape[1] > 0:
+                self._coarsen()
+            else:
+                self.width *= 2
+
+        while width < self.width:
+            counts, first_bin = self._halved(counts, first_bin)
+            width *= 2
+
+        for _ in range(self._cover(first_bin, first_bin + counts.shape[1] - 1)):
+            counts, first_bin = self._halved(counts, first_bin)
+
+        offset = first_bin - self.first_bin
+        self.counts[:, offset:offset + counts.shape[1]] += counts
+        return self
+
+    def _table(self, values):
+        cells_per_day = MINUTES_PER_DAY // self.cell_minutes
+        return pd.DataFrame(
+            values.reshape(7, cells_per_day).T,
+            index=pd.RangeIndex(0, MINUTES_PER_DAY, self.cell_minutes, name='minute_of_day'),
+            columns=pd.Index(ORDERED_WEEKLY_DAY_NAME, name='day_name')
+        )
+
+    def quantile_table(self, q=0.9):
+        """
+        Quantile q of the values in each cell, with linear interpolation between neighbouring values as in
+        pandas.Series.quantile(); NaN for cells without values.
+
+        :param q: quantile, between 0 and 1
+        :return: DataFrame with a row per cell start (minute of the day) and a column per day, Sunday through Saturday
+        """
+        n = self.counts.sum(axis=1)
+        cumulative = np.cumsum(self.counts, axis=1)
+        position = (n - 1) * q
+
+        def _value_at(rank):
+            # the value of the rank-th smallest entry is the lower edge of the first bin holding more than rank entries
+            bins = (cumulative > rank[:, None]).argmax(axis=1)
+            return (bins + self.first_bin) * self.width
+
+        lower = _value_at(np.floor(position))
+        upper = _value_at(np.ceil(position))
+        values = lower + (position - np.floor(position)) * (upper - lower)
+        return self._table(np.where(n > 0, values, np.nan))
+
+    def n_table(self):
+        """
+        Number of values added per cell, laid out as quantile_table().
+        """
+        return self._table(self.counts.sum(axis=1))
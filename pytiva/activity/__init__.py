@@ -1,5 +1,10 @@
 # local modules
 from .ActivityDataSet import ActivityDataSet
+from .ActivityArray import ActivityArray
+from .ActivityIntervalIndex import ActivityIntervalIndex
+from .ConcurrencyDeltaMap import ConcurrencyDeltaMap
+from .WeeklyProfileAccumulator import WeeklyProfileAccumulator
+from .WeeklyQuantileSketch import WeeklyQuantileSketch
 
 # helper functions
 from .utils import *
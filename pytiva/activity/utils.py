@@ -1,5 +1,10 @@
 import operator
 
+import numpy as np
+import pandas as pd
+
+from ..dataset import RunLengthSeries
+
 ORDERED_WEEKLY_DAY_NAME = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
 
 
@@ -27,6 +32,654 @@ def value_between_row_values(
         return False
 
 
+def sweep_concurrency(starts, ends, points, include_left=True, include_right=False, weights=None):
+    """
+    Count, for each value in points, the number of [starts, ends) intervals covering it. Gives the same answer as
+    summing value_between_row_values() over every row for every point, but sorts the start (+1) and end (-1) events
+    once and reads the running count off their cumulative sums, so costs O((n + m) log n) instead of O(n * m).
+
+    With weights, each interval contributes its weight instead of 1, giving the weighted sum of active intervals.
+
+    Rows with a missing start or end never count, as with value_between_row_values(); missing weights count as 0.
+
+    :param starts: datetime64 array-like of interval starts
+    :param ends: datetime64 array-like of interval ends, aligned with starts
+    :param points: datetime64 array-like of values at which to count
+    :param include_left: count an interval at exactly its start
+    :param include_right: count an interval at exactly its end
+    :param weights: optional numeric array-like, aligned with starts
+    :return: numpy array aligned with points; int64 counts, or float64 sums if weights are given
+    """
+    starts = np.asarray(starts, dtype='datetime64[ns]')
+    ends = np.asarray(ends, dtype='datetime64[ns]')
+    points = np.asarray(points, dtype='datetime64[ns]')
+
+    # only keep intervals that can contain at least one value; this also drops NaT, which compares False
+    if include_left and include_right:
+        valid = starts <= ends
+    else:
+        valid = starts < ends
+
+    # an event at a point has happened if its time is strictly before the point, or equal to it when the boundary
+    # already counts as inside (starts) or already counts as outside (ends)
+    start_order = np.argsort(starts[valid], kind='stable')
+    end_order = np.argsort(ends[valid], kind='stable')
+    started = np.searchsorted(starts[valid][start_order], points, side='right' if include_left else 'left')
+    ended = np.searchsorted(ends[valid][end_order], points, side='left' if include_right else 'right')
+
+    if weights is None:
+        concurrency = (started - ended).astype(np.int64)
+    else:
+        weights = np.nan_to_num(np.asarray(weights, dtype=np.float64)[valid])
+        started_weight = np.concatenate([[0.], np.cumsum(weights[start_order])])
+        ended_weight = np.concatenate([[0.], np.cumsum(weights[end_order])])
+        concurrency = started_weight[started] - ended_weight[ended]
+
+    concurrency[np.isnat(points)] = 0
+    return concurrency
+
+
+def merge_intervals(starts, ends, group_codes=None, merge_gap=None):
+    """
+    Merge overlapping or touching [starts, ends) intervals within each group, in a single pass over intervals sorted by
+    group and start: an interval opens a new merged span only when it starts after the running maximum end of
+    everything before it in its group (plus merge_gap).
+
+    Intervals with a missing start or end, or with an end not after their start, cover no time and are dropped.
+
+    :param starts: datetime64 array-like of interval starts
+    :param ends: datetime64 array-like of interval ends, aligned with starts
+    :param group_codes: optional integer array-like of group codes, aligned with starts; negative codes are dropped
+    :param merge_gap: optional timedelta; intervals separated by no more than this are also merged
+    :return: 3-tuple of numpy arrays (group codes, merged starts, merged ends), sorted by group code then start
+    """
+    starts = np.asarray(starts, dtype='datetime64[ns]')
+    ends = np.asarray(ends, dtype='datetime64[ns]')
+    if group_codes is None:
+        group_codes = np.zeros(len(starts), dtype=np.int64)
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+
+    valid = (starts < ends) & (group_codes >= 0)
+    starts, ends, group_codes = starts[valid], ends[valid], group_codes[valid]
+
+    order = np.lexsort((starts, group_codes))
+    starts, ends, group_codes = starts[order], ends[order], group_codes[order]
+
+    running_max_end = pd.Series(ends).groupby(group_codes).cummax().values
+    new_group = np.ones(len(starts), dtype=bool)
+    new_group[1:] = group_codes[1:] != group_codes[:-1]
+
+    gap = np.timedelta64(0, 'ns') if merge_gap is None else pd.to_timedelta(merge_gap).to_timedelta64()
+    new_span = new_group.copy()
+    new_span[1:] |= (starts[1:] - running_max_end[:-1]) > gap
+
+    first = np.flatnonzero(new_span)
+    last = np.append(first[1:] - 1, len(starts) - 1)[:len(first)]
+
+    return group_codes[first], starts[first], running_max_end[last]
+
+
+def distinct_key_concurrency(starts, ends, group_codes):
+    """
+    Number of distinct groups (e.g. cases) with at least one [starts, ends) interval underway, at every time it
+    changes, from one sort of all start (+1) and end (-1) events by group and time. A running count of open intervals
+    per group is kept along the sorted events; the distinct count goes up where a group's count leaves zero and down
+    where it returns to zero. Starts sort before ends at equal times, so touching intervals of one group do not count
+    as a gap, exactly as merge_intervals() joins them.
+
+    Intervals with a missing start or end, with an end not after their start, or with a negative group code never
+    count.
+
+    :param starts: datetime64 array-like of interval starts
+    :param ends: datetime64 array-like of interval ends, aligned with starts
+    :param group_codes: integer array-like of group codes, aligned with starts
+    :return: 2-tuple of (sorted numpy array of times where the count changes, int64 array of the count from each)
+    """
+    starts = np.asarray(starts, dtype='datetime64[ns]')
+    ends = np.asarray(ends, dtype='datetime64[ns]')
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+
+    valid = (starts < ends) & (group_codes >= 0)
+    n = valid.sum()
+    event_times = np.concatenate([starts[valid], ends[valid]])
+    event_codes = np.concatenate([group_codes[valid], group_codes[valid]])
+    event_deltas = np.concatenate([np.ones(n, dtype=np.int64), -np.ones(n, dtype=np.int64)])
+
+    order = np.lexsort((-event_deltas, event_times, event_codes))
+    event_times, event_deltas = event_times[order], event_deltas[order]
+
+    # every group's events sum to zero, so one running sum over all of them is each group's own open count
+    open_count = np.cumsum(event_deltas)
+    opens = (event_deltas > 0) & (open_count == 1)
+    closes = (event_deltas < 0) & (open_count == 0)
+
+    transition_times = np.concatenate([event_times[opens], event_times[closes]])
+    transition_deltas = np.concatenate([np.ones(opens.sum(), dtype=np.int64),
+                                        -np.ones(closes.sum(), dtype=np.int64)])
+
+    times, positions = np.unique(transition_times, return_inverse=True)
+    levels = np.cumsum(np.bincount(positions, weights=transition_deltas, minlength=len(times))).astype(np.int64)
+    return times, levels
+
+
+def stratified_sweep_concurrency(starts, ends, codes, n_codes, times=None, dtype=np.int64):
+    """
+    Concurrency per stratum at each of times, from the start (+1) and end (-1) events of all intervals: each event is
+    added to the row of the first time at or after it, in a (time, stratum) table that is then summed down each
+    column in place. The table is the only array of its size ever built, so memory is that of the result; to bound it
+    further, sweep batches of strata (see _stratified_sweep_batch()). An interval counts at its start but not at its
+    end, and the level at each time holds until the next, as with reindexing change points and forward-filling.
+
+    Intervals with a missing start or end, or with an end not after their start, never count, but their non-missing
+    start and end times are still among the default times.
+
+    :param starts: datetime64 array-like of interval starts
+    :param ends: datetime64 array-like of interval ends, aligned with starts
+    :param codes: integer array-like of stratum codes in [0, n_codes), aligned with starts
+    :param n_codes: number of strata
+    :param times: optional sorted datetime64 array of times to give levels at, e.g. a regular grid; by default, the
+        distinct starts and ends
+    :param dtype: dtype of the returned levels, e.g. float64 to use them in a DataFrame with missing values
+    :return: 2-tuple of (sorted numpy array of times, array of shape (len(times), n_codes))
+    """
+    starts = np.asarray(starts, dtype='datetime64[ns]')
+    ends = np.asarray(ends, dtype='datetime64[ns]')
+    codes = np.asarray(codes, dtype=np.int64)
+
+    if times is None:
+        both = np.concatenate([starts, ends])
+        times = np.unique(both[~np.isnat(both)])
+    times = np.asarray(times, dtype='datetime64[ns]')
+
+    valid = starts < ends
+    event_rows = np.searchsorted(times, np.concatenate([starts[valid], ends[valid]]))
+    event_codes = np.concatenate([codes[valid], codes[valid]])
+    event_deltas = np.concatenate([np.ones(valid.sum(), dtype=dtype), -np.ones(valid.sum(), dtype=dtype)])
+
+    # events after the last time change nothing that is returned
+    within = event_rows < len(times)
+
+    levels = np.zeros((len(times), n_codes), dtype=dtype)
+    np.add.at(levels, (event_rows[within], event_codes[within]), event_deltas[within])
+    return times, np.cumsum(levels, axis=0, out=levels)
+
+
+def _stratified_sweep_batch(events, times, code_range):
+    """
+    stratified_sweep_concurrency() for the strata with codes in [lo, hi) only, for splitting one sweep across workers.
+    events and times are SharedFrames (see pytiva.parallel) with start, end and code columns, and a time column.
+
+    :param code_range: 2-tuple (lo, hi)
+    :return: float64 array of shape (len(times), hi - lo)
+    """
+    df = events.to_df()
+    lo, hi = code_range
+    codes = df['code'].values
+    in_batch = (codes >= lo) & (codes < hi)
+
+    _, levels = stratified_sweep_concurrency(df['start'].values[in_batch], df['end'].values[in_batch],
+                                             codes[in_batch] - lo, hi - lo, times=times.to_df()['time'].values,
+                                             dtype=np.float64)
+    return levels
+
+
+def exceedance_episodes(times, levels, threshold):
+    """
+    Episodes where a change-point series (levels[i] holding from times[i] until times[i + 1]) stays above threshold.
+
+    :param times: sorted datetime64 array of change points
+    :param levels: numeric array of the level starting at each change point
+    :param threshold: episodes are maximal spans with level > threshold
+    :return: 4-tuple of numpy arrays, one entry per episode: (start, end, peak level, time the peak is first reached)
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    levels = np.asarray(levels)
+
+    above = levels > threshold
+    edges = np.diff(np.concatenate([[0], above.astype(np.int8), [0]]))
+    first = np.flatnonzero(edges == 1)
+    after = np.flatnonzero(edges == -1)
+    if len(first) == 0:
+        return times[:0], times[:0], levels[:0], times[:0]
+
+    # each episode covers positions first[i] until after[i]; reduce over those ranges only
+    peaks = np.maximum.reduceat(np.append(levels, levels[-1]), np.column_stack([first, after]).ravel())[::2]
+
+    episode = np.cumsum(edges[:-1] == 1) - 1
+    at_peak = np.flatnonzero(above & (levels == peaks[np.maximum(episode, 0)]))
+    _, first_at_peak = np.unique(episode[at_peak], return_index=True)
+
+    return times[first], times[np.minimum(after, len(times) - 1)], peaks, times[at_peak[first_at_peak]]
+
+
+def top_peaks(times, levels, k, min_separation=None):
+    """
+    The k highest local peaks of a change-point series (levels[i] holding from times[i] until times[i + 1]), chosen
+    greedily from the highest (earliest first among ties) and skipping any peak within min_separation of one already
+    chosen.
+
+    :param times: sorted datetime64 array of change points
+    :param levels: numeric array of the level starting at each change point
+    :param k: number of peaks to return, at most
+    :param min_separation: optional timedelta; minimum gap between the spans of any two chosen peaks
+    :return: numpy array of positions into times, highest peak first
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    levels = np.asarray(levels)
+    if len(times) < 2:
+        return np.array([], dtype=np.int64)
+
+    # a local peak is a run higher than the runs on either side of it; outside of the series the level is 0
+    padded = np.concatenate([[0], levels, [0]])
+    candidates = np.flatnonzero((levels > padded[:-2]) & (levels > padded[2:]))
+    candidates = candidates[candidates < len(times) - 1]
+    candidates = candidates[np.lexsort((times[candidates], -levels[candidates]))]
+
+    gap = np.timedelta64(0, 'ns') if min_separation is None else pd.to_timedelta(min_separation).to_timedelta64()
+    chosen = []
+    chosen_starts = []
+    for c in candidates:
+        if len(chosen) >= k:
+            break
+
+        start, end = times[c], times[c + 1]
+        i = np.searchsorted(np.array(chosen_starts, dtype='datetime64[ns]'), start)
+        if i > 0 and times[chosen[i - 1] + 1] + gap > start:
+            continue
+        if i < len(chosen) and end + gap > chosen_starts[i]:
+            continue
+
+        chosen.insert(i, c)
+        chosen_starts.insert(i, start)
+
+    chosen = np.array(chosen, dtype=np.int64)
+    return chosen[np.lexsort((times[chosen], -levels[chosen]))]
+
+
+def time_at_level(times, levels, by=None):
+    """
+    Exact time a change-point series (levels[i] holding from times[i] until times[i + 1]) spends at each level, over
+    [times[0], times[-1]], optionally split into calendar bins. Runs are only split where they cross an hour
+    boundary, so the cost does not depend on any time resolution.
+
+    :param times: sorted datetime64 array of change points
+    :param levels: non-negative integer array of the level starting at each change point
+    :param by: None for a single 'total' column; 'hour' (0-23), 'day_of_week' (Sunday through Saturday) or
+        'hour_of_week' (day of week and hour) for one column per bin
+    :return: DataFrame of hours spent, with a row per level from 0 through the maximum and a column per bin
+    """
+    times = np.asarray(times, dtype='datetime64[ns]')
+    levels = np.asarray(levels, dtype=np.int64)
+
+    if by is None:
+        starts, values, durations = times, levels, np.diff(times, append=times[-1:])
+    else:
+        series = RunLengthSeries(times, levels, end=times[-1] if len(times) > 0 else None, compress=False)
+        edges = pd.date_range(start=pd.Timestamp(series.start).floor('H'), end=series.end, freq='H')
+        starts, values, durations = series.split_at(edges.values)
+
+    hours = durations / np.timedelta64(1, 'h')
+    starts = pd.DatetimeIndex(starts)
+    day_of_week = (starts.dayofweek.values + 1) % 7
+
+    if by is None:
+        bins, columns = np.zeros(len(starts), dtype=np.int64), pd.Index(['total'])
+    elif by == 'hour':
+        bins, columns = starts.hour.values, pd.Index(range(24), name='hour')
+    elif by == 'day_of_week':
+        bins, columns = day_of_week, pd.Index(ORDERED_WEEKLY_DAY_NAME, name='day_name')
+    elif by == 'hour_of_week':
+        bins = day_of_week * 24 + starts.hour.values
+        columns = pd.MultiIndex.from_product([ORDERED_WEEKLY_DAY_NAME, range(24)], names=['day_name', 'hour'])
+    else:
+        raise Exception(f'by must be None, "hour", "day_of_week" or "hour_of_week" (got "{by}")')
+
+    table = np.zeros((levels.max(initial=0) + 1, len(columns)))
+    np.add.at(table, (values, bins), hours)
+    return pd.DataFrame(table, index=pd.RangeIndex(len(table), name='level'), columns=columns)
+
+
+def pairwise_overlap(starts, ends, codes, n_codes, group_codes=None):
+    """
+    Total time every pair of codes (e.g. activity types) is underway together, within each group (e.g. case) and
+    summed over groups: every pair of intervals of one group that share time is found by sort-and-sweep (see
+    overlap_pairs(), which pairs each interval with itself too), and the time each pair shares is added to the cell of
+    its two codes. Memory grows with the number of overlapping pairs and n_codes squared, not with intervals times
+    codes.
+
+    Intervals should not overlap others of the same code and group (see merge_intervals()); where they do, a pair is
+    counted once per combination of overlapping intervals. Intervals with a missing start or end, with an end not after
+    their start, or with a negative code or group code never count.
+
+    :param starts: datetime64 array-like of interval starts
+    :param ends: datetime64 array-like of interval ends, aligned with starts
+    :param codes: integer array-like of codes in [0, n_codes), aligned with starts
+    :param n_codes: number of codes
+    :param group_codes: optional integer array-like of group codes, aligned with starts; by default, one group
+    :return: float64 array of shape (n_codes, n_codes) of seconds together; the diagonal is each code's total time
+    """
+    starts = np.asarray(starts, dtype='datetime64[ns]')
+    ends = np.asarray(ends, dtype='datetime64[ns]')
+    codes = np.asarray(codes, dtype=np.int64)
+    group_codes = np.zeros(len(starts), dtype=np.int64) if group_codes is None \
+        else np.asarray(group_codes, dtype=np.int64)
+
+    # intervals without a code drop out with those without a group
+    group_codes = np.where(codes >= 0, group_codes, -1)
+    left, right = overlap_pairs(starts, ends, group_codes, starts, ends, group_codes)
+
+    together = np.minimum(ends[left], ends[right]) - np.maximum(starts[left], starts[right])
+    seconds = np.bincount(codes[left] * n_codes + codes[right], weights=together / np.timedelta64(1, 's'),
+                          minlength=n_codes * n_codes)
+    return seconds.reshape(n_codes, n_codes)
+
+
+def interval_set_operation(a_starts, a_ends, a_codes, b_starts, b_ends, b_codes, operation):
+    """
+    Set algebra on two collections of [start, end) intervals, separately within each group: one sort of every start
+    and end event by group and time, with a running count of open A and B intervals, marks where the result is
+    covered. Touching or overlapping pieces of the result come out as one span.
+
+    Intervals with a missing start or end, an end not after their start, or a negative group code are dropped.
+
+    :param a_starts: datetime64 array-like of starts of A
+    :param a_ends: datetime64 array-like of ends of A, aligned with a_starts
+    :param a_codes: integer array-like of group codes of A, aligned with a_starts
+    :param b_starts: datetime64 array-like of starts of B
+    :param b_ends: datetime64 array-like of ends of B, aligned with b_starts
+    :param b_codes: integer array-like of group codes of B, aligned with b_starts; the same codes as A for the same
+        group
+    :param operation: 'union' (A or B), 'intersect' (A and B) or 'subtract' (A and not B)
+    :return: 3-tuple of numpy arrays (group codes, starts, ends), sorted by group code then start
+    """
+    def _events(starts, ends, codes):
+        starts = np.asarray(starts, dtype='datetime64[ns]')
+        ends = np.asarray(ends, dtype='datetime64[ns]')
+        codes = np.asarray(codes, dtype=np.int64)
+        valid = (starts < ends) & (codes >= 0)
+        deltas = np.concatenate([np.ones(valid.sum(), dtype=np.int64), -np.ones(valid.sum(), dtype=np.int64)])
+        return np.concatenate([starts[valid], ends[valid]]), np.concatenate([codes[valid], codes[valid]]), deltas
+
+    a_times, a_event_codes, a_deltas = _events(a_starts, a_ends, a_codes)
+    b_times, b_event_codes, b_deltas = _events(b_starts, b_ends, b_codes)
+
+    times = np.concatenate([a_times, b_times])
+    codes = np.concatenate([a_event_codes, b_event_codes])
+    order = np.lexsort((times, codes))
+    times, codes = times[order], codes[order]
+    if len(times) == 0:
+        return codes, times, times
+
+    # every group's counts return to zero at its last event, so running sums over all groups at once are safe
+    open_a = np.cumsum(np.concatenate([a_deltas, np.zeros(len(b_deltas), dtype=np.int64)])[order])
+    open_b = np.cumsum(np.concatenate([np.zeros(len(a_deltas), dtype=np.int64), b_deltas])[order])
+
+    # only the counts after the last event at each group and time matter
+    last = np.ones(len(times), dtype=bool)
+    last[:-1] = (times[1:] != times[:-1]) | (codes[1:] != codes[:-1])
+    times, codes, open_a, open_b = times[last], codes[last], open_a[last], open_b[last]
+
+    if operation == 'union':
+        covered = (open_a > 0) | (open_b > 0)
+    elif operation == 'intersect':
+        covered = (open_a > 0) & (open_b > 0)
+    elif operation == 'subtract':
+        covered = (open_a > 0) & (open_b == 0)
+    else:
+        raise Exception(f'operation must be "union", "intersect" or "subtract" (got "{operation}")')
+
+    was_covered = np.concatenate([[False], covered[:-1]])
+    opened = covered & ~was_covered
+    closed = ~covered & was_covered
+    return codes[opened], times[opened], times[closed]
+
+
+def _count_keys_before(key_codes, key_times, query_codes, query_times, include_equal):
+    """
+    For each query, the number of (code, time) keys, sorted by code then time, that come before it: keys less than
+    the query, or with include_equal, less than or equal to it. Keys and queries are sorted together once.
+    """
+    is_query = np.concatenate([np.zeros(len(key_codes), dtype=np.int8), np.ones(len(query_codes), dtype=np.int8)])
+    codes = np.concatenate([key_codes, query_codes])
+    times = np.concatenate([key_times, query_times]).astype('datetime64[ns]').view(np.int64)
+
+    # at equal code and time, keys sort ahead of queries when they should be counted
+    tie_break = is_query if include_equal else 1 - is_query
+    order = np.lexsort((tie_break, times, codes))
+
+    keys_so_far = np.cumsum(is_query[order] == 0)
+    counts = np.empty(len(query_codes), dtype=np.int64)
+    counts[order[is_query[order] == 1] - len(key_codes)] = keys_so_far[is_query[order] == 1]
+    return counts
+
+
+def overlap_pairs(left_starts, left_ends, left_codes, right_starts, right_ends, right_codes):
+    """
+    Every pair of a left and a right [start, end) interval that share time and have the same group code, found by
+    sort-and-sweep rather than comparing every pair. Right intervals are sorted by group and start, alongside a running
+    maximum of their ends per group; for each left interval, two searches bound the right rows that can overlap it,
+    as in ActivityIntervalIndex, and only those are checked.
+
+    Intervals with a missing start or end, an end not after their start, or a negative group code never match.
+
+    :param left_starts: datetime64 array-like of left starts
+    :param left_ends: datetime64 array-like of left ends, aligned with left_starts
+    :param left_codes: integer array-like of left group codes, aligned with left_starts
+    :param right_starts: datetime64 array-like of right starts
+    :param right_ends: datetime64 array-like of right ends, aligned with right_starts
+    :param right_codes: integer array-like of right group codes, with the same codes as the left for the same group
+    :return: 2-tuple of numpy arrays (left row positions, right row positions), sorted by left row then right start
+    """
+    left_starts = np.asarray(left_starts, dtype='datetime64[ns]')
+    left_ends = np.asarray(left_ends, dtype='datetime64[ns]')
+    left_codes = np.asarray(left_codes, dtype=np.int64)
+    right_starts = np.asarray(right_starts, dtype='datetime64[ns]')
+    right_ends = np.asarray(right_ends, dtype='datetime64[ns]')
+    right_codes = np.asarray(right_codes, dtype=np.int64)
+
+    right_rows = np.flatnonzero((right_starts < right_ends) & (right_codes >= 0))
+    right_rows = right_rows[np.lexsort((right_starts[right_rows], right_codes[right_rows]))]
+    sorted_codes, sorted_starts, sorted_ends = right_codes[right_rows], right_starts[right_rows], right_ends[right_rows]
+    max_ends = pd.Series(sorted_ends).groupby(sorted_codes).cummax().values
+
+    left_rows = np.flatnonzero((left_starts < left_ends) & (left_codes >= 0))
+    query_codes = left_codes[left_rows]
+
+    # rows before lo have all ended by the left start; rows from hi on start at or after the left end
+    lo = _count_keys_before(sorted_codes, max_ends, query_codes, left_starts[left_rows], include_equal=True)
+    hi = _count_keys_before(sorted_codes, sorted_starts, query_codes, left_ends[left_rows], include_equal=False)
+
+    counts = np.maximum(hi - lo, 0)
+    candidates = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    pair_left_rows = np.repeat(left_rows, counts)
+
+    overlaps = sorted_ends[candidates] > left_starts[pair_left_rows]
+    return pair_left_rows[overlaps], right_rows[candidates[overlaps]]
+
+
+# rough working memory per activity while streaming: start, end and weight, plus sorted copies of each
+CHUNK_BYTES_PER_ROW = 64
+
+# rough memory per timestamp of a yielded piece: the timestamp, the value, and the searches that compute it
+PIECE_BYTES_PER_ROW = 32
+
+
+def chunk_rows_for_memory_budget(memory_budget, bytes_per_row=CHUNK_BYTES_PER_ROW):
+    """
+    Number of activity rows per chunk that keeps streaming concurrency within roughly memory_budget bytes; also
+    suitable for pandas.read_csv(chunksize=...) when feeding iter_chunked_concurrency().
+    """
+    return max(1, int(memory_budget // bytes_per_row))
+
+
+def iter_merged_chunks(chunks, strata_cols=(), start_col='activity_start', end_col='activity_end', merge_gap=None):
+    """
+    Unduplicate activity one chunk at a time: overlapping or touching [start, end) intervals within each combination
+    of values in strata_cols are merged, as merge_intervals() does over all of them at once.
+
+    Chunks must arrive sorted by start, as for iter_chunked_concurrency(), and the yielded DataFrames are too, so the
+    two can be chained. Once a chunk is read, a merged span ending (plus merge_gap) before its latest start cannot
+    grow any more; such spans are yielded as soon as no span still open started before them, and every other span is
+    carried into the next chunk.
+
+    Rows with a missing start, end or strata value, or with an end not after their start, are dropped.
+
+    :param chunks: iterable of DataFrames, e.g. from pandas.read_csv(chunksize=...)
+    :param strata_cols: collection of column labels to merge within; empty to merge across all activities
+    :param start_col: label of the column holding activity starts
+    :param end_col: label of the column holding activity ends
+    :param merge_gap: optional timedelta; intervals separated by no more than this are also merged
+    :return: generator of DataFrames with strata_cols, start_col and end_col columns
+    """
+    strata_cols = list(strata_cols)
+    gap = np.timedelta64(0, 'ns') if merge_gap is None else pd.to_timedelta(merge_gap).to_timedelta64()
+    held = None
+    watermark = np.datetime64('NaT', 'ns')
+
+    def _merged(df):
+        group_codes = None
+        if strata_cols:
+            group_codes = df.groupby(strata_cols, sort=False).ngroup().fillna(-1).values.astype(np.int64)
+
+        merged_codes, starts, ends = merge_intervals(df[start_col].values, df[end_col].values,
+                                                     group_codes=group_codes, merge_gap=merge_gap)
+
+        df_merged = pd.DataFrame(index=pd.RangeIndex(len(starts)))
+        if strata_cols:
+            # the strata values of each merged span are those of the first row in its group
+            unique_codes, first_rows = np.unique(group_codes, return_index=True)
+            first_rows = first_rows[unique_codes >= 0]
+            df_merged = df[strata_cols].iloc[first_rows[merged_codes]].reset_index(drop=True)
+
+        df_merged[start_col] = starts
+        df_merged[end_col] = ends
+        return df_merged
+
+    for df in chunks:
+        starts = df[start_col].values.astype('datetime64[ns]')
+        valid = starts < df[end_col].values.astype('datetime64[ns]')
+        if not valid.any():
+            continue
+
+        if not np.isnat(watermark) and starts[valid].min() < watermark:
+            raise Exception(f'chunks must be sorted by {start_col} (found {starts[valid].min()} after {watermark})')
+        watermark = starts[valid].max()
+
+        df = df.loc[valid, strata_cols + [start_col, end_col]]
+        df_merged = _merged(df if held is None else pd.concat([held, df], ignore_index=True))
+
+        merged_starts = df_merged[start_col].values
+        final = (df_merged[end_col].values + gap) < watermark
+        ready = final.copy()
+        if not final.all():
+            # spans yielded later must not start before these, and an open span may still be yielded later
+            ready &= merged_starts < merged_starts[~final].min()
+
+        if ready.any():
+            yield df_merged[ready].sort_values(start_col, kind='stable').reset_index(drop=True)
+        held = df_merged[~ready]
+
+    if held is not None and len(held) > 0:
+        yield held.sort_values(start_col, kind='stable').reset_index(drop=True)
+
+
+def iter_chunked_concurrency(
+        chunks,
+        resolution='1Min',
+        start_col='activity_start',
+        end_col='activity_end',
+        weight_col=None,
+        value_label='concurrent_activity_count',
+        ts_index_label='timestamp',
+        align=True,
+        memory_budget=None
+):
+    """
+    Stream concurrency one chunk of activities at a time, yielding consecutive pieces of the same dense series that
+    ActivityDataSet.concurrency_ts() builds in memory: one row per resolution step from the earliest activity start to
+    the latest activity end.
+
+    Chunks must arrive sorted by start, i.e. no chunk may hold a start earlier than the latest start of the chunk
+    before it. Once a chunk is read, every timestamp before its latest start is final and is yielded; only the
+    activities still underway at that point are carried into the next chunk. With memory_budget, those timestamps
+    are yielded in as many pieces as it takes to keep each within the budget, however long the chunk's span.
+
+    Activities with a missing start or end, or with an end not after their start, are ignored, including when
+    finding the extent of the series.
+
+    :param chunks: iterable of DataFrames, e.g. from pandas.read_csv(chunksize=...)
+    :param resolution: spacing of the yielded series
+    :param start_col: label of the column holding activity starts
+    :param end_col: label of the column holding activity ends
+    :param weight_col: optional label of a numeric column to sum instead of counting activities
+    :param value_label: label of the yielded value column
+    :param ts_index_label: label of the yielded index
+    :param align: floor starts and ceil ends to resolution, as ActivityDataSet does on init
+    :param memory_budget: optional size in bytes of each yielded piece
+    :return: generator of DataFrames indexed by timestamp
+    """
+    step = pd.to_timedelta(resolution).to_timedelta64()
+    nat = np.datetime64('NaT', 'ns')
+    max_points = None if memory_budget is None else max(1, int(memory_budget // PIECE_BYTES_PER_ROW))
+
+    carried_starts = np.array([], dtype='datetime64[ns]')
+    carried_ends = np.array([], dtype='datetime64[ns]')
+    carried_weights = None if weight_col is None else np.array([], dtype=np.float64)
+    next_point, watermark, latest_end = nat, nat, nat
+
+    def _pieces(first, stop, starts, ends, weights):
+        # the points from first up to (not including) stop, at most max_points of them per piece
+        n_points = max(int(-(-(stop - first) // step)), 0)
+        size = n_points if max_points is None else max_points
+        for lo in range(0, n_points, size):
+            points = first + np.arange(lo, min(lo + size, n_points)) * step
+            values = sweep_concurrency(starts, ends, points, weights=weights)
+            yield pd.DataFrame({value_label: values}, index=pd.DatetimeIndex(points, name=ts_index_label))
+
+    for df in chunks:
+        starts_series = pd.to_datetime(df[start_col])
+        ends_series = pd.to_datetime(df[end_col])
+        if align:
+            starts_series = starts_series.dt.floor(resolution)
+            ends_series = ends_series.dt.ceil(resolution)
+
+        starts = starts_series.values.astype('datetime64[ns]')
+        ends = ends_series.values.astype('datetime64[ns]')
+        valid = starts < ends
+        if not valid.any():
+            continue
+
+        starts, ends = starts[valid], ends[valid]
+        if not np.isnat(watermark) and starts.min() < watermark:
+            raise Exception(f'chunks must be sorted by {start_col} (found {starts.min()} after {watermark})')
+
+        starts = np.concatenate([carried_starts, starts])
+        ends = np.concatenate([carried_ends, ends])
+        weights = None
+        if weight_col is not None:
+            weights = np.concatenate([carried_weights, df[weight_col].values.astype(np.float64)[valid]])
+
+        if np.isnat(next_point):
+            next_point = starts.min()
+
+        # nothing later can start before the watermark, so every point before it is final
+        watermark = starts.max()
+        latest_end = ends.max() if np.isnat(latest_end) else max(latest_end, ends.max())
+
+        for piece in _pieces(next_point, watermark, starts, ends, weights):
+            yield piece
+            next_point = piece.index.values[-1] + step
+
+        underway = ends > watermark
+        carried_starts, carried_ends = starts[underway], ends[underway]
+        if weights is not None:
+            carried_weights = weights[underway]
+
+    if not np.isnat(next_point):
+        yield from _pieces(next_point, latest_end + np.timedelta64(1, 'ns'), carried_starts, carried_ends,
+                           carried_weights)
+
+
 def minute_of_day(timestamp):
     return timestamp.hour * 60 + timestamp.minute
 
@@ -37,11 +690,12 @@ def concurrent_weekly_activity(df_cc, label='concurrent_activity_count'):
     :param df_cc:
     :return:
     """
-    df_copy = df_cc.copy()
-    df_copy['dayofweek'] = df_copy.index.dayofweek
-    df_copy['day_name'] = df_copy.index.day_name()
-    df_copy['minute_of_day'] = df_copy.index.map(minute_of_day)
-    grouped = df_copy.groupby(['minute_of_day', 'day_name'])[label].mean()
+    df_bins = pd.DataFrame({
+        label: df_cc[label].values,
+        'day_name': df_cc.index.day_name(),
+        'minute_of_day': df_cc.index.hour * 60 + df_cc.index.minute
+    })
+    grouped = df_bins.groupby(['minute_of_day', 'day_name'])[label].mean()
     return grouped.unstack()[ORDERED_WEEKLY_DAY_NAME]
 
 
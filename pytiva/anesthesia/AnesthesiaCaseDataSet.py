@@ -56,7 +56,7 @@ class AnesthesiaCaseDataSet(AnesthesiaDataSet):
             lst_filter = [p.lower() for p in lst_procedures]
             proc_mask = self._df['procedure'].apply(lambda x: str(x).lower() in lst_filter)
 
-        ds_excluded = self._self_type(self._df.loc[~proc_mask])
+        ds_excluded = self._derived(self._df.loc[~proc_mask])
         self._excluded_procedures.extend(ds_excluded['procedure'].unique())
 
         self._df = self._df.loc[proc_mask]
@@ -76,7 +76,7 @@ class AnesthesiaCaseDataSet(AnesthesiaDataSet):
             lst_filter = [p.lower() for p in lst_locations]
             loc_mask = self._df['location'].apply(lambda x: str(x).lower() in lst_filter)
 
-        ds_excluded = self._self_type(self._df.loc[~loc_mask])
+        ds_excluded = self._derived(self._df.loc[~loc_mask])
         self._excluded_locations.extend(ds_excluded['location'].unique())
 
         self._df = self._df.loc[loc_mask]
@@ -8,6 +8,8 @@ class AnesthesiaStudy(object):
     ds_activity = None
     _unduplicated_activity = None
     _unduplicated_concurrency = None
+    # what unduplicate_concurrency(fused=True) passes along to ActivityDataSet.distinct_concurrency()
+    _fused_concurrency_kwargs = ['run_length', 'how']
     _allowed_member_case_datasets = [
         'ds_cases',
         'ds_case_events',
@@ -73,7 +75,7 @@ class AnesthesiaStudy(object):
         allowed = getattr(self, cases_from)['case_id'].unique()
 
         for name, ds in self._case_dataset_member_dict.items():
-            new_ds = ds._self_type(ds.loc[ds['case_id'].isin(allowed)])
+            new_ds = ds._derived(ds._df.loc[ds['case_id'].isin(allowed)])
             setattr(self, name, new_ds)
 
         # TODO: refactor this more elegantly somehow, ?integrate elsewhere
@@ -274,7 +276,7 @@ class AnesthesiaStudy(object):
 
                 for activity_definition in activities[self._config_labels['event_definitions']]:
                     ead = EventActivityDefinition(**activity_definition)
-                    event_activity.append(ead.apply_to_ds(self.ds_case_events))
+                    event_activity.append(ead.apply_to_ds(self.ds_case_events, ds_cases=self.ds_cases))
 
                 all_activities.extend(event_activity)
 
@@ -298,16 +300,32 @@ class AnesthesiaStudy(object):
         else:
             return False
 
-    def unduplicate_concurrency(self, strata=['case_id'], resolution=None, *args, **kwargs):
+    def unduplicate_concurrency(self, strata=['case_id'], resolution=None, *args, fused=False, **kwargs):
         """
         Wraps self.unduplicate_activity(), passing along unused arguments.
 
         By default, unduplicates with case_id as the lone stratum, but could happily use any levels.
 
+        When the activity dataset has a _result_cache (see ActivityDataSet), both the unduplication and the
+        concurrency series are memoized, so repeating this on unchanged activity returns the stored results.
+
         :param strata:
         :param resolution:
+        :param fused: keyword only; count the distinct strata underway directly with
+            ActivityDataSet.distinct_concurrency(), which gives the same series without building (or keeping in
+            self._unduplicated_activity) the unduplicated activities; only run_length and how are passed along
         :return:
         """
+        if fused:
+            unsupported = [k for k in kwargs if k not in self._fused_concurrency_kwargs]
+            if args or unsupported:
+                raise Exception(f'fused=True only passes along {self._fused_concurrency_kwargs} '
+                                f'(got {len(args)} positional arguments and {unsupported})')
+
+            self._unduplicated_concurrency = self.ds_activity.distinct_concurrency(key=strata, resolution=resolution,
+                                                                                   **kwargs)
+            return self._unduplicated_concurrency
+
         unduplicated_activity = self.unduplicate_activity(strata=strata)
 
         self._unduplicated_concurrency = unduplicated_activity.concurrency_ts(resolution=resolution,
@@ -315,5 +333,24 @@ class AnesthesiaStudy(object):
                                                                               **kwargs)
         return self._unduplicated_concurrency
 
+    def iter_unduplicated_concurrency(self, strata=['case_id'], window='MS', memory_budget=None, resolution=None,
+                                      activities=None, merge_gap=None):
+        """
+        Like self.unduplicate_concurrency(), but generates the series in consecutive pieces via
+        ActivityDataSet.iter_concurrency_chunks(), unduplicating each chunk of activities as it is read rather than
+        building the unduplicated activities (or the series) all in memory.
+
+        :param strata:
+        :param window:
+        :param memory_budget:
+        :param resolution:
+        :param activities: optional collection of activity labels to limit the unduplication to
+        :param merge_gap: optional timedelta; spans separated by no more than this are also combined
+        :return: generator of DataFrames indexed by timestamp
+        """
+        return self.ds_activity.iter_concurrency_chunks(window=window, memory_budget=memory_budget,
+                                                        resolution=resolution, unduplicate_by=strata,
+                                                        activities=activities, merge_gap=merge_gap)
+
     def __repr__(self):
         return self.summarize(verbose=False)
@@ -4,7 +4,7 @@ from ..activity import ActivityDataSet
 class EventActivityDefinition(object):
     def __init__(self, start_event, end_event, case_sensitive=False,
                  activity_label='activity', offset_start=None, offset_end=None,
-                 max_duration_quantile=1, max_duration_factor=1):
+                 max_duration_quantile=1, max_duration_factor=1, max_duration_by=None):
         """
 
         :param start_event:
@@ -13,6 +13,10 @@ class EventActivityDefinition(object):
         :param activity_label:
         :param offset_start: optional pandas TimeDelta
         :param offset_end: optional pandas TimeDelta
+        :param max_duration_quantile: cap durations at this quantile of durations (times max_duration_factor)
+        :param max_duration_factor:
+        :param max_duration_by: optional list of column labels, e.g. ['location'], to take the quantile within
+            groups of; columns other than case_id are looked up by case_id in the ds_cases passed to apply_to_ds()
         """
         self.start_event = start_event
         self.end_event = end_event
@@ -22,12 +26,14 @@ class EventActivityDefinition(object):
         self.offset_end = offset_end
         self.max_duration_quantile = max_duration_quantile
         self.max_duration_factor = max_duration_factor
+        self.max_duration_by = max_duration_by
         pass
 
-    def apply_to_ds(self, ds):
+    def apply_to_ds(self, ds, ds_cases=None):
         """
         Expects a DataSet, particularly an AnesthesiaCaseEventsDataSet, as ds.
         :param ds: AnesthesiaCaseEventsDataSet
+        :param ds_cases: optional AnesthesiaCaseDataSet, needed when max_duration_by names case columns
         :return:
         """
         df = ds._df
@@ -62,8 +68,10 @@ class EventActivityDefinition(object):
             ds_activity.apply_offset(self.offset_end, apply_to_start=False)
 
         if self.max_duration_quantile != 1 or self.max_duration_factor != 1:
-            # truncate with a maximum duration
-            maximum_duration = ds_activity['duration'].quantile(self.max_duration_quantile) * self.max_duration_factor
-            ds_activity.enforce_maximum_duration(maximum_duration)
+            # truncate with a maximum duration, per group of max_duration_by if given
+            ds_activity.enforce_maximum_duration(by=self.max_duration_by, quantile=self.max_duration_quantile,
+                                                 factor=self.max_duration_factor,
+                                                 lookup=None if ds_cases is None else ds_cases._df,
+                                                 on=ds._case_id_col)
 
         return ds_activity
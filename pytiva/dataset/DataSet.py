@@ -1,3 +1,5 @@
+import copy
+
 import pandas as pd
 from ..stats import test_group_means as st_test_group_means
 
@@ -43,7 +45,7 @@ class DataSet(object):
                 f'This DataSet requires columns {self._required_columns} and is missing {missing_required_columns}')
 
         for dtc in self._datetime_columns:
-            if dtc in self._df.columns:
+            if dtc in self._df.columns and not pd.api.types.is_datetime64_any_dtype(self._df[dtc]):
                 self._df[dtc] = pd.to_datetime(self._df[dtc])
 
         for strc in self._str_columns:
@@ -57,6 +59,34 @@ class DataSet(object):
             except Exception as e:
                 raise Exception(f'an index_column value ({index_column}) was supplied, but could not be set')
 
+    @classmethod
+    def from_validated(cls, df, **attributes):
+        """
+        Wrap DataFrame df in an object of this type without copying it or repeating the checks and conversions in
+        __init__. Only for data that has already been through them, e.g. a subset of another object of this type.
+
+        :param df: DataFrame
+        :param attributes: optional instance attributes to set, e.g. _default_resolution for an ActivityDataSet
+        :return: an object of this type holding df
+        """
+        ds = cls.__new__(cls)
+        for name, value in attributes.items():
+            setattr(ds, name, value)
+
+        # set last, so that anything derived from the data is dropped by child classes that track it
+        ds._df = df
+        return ds
+
+    def _derived(self, df):
+        """
+        An object of the same type as self around df, a subset of the data in self, keeping the instance attributes
+        of self; see from_validated(). Lists, dicts and sets among them are copied, so that changing them on one
+        object does not change them on the other.
+        """
+        attributes = {k: copy.copy(v) if isinstance(v, (list, dict, set)) else v
+                      for k, v in vars(self).items() if k != '_df'}
+        return self.from_validated(df, **attributes)
+
     def __getattr__(self, name):
         """
         According to the docs, this should only be triggered if self.__getattribute__()
@@ -152,7 +182,7 @@ class DataSet(object):
         mask = self._df[col].isin(lst_items)
         excluded = self._df.loc[ ~mask ]
         self._df = self._df.loc[ mask ]
-        return type(self)(excluded)
+        return self._derived(excluded)
 
     def test_group_means(self, category_label, data_label, anova_alpha=0.05, hsd_confidence_level=0.95,
                          *args, **kwargs):
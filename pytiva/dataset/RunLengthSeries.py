@@ -0,0 +1,291 @@
+
+import numpy as np
+import pandas as pd
+
+
+class RunLengthSeries(object):
+    """
+    A step-function time series stored as change points: values[i] holds from times[i] until times[i + 1], and the
+    last value holds from times[-1] through end.
+
+    Long stretches of a repeated value (e.g. minute-level concurrency overnight) take one entry instead of one row
+    per time step. Densifying, resampling and aggregating are all computed directly from the runs.
+    """
+
+    def __init__(self, times, values, end=None, name='value', compress=True):
+        """
+        :param times: sorted datetime64 array-like of change points
+        :param values: array-like of the value starting at each change point
+        :param end: optional timestamp-like; the series is defined through end (by default, the last change point)
+        :param name: label for the values, used when converting to pandas objects
+        :param compress: drop change points whose value equals the one before
+        """
+        times = np.asarray(times, dtype='datetime64[ns]')
+        values = np.asarray(values)
+
+        if compress and len(values) > 0:
+            changed = np.ones(len(values), dtype=bool)
+            changed[1:] = values[1:] != values[:-1]
+            end = times[-1] if end is None else end
+            times, values = times[changed], values[changed]
+
+        self.times = times
+        self.values = values
+        self.end = (times[-1] if len(times) > 0 else np.datetime64('NaT', 'ns')) if end is None \
+            else pd.Timestamp(end).to_datetime64().astype('datetime64[ns]')
+        self.name = name
+
+    def __len__(self):
+        return len(self.times)
+
+    def __repr__(self):
+        return f'<RunLengthSeries "{self.name}": {len(self)} runs from {self.start} through {self.end}>'
+
+    @property
+    def start(self):
+        return self.times[0] if len(self.times) > 0 else np.datetime64('NaT', 'ns')
+
+    @property
+    def durations(self):
+        """
+        Length of each run, as timedelta64; the last run lasts until end.
+        """
+        return np.diff(np.append(self.times, self.end))
+
+    @classmethod
+    def from_series(cls, series, end=None):
+        """
+        Build from a pandas Series with a sorted DatetimeIndex, e.g. a dense series from concurrency_ts(). By default
+        the series is defined through its last timestamp.
+        """
+        if end is None and len(series) > 0:
+            end = series.index[-1]
+
+        return cls(series.index.values, series.values, end=end, name=series.name)
+
+    def to_series(self):
+        """
+        The change points as a pandas Series.
+        """
+        return pd.Series(self.values, index=pd.DatetimeIndex(self.times), name=self.name)
+
+    def value_at(self, points):
+        """
+        Value held at each of points; NaN outside of [start, end].
+        """
+        points = np.asarray(points, dtype='datetime64[ns]')
+        positions = np.searchsorted(self.times, points, side='right') - 1
+        inside = (positions >= 0) & (points <= self.end)
+
+        values = np.full(len(points), np.nan)
+        values[inside] = self.values[positions[inside]]
+        if inside.all() and self.values.dtype.kind in 'iub':
+            return values.astype(self.values.dtype)
+
+        return values
+
+    def densify(self, freq, start=None, end=None):
+        """
+        A pandas Series with one value per step of freq, from start (by default the first change point) through end
+        (by default self.end).
+        """
+        index = pd.date_range(start=self.start if start is None else start,
+                              end=self.end if end is None else end, freq=freq)
+        return pd.Series(self.value_at(index.values), index=index, name=self.name)
+
+    def split_at(self, edges):
+        """
+        Split runs wherever they cross one of edges (e.g. hour boundaries), so that each piece falls within a single
+        bin.
+
+        :param edges: datetime64 array-like of boundaries
+        :return: 3-tuple of numpy arrays (piece starts, piece values, piece durations) covering [start, end]; the
+            closing point at end is kept as a zero-length piece
+        """
+        edges = np.asarray(edges, dtype='datetime64[ns]')
+        edges = edges[(edges > self.start) & (edges < self.end)]
+        bounds = np.union1d(np.append(self.times, self.end), edges)
+
+        positions = np.searchsorted(self.times, bounds, side='right') - 1
+        values = self.values[positions]
+        durations = np.diff(np.append(bounds, self.end))
+        return bounds, values, durations
+
+    def resample(self, freq, how='mean', fill_value=None):
+        """
+        Aggregate into bins of freq, computed from the runs that overlap each bin. As with pandas resampling, fixed
+        frequencies count bins from midnight of the first day, and calendar frequencies (e.g. 'MS') from the period
+        holding the first change point.
+
+        :param freq: a pandas frequency string or offset, e.g. '15Min' or 'H'
+        :param how: 'mean' for the time-weighted mean, 'max', 'min', or a collection of these
+        :param fill_value: optional value the series is known to take before start and from end onwards (e.g. 0 for
+            concurrency); if given, the first and last bins are aggregated over their whole width rather than over
+            the part within [start, end]
+        :return: pandas Series (or DataFrame, if how is a collection) indexed by bin start
+        """
+        if fill_value is not None and len(self) > 0:
+            return self._padded_to_bins(freq, fill_value).resample(freq, how=how).iloc[:-1]
+
+        edges = pd.date_range(start=self._first_bin(freq), end=self.end, freq=freq)
+        bounds, values, durations = self.split_at(edges.values)
+
+        bins = np.searchsorted(edges.values, bounds, side='right') - 1
+        first = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        seconds = durations / np.timedelta64(1, 's')
+        values = values.astype(np.float64)
+
+        aggregated = {}
+        for h in ([how] if isinstance(how, str) else how):
+            if h == 'mean':
+                total = np.add.reduceat(seconds, first)
+                weighted = np.add.reduceat(values * seconds, first)
+                # a bin holding only the closing point at end has no duration; report the value there
+                aggregated[h] = np.where(total > 0, weighted / np.where(total > 0, total, 1), values[first])
+            elif h == 'max':
+                aggregated[h] = np.maximum.reduceat(values, first)
+            elif h == 'min':
+                aggregated[h] = np.minimum.reduceat(values, first)
+            else:
+                raise Exception(f'how must be "mean", "max" or "min" (got "{h}")')
+
+        index = pd.DatetimeIndex(edges.values[bins[first]], name=None)
+        if isinstance(how, str):
+            return pd.Series(aggregated[how], index=index, name=self.name)
+
+        return pd.DataFrame(aggregated, index=index)
+
+    def _padded_to_bins(self, freq, fill_value):
+        """
+        This series extended with fill_value from the start of its first bin of freq, and from end through the end of
+        its last bin; the value at end itself becomes fill_value.
+        """
+        first = self._first_bin(freq)
+        last = pd.date_range(start=first, end=self.end, freq=freq)[-1] + pd.tseries.frequencies.to_offset(freq)
+
+        before = self.times < self.end
+        times = np.append(self.times[before], self.end)
+        values = np.append(self.values[before], fill_value)
+        if first < pd.Timestamp(self.start):
+            times = np.insert(times, 0, first.to_datetime64())
+            values = np.insert(values, 0, fill_value)
+
+        return RunLengthSeries(times, values, end=last, name=self.name)
+
+    def _first_bin(self, freq):
+        start = pd.Timestamp(self.start)
+        offset = pd.tseries.frequencies.to_offset(freq)
+        if isinstance(offset, pd.tseries.offsets.Tick):
+            midnight = start.normalize()
+            return midnight + ((start - midnight) // offset.delta) * offset.delta
+
+        return offset.rollback(start.normalize())
+
+    def time_weighted_mean(self):
+        """
+        Mean value over [start, end], weighting each run by how long it lasts.
+        """
+        seconds = self.durations / np.timedelta64(1, 's')
+        if seconds.sum() == 0:
+            return float(self.values[-1]) if len(self) > 0 else np.nan
+
+        return float(np.sum(self.values * seconds) / seconds.sum())
+
+    def mean(self, freq=None):
+        """
+        Mean value. Without freq, the time-weighted mean; with freq, the mean of densify(freq) (counting the samples
+        each run would produce, without producing them).
+        """
+        if freq is None:
+            return self.time_weighted_mean()
+
+        samples = self._samples_per_run(freq)
+        return float(np.sum(self.values * samples) / samples.sum())
+
+    def _samples_per_run(self, freq):
+        step = self._as_timedelta64(freq)
+        offsets = np.append(self.times, self.end) - self.start
+
+        # samples fall at start + k * step, for k from 0 through (end - start) // step
+        first_sample = -(-offsets // step)
+        first_sample[-1] = (self.end - self.start) // step + 1
+        return np.diff(first_sample)
+
+    @staticmethod
+    def _as_timedelta64(freq):
+        return pd.tseries.frequencies.to_offset(freq).delta.to_timedelta64()
+
+    def _window_ends(self, stride):
+        stride = self._as_timedelta64(stride)
+        return np.arange(self.start + stride, self.end + np.timedelta64(1, 'ns'), stride)
+
+    def rolling_max(self, window, stride='1Min'):
+        """
+        Maximum over the trailing window [t - window, t), at every t from start + stride through end in steps of
+        stride. The runs overlapping each window are a contiguous range found with searchsorted(), and the maximum of
+        every range comes from a sparse table of maxima over power-of-two spans of runs, so the cost is
+        O(runs log runs + windows) for any window length, without a Python loop over the windows.
+
+        :param window: a fixed frequency string or timedelta, e.g. '30Min'
+        :param stride: spacing of the windows, e.g. '1Min' or '15Min'
+        :return: pandas Series indexed by window end
+        """
+        window = self._as_timedelta64(window).astype(np.int64)
+        window_ends = self._window_ends(stride)
+        t = window_ends.astype(np.int64)
+
+        run_ends = np.append(self.times[1:], self.end).astype(np.int64)
+        # the runs from the first one ending after t - window through the last one starting before t
+        lo = np.searchsorted(run_ends, t - window, side='right')
+        hi = np.searchsorted(self.times.astype(np.int64), t, side='left') - 1
+
+        # table[k][i] is the maximum of the 2 ** k runs from run i
+        table = [self.values]
+        while 2 ** len(table) <= len(self.values):
+            previous, half = table[-1], 2 ** (len(table) - 1)
+            table.append(np.maximum(previous[:-half], previous[half:]))
+
+        # each range is covered by two (possibly overlapping) spans of the largest power of two that fits in it
+        levels = np.floor(np.log2(hi - lo + 1)).astype(np.int64)
+        maxima = np.empty(len(t), dtype=self.values.dtype)
+        for k in np.unique(levels):
+            at = levels == k
+            maxima[at] = np.maximum(table[k][lo[at]], table[k][hi[at] - 2 ** k + 1])
+
+        return pd.Series(maxima, index=pd.DatetimeIndex(window_ends), name=self.name, dtype=self.values.dtype)
+
+    def rolling_mean(self, window, stride='1Min'):
+        """
+        Time-weighted mean over the trailing window [t - window, t), at every t from start + stride through end in
+        steps of stride; windows reaching back before start are averaged over the part after start. Each window is
+        the difference of two lookups into the running integral of the series, so the cost does not depend on the
+        window length.
+
+        :param window: a fixed frequency string or timedelta, e.g. '2H'
+        :param stride: spacing of the windows, e.g. '1Min' or '15Min'
+        :return: pandas Series indexed by window end
+        """
+        window = self._as_timedelta64(window)
+        window_ends = self._window_ends(stride)
+        window_starts = np.maximum(window_ends - window, self.start)
+
+        seconds = (window_ends - window_starts) / np.timedelta64(1, 's')
+        means = (self._integral(window_ends) - self._integral(window_starts)) / seconds
+        return pd.Series(means, index=pd.DatetimeIndex(window_ends), name=self.name)
+
+    def _integral(self, points):
+        """
+        Integral of the series (value x seconds) from start to each of points, which must lie within [start, end].
+        """
+        durations = self.durations / np.timedelta64(1, 's')
+        cumulative = np.concatenate([[0.], np.cumsum(self.values * durations)])
+
+        positions = np.searchsorted(self.times, points, side='right') - 1
+        elapsed = (points - self.times[positions]) / np.timedelta64(1, 's')
+        return cumulative[positions] + self.values[positions] * elapsed
+
+    def max(self):
+        return self.values.max()
+
+    def min(self):
+        return self.values.min()
@@ -1,8 +1,10 @@
 import operator
 
+import numpy as np
 import pandas as pd
 
 from .DataSet import DataSet
+from .RunLengthSeries import RunLengthSeries
 
 
 class TimeSeriesDataSet(DataSet):
@@ -11,9 +13,16 @@ class TimeSeriesDataSet(DataSet):
     DateTimeIndex of some kind. Expects data structured in two columns: index and value.
 
     May optionally have metadata for each time point as well, and these can be required in child classes.
+
+    With run_length, only the time points where some column changes are kept, rather than every time point between
+    start_dt and end_dt; densify() gives back the full series on demand.
     """
 
-    def __init__(self, data, start_dt=None, end_dt=None, fillna=0, freq='T', *args, **kwargs):
+    _run_length = False
+    _freq = None
+    _end_dt = None
+
+    def __init__(self, data, start_dt=None, end_dt=None, fillna=0, freq='T', run_length=False, *args, **kwargs):
         if start_dt is None:
             start_dt = data.index.min()
 
@@ -23,8 +32,52 @@ class TimeSeriesDataSet(DataSet):
         if freq is None:
             freq = data.index.freq
 
-        i = pd.date_range(start=start_dt, end=end_dt, freq=freq)
+        # without data or given bounds, there are no time points
+        if pd.isnull(start_dt) or pd.isnull(end_dt):
+            i = pd.DatetimeIndex([], freq=freq)
+        else:
+            i = pd.date_range(start=start_dt, end=end_dt, freq=freq)
 
         super().__init__(data, *args, **kwargs)
-        self._df = self._df.reindex(i).fillna(fillna)
+        self._run_length = run_length
+        self._freq = freq
+        self._end_dt = i[-1] if len(i) > 0 else None
+
+        if run_length:
+            self._df = self._change_points(self._df, i, fillna)
+        else:
+            self._df = self._df.reindex(i).fillna(fillna)
         self._df.index.rename('ts_index', inplace=True)
+
+    @staticmethod
+    def _change_points(df, i, fillna):
+        """
+        The rows of df.reindex(i).fillna(fillna) where any column differs from the row before, without building the
+        reindexed frame: a value can only change at a supplied time point or at the time point right after one.
+        """
+        positions = i.get_indexer(df.index)
+        positions = positions[positions >= 0]
+        candidates = np.unique(np.concatenate([[0], positions, positions + 1]))
+        candidates = candidates[candidates < len(i)]
+
+        points = df.reindex(i[candidates]).fillna(fillna)
+        changed = points.ne(points.shift()).any(axis=1).values
+        changed[:1] = True
+        return points[changed]
+
+    def densify(self):
+        """
+        The series at every time point between its start and end, as a DataFrame; in run-length mode, forward-filled
+        from the change points.
+        """
+        if not self._run_length:
+            return self._df.copy()
+
+        i = pd.date_range(start=self._df.index.min(), end=self._end_dt, freq=self._freq, name=self._df.index.name)
+        return self._df.reindex(i).fillna(method='ffill')
+
+    def to_run_length(self, column):
+        """
+        A RunLengthSeries of column, for resampling and aggregating without a dense series.
+        """
+        return RunLengthSeries(self._df.index.values, self._df[column].values, end=self._end_dt, name=column)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+
+class TimeSeriesPyramid(object):
+    """
+    A RunLengthSeries summarized once at several coarser resolutions, each bin holding the time-weighted mean, the
+    maximum and the minimum of the series within it (see RunLengthSeries.resample()). Unlike forward-filling onto a
+    coarser grid, no peak or trough inside a bin is lost.
+
+    query() picks the finest level that keeps a time range within a number of points, so drawing a year of minute-level
+    concurrency only reads a few hundred precomputed daily bins.
+    """
+
+    _aggregations = ['mean', 'max', 'min']
+
+    def __init__(self, series, levels=('5Min', '15Min', 'H', 'D')):
+        """
+        :param series: a RunLengthSeries, e.g. from ActivityDataSet.concurrency_ts(run_length=True)
+        :param levels: frequencies to summarize at, from finest to coarsest
+        """
+        self.series = series
+        self.levels = list(levels)
+        self._tables = {freq: series.resample(freq, how=self._aggregations) for freq in self.levels}
+
+    def __repr__(self):
+        sizes = ', '.join(f'{freq}: {len(table)}' for freq, table in self._tables.items())
+        return f'<TimeSeriesPyramid of {len(self.series)} runs; bins per level {sizes}>'
+
+    def level(self, freq):
+        """
+        The table of bins at freq, one of self.levels: a DataFrame indexed by bin start with mean, max and min columns.
+        """
+        return self._tables[freq]
+
+    @staticmethod
+    def _window_bounds(index, start, end):
+        # a bin (or run) starting before start still overlaps the range, up to the next one starting after start
+        lo = max(index.searchsorted(start, side='right') - 1, 0) if start is not None else 0
+        hi = index.searchsorted(end, side='right') if end is not None else len(index)
+        return lo, hi
+
+    def query(self, start=None, end=None, max_points=1000):
+        """
+        Summary of the series between start and end with at most max_points rows where possible: the change points
+        themselves if there are few enough, otherwise the finest level with few enough bins (or the coarsest level).
+
+        :param start: optional timestamp-like; by default, the start of the series
+        :param end: optional timestamp-like; by default, the end of the series
+        :param max_points: largest number of rows wanted
+        :return: DataFrame indexed by change point or bin start, with mean, max and min columns; the chosen level
+            (None for change points) is in its attrs['freq']
+        """
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+
+        times = pd.DatetimeIndex(self.series.times)
+        lo, hi = self._window_bounds(times, start, end)
+        if hi - lo <= max_points or not self.levels:
+            values = self.series.values[lo:hi].astype(np.float64)
+            window = pd.DataFrame({a: values for a in self._aggregations}, index=times[lo:hi])
+            window.attrs['freq'] = None
+            return window
+
+        for freq in self.levels:
+            table = self._tables[freq]
+            lo, hi = self._window_bounds(table.index, start, end)
+            if hi - lo <= max_points or freq == self.levels[-1]:
+                window = table.iloc[lo:hi].copy()
+                window.attrs['freq'] = freq
+                return window
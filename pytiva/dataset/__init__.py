@@ -1,2 +1,4 @@
 from .DataSet import DataSet
+from .RunLengthSeries import RunLengthSeries
 from .TimeSeriesDataSet import TimeSeriesDataSet
+from .TimeSeriesPyramid import TimeSeriesPyramid
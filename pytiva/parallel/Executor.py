@@ -0,0 +1,126 @@
+import atexit
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from multiprocessing import resource_tracker
+
+from .SharedFrame import SharedFrame
+from .utils import default_n_workers, chunked, chunksize_for, _apply_to_chunk
+
+# executors with a pool running, shut down when the interpreter exits if close() was never called
+_RUNNING = weakref.WeakSet()
+
+
+class Executor(object):
+    """
+    Runs a function over many inputs, serially, on a pool of threads or on a pool of processes.
+
+    The pool is started on first use and kept alive across calls until close(), so repeated parallel work does not
+    pay for starting workers every time. Inputs are sent in chunks (see utils.chunksize_for()) rather than one task
+    per input, and large DataFrames should be published once with share() and looked up by the function through the
+    returned SharedFrame, rather than included in every input.
+
+    In 'process' mode, the function and inputs must be picklable, i.e. module-level functions or methods rather than
+    lambdas.
+    """
+
+    _modes = ['serial', 'thread', 'process']
+
+    def __init__(self, mode='serial', n_workers=None, chunks_per_worker=4):
+        """
+        :param mode: 'serial', 'thread' or 'process'
+        :param n_workers: number of threads or processes; by default, one fewer than the number of CPUs
+        :param chunks_per_worker: about how many chunks to split each map() call into per worker
+        """
+        if mode not in self._modes:
+            raise Exception(f'mode must be one of {self._modes} (got "{mode}")')
+
+        self.mode = mode
+        self.n_workers = default_n_workers() if n_workers is None else n_workers
+        self.chunks_per_worker = chunks_per_worker
+        self._pool = None
+
+    def __repr__(self):
+        state = 'running' if self._pool is not None else 'idle'
+        return f'<Executor: {self.mode}, {self.n_workers} workers, {state}>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def parallel(self):
+        return self.mode != 'serial' and self.n_workers > 1
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            if self.mode == 'thread':
+                self._pool = ThreadPoolExecutor(max_workers=self.n_workers)
+            else:
+                if os.name == 'posix':
+                    # workers must share this process's resource tracker, so that attaching to a SharedFrame's
+                    # blocks does not leave each worker's own tracker to unlink them when it exits
+                    resource_tracker.ensure_running()
+                self._pool = ProcessPoolExecutor(max_workers=self.n_workers)
+            _RUNNING.add(self)
+
+        return self._pool
+
+    def map(self, func, items, chunksize=None):
+        """
+        [func(item) for item in items], computed by the workers in chunks; results keep the order of items.
+
+        :param func: function of one argument
+        :param items: iterable of arguments
+        :param chunksize: optional number of items per task; by default, see utils.chunksize_for()
+        :return: list
+        """
+        items = list(items)
+        if not self.parallel or len(items) <= 1:
+            return [func(item) for item in items]
+
+        if chunksize is None:
+            chunksize = chunksize_for(len(items), self.n_workers, self.chunks_per_worker)
+
+        results = []
+        for chunk_results in self.pool.map(partial(_apply_to_chunk, func), chunked(items, chunksize)):
+            results.extend(chunk_results)
+
+        return results
+
+    def share(self, df):
+        """
+        Publish DataFrame df to the workers once; in 'process' mode, through shared memory. Close the returned
+        SharedFrame when the work is done, e.g. by using it in a with statement.
+
+        :return: SharedFrame
+        """
+        return SharedFrame(df, use_shared_memory=self.mode == 'process' and self.parallel)
+
+    def close(self):
+        """
+        Shut down the pool, if one is running; it is started again if the Executor is used afterwards.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            _RUNNING.discard(self)
+
+
+@atexit.register
+def _close_running():
+    for executor in list(_RUNNING):
+        executor.close()
+
+
+# shared by the methods that accept an executor, e.g. ActivityDataSet._collect_concurrency(mp=True); serial unless
+# switched over, e.g. EXECUTOR.mode = 'process', in which case its pool stays up until close() or exit
+EXECUTOR = Executor(mode='serial')
+
+# used by ActivityDataSet._collect_concurrency(mp=True) while EXECUTOR is serial; its pool is started on first use and
+# kept across calls until close() or exit
+PROCESS_EXECUTOR = Executor(mode='process')
@@ -0,0 +1,132 @@
+import pickle
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# frames attached so far in this (worker) process, most recent last, so a worker attaches a frame once rather than once
+# per task; older ones are dropped, which unmaps their blocks once nothing refers to them any more
+_ATTACHED = OrderedDict()
+_ATTACHED_LIMIT = 4
+
+
+class SharedFrame(object):
+    """
+    The columns of a DataFrame published once for worker processes to read, instead of pickled into every task.
+
+    With use_shared_memory, each column is copied into its own multiprocessing.shared_memory block; numeric, datetime
+    and timedelta columns are stored as they are, anything else as integer codes plus a block holding its pickled
+    distinct values. Pickling a SharedFrame then only sends block names and dtypes, and to_df() in a worker process
+    rebuilds the DataFrame on views of the blocks, unpickling the distinct values once per worker. Without it (for
+    serial or thread execution, which share memory anyway), the DataFrame is simply held and returned.
+
+    The index is not kept: to_df() returns a RangeIndex. The creating process should call close() (or use the
+    SharedFrame as a context manager) once the work is done, to free the blocks.
+    """
+
+    def __init__(self, df, use_shared_memory=True):
+        """
+        :param df: DataFrame to publish
+        :param use_shared_memory: copy the columns into shared memory blocks for worker processes
+        """
+        self.columns = list(df.columns)
+        self.length = len(df)
+        self._specs = []
+        self._blocks = []
+        self._df = df.reset_index(drop=True)
+
+        if not use_shared_memory:
+            return
+
+        for column in self.columns:
+            values = df[column].values
+            categories = None
+
+            if not isinstance(values, np.ndarray) or values.dtype.kind not in 'biufcmM':
+                values, uniques = pd.factorize(df[column])
+                payload = pickle.dumps(uniques, protocol=pickle.HIGHEST_PROTOCOL)
+                categories = (self._create_block(np.frombuffer(payload, dtype=np.uint8)).name, len(payload))
+
+            values = np.ascontiguousarray(values)
+            block = self._create_block(values)
+            self._specs.append((column, block.name, values.dtype.str, categories, df[column].dtype))
+
+    def _create_block(self, values):
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        self._blocks.append(block)
+        return block
+
+    def __getstate__(self):
+        return {'columns': self.columns, 'length': self.length, '_specs': self._specs,
+                '_df': None if self._specs else self._df}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._blocks = []
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        where = f'{len(self._specs)} shared memory blocks' if self._specs else 'process memory'
+        return f'<SharedFrame: {self.length} rows, {len(self.columns)} columns in {where}>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _attach(self):
+        blocks, columns = [], {}
+        for column, name, dtype, categories, original_dtype in self._specs:
+            # worker processes share the creating process's resource tracker, so attaching registers nothing new
+            block = shared_memory.SharedMemory(name=name)
+            values = np.ndarray((self.length,), dtype=np.dtype(dtype), buffer=block.buf)
+            if categories is not None:
+                categories_name, categories_nbytes = categories
+                categories_block = shared_memory.SharedMemory(name=categories_name)
+                uniques = pickle.loads(bytes(categories_block.buf[:categories_nbytes]))
+                categories_block.close()
+                values = pd.Series(pd.Categorical.from_codes(values, uniques)).astype(original_dtype).values
+
+            blocks.append(block)
+            columns[column] = values
+
+        return blocks, pd.DataFrame(columns, columns=self.columns, copy=False)
+
+    def to_df(self):
+        """
+        The published DataFrame; in a worker process, built on views of the shared blocks the first time it is asked
+        for and reused afterwards. Treat it as read-only.
+        """
+        if self._df is not None:
+            return self._df
+
+        key = self._specs[0][1]
+        if key not in _ATTACHED:
+            _ATTACHED[key] = self._attach()
+            while len(_ATTACHED) > _ATTACHED_LIMIT:
+                blocks, df = _ATTACHED.popitem(last=False)[1]
+                del df
+                for block in blocks:
+                    try:
+                        block.close()
+                    except BufferError:
+                        # a caller still holds views; the block is unmapped once they are gone
+                        pass
+
+        _ATTACHED.move_to_end(key)
+        return _ATTACHED[key][1]
+
+    def close(self):
+        """
+        Free the shared memory blocks; only meaningful in the process that created this SharedFrame.
+        """
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+
+        self._blocks = []
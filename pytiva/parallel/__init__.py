@@ -0,0 +1,6 @@
+# local modules
+from .Executor import Executor, EXECUTOR, PROCESS_EXECUTOR
+from .SharedFrame import SharedFrame
+
+# helper functions
+from .utils import *
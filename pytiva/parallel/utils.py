@@ -0,0 +1,34 @@
+import math
+import os
+
+
+def default_n_workers():
+    """
+    Number of workers to use when none is given: one fewer than the number of CPUs, leaving one for the calling
+    process, and at least one.
+    """
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def chunked(items, chunksize):
+    """
+    Split sequence items into consecutive lists of at most chunksize items.
+
+    :param items: a sequence, e.g. a list or numpy array
+    :param chunksize: positive int
+    :return: list of lists
+    """
+    return [list(items[i:i + chunksize]) for i in range(0, len(items), chunksize)]
+
+
+def chunksize_for(n_items, n_workers, chunks_per_worker=4):
+    """
+    Items per chunk so that n_items make about chunks_per_worker chunks for each of n_workers: few enough that
+    scheduling and pickling overhead stays small, and enough that one slow chunk does not hold up the rest.
+    """
+    return max(1, math.ceil(n_items / (n_workers * chunks_per_worker)))
+
+
+def _apply_to_chunk(func, chunk):
+    # module-level, so that process pools can pickle it along with func
+    return [func(item) for item in chunk]
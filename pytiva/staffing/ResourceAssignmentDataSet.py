@@ -1,4 +1,4 @@
-from ..activity import ActivityDataSet
+from ..activity import ActivityDataSet, ActivityArray
 from .StaffingDataSet import StaffingDataSet
 from ..dataset.TimeSeriesDataSet import TimeSeriesDataSet
 from . import utils
@@ -50,7 +50,7 @@ class ResourceAssignmentDataSet(StaffingDataSet):
                     'activity_start': d + s.start,
                     'activity_end': d + s.start + s.duration,
                     'activity': s.label,
-                    'personnel': assignment['staff'],
+                    'personnel': assignment.get('staff'),
                     'capacity': s.capacity
                 }
                 staffing_slots.append(slot)
@@ -75,7 +75,12 @@ class ResourceAssignmentDataSet(StaffingDataSet):
         ]
         return slots
 
-    def generate_capacity_tsds(self, provider_shift_dict, start_dt=None, end_dt=None, fillna=0, freq='1Min'):
+    @staticmethod
+    def _no_capacity():
+        return pd.DataFrame({'capacity': pd.Series([], dtype=float)}, index=pd.DatetimeIndex([], name='datetime_slot'))
+
+    def generate_capacity_tsds(self, provider_shift_dict, start_dt=None, end_dt=None, fillna=0, freq='1Min',
+                               engine='sweep'):
         """
         Use this DataSet and a dictionary of ProviderShift objects to "translate"
         assignments into capacity at each moment in time, to a resolution of
@@ -87,11 +92,58 @@ class ResourceAssignmentDataSet(StaffingDataSet):
         :param end_dt:
         :param fillna:
         :param freq:
+        :param engine: 'sweep' (default) sums shift capacity with the same weighted concurrency used for clinical
+            activity (ActivityArray.concurrency_at() with weights); 'slots' expands every shift into one row per time
+            slot and sums those, and is kept for verification. Either way, each shift has a slot of freq at its start
+            and at every step of freq after it, as many as fit whole within the shift (see
+            ProviderShift.dump_slots_as_dicts())
         :return:
         """
-        data = pd.DataFrame(
-            pd.DataFrame(self._generate_capacity_slots(
-                provider_shift_dict, freq
-            )).groupby(['datetime_slot'])['capacity'].sum()
-        )
+        if engine not in ['sweep', 'slots']:
+            raise Exception(f'engine must be "sweep" or "slots" (got "{engine}")')
+
+        if len(self._df) == 0 or len(provider_shift_dict) == 0:
+            # no shifts, so no capacity at any time
+            data = self._no_capacity()
+        elif engine == 'sweep':
+            data = self._capacity_from_shift_activity(provider_shift_dict, freq)
+        else:
+            slots = self._generate_capacity_slots(provider_shift_dict, freq)
+            # shifts shorter than freq have no slots
+            data = pd.DataFrame(
+                pd.DataFrame(slots).groupby(['datetime_slot'])['capacity'].sum()
+            ) if slots else self._no_capacity()
+
         return TimeSeriesDataSet(data=data, start_dt=start_dt, end_dt=end_dt, freq=freq, fillna=fillna)
+
+    def _capacity_from_shift_activity(self, provider_shift_dict, freq):
+        """
+        The capacity _generate_capacity_slots() gives, without a row per shift and slot: each shift is cut back to the
+        slots that fit whole within it, and shifts are swept by weighted concurrency at the slot times of their own
+        phase (their start modulo freq, relative to the earliest shift), since a slot only counts the shifts whose
+        slots fall on exactly that time.
+        """
+        ads = self.generate_activity_from_ps_dict(provider_shift_dict)
+        starts = ads['activity_start']
+        step = pd.to_timedelta(freq)
+        n_slots = (ads['activity_end'] - starts) // step
+
+        shifts = pd.DataFrame({
+            'activity_start': starts,
+            'activity_end': starts + n_slots * step,
+            'capacity': ads['capacity'],
+            'phase': (starts - starts.min()) % step
+        })[n_slots > 0]
+        if len(shifts) == 0:
+            return self._no_capacity()
+
+        pieces = []
+        for phase, df_phase in shifts.groupby('phase'):
+            slots = pd.date_range(start=df_phase['activity_start'].min(), end=(df_phase['activity_end'] - step).max(),
+                                  freq=freq)
+            activity_array = ActivityArray.from_df(df_phase, weight_col='capacity')
+            pieces.append(pd.Series(activity_array.concurrency_at(slots.values), index=slots))
+
+        data = pd.concat(pieces).groupby(level=0).sum().to_frame('capacity')
+        data.index.name = 'datetime_slot'
+        return data
@@ -0,0 +1,163 @@
+import copy
+import os
+import pickle
+from collections import OrderedDict
+
+import pandas as pd
+
+
+class ResultCache(object):
+    """
+    Cache of computed results under content fingerprints (see pytiva.utils.content_fingerprint()), so repeating a
+    computation on identical data and parameters returns the stored result instead.
+
+    Two tiers:
+        * in memory, least recently used first out once the stored results exceed memory_budget bytes
+        * optionally on disk, as one pickle per result in cache_dir, which outlives the Python session
+
+    Results are copied on the way out, so changing a returned result never changes what is stored.
+    """
+
+    def __init__(self, memory_budget=256 * 2 ** 20, cache_dir=None):
+        """
+        :param memory_budget: approximate size in bytes the in-memory tier may hold; 0 keeps nothing in memory
+        :param cache_dir: optional directory for the on-disk tier; created if it does not exist
+        """
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self.memory_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return f'<ResultCache: {len(self)} results, {self.memory_bytes} of {self.memory_budget} bytes, ' \
+               f'hits={self.hits} (disk {self.disk_hits}), misses={self.misses}>'
+
+    @property
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'results_in_memory': len(self),
+            'memory_bytes': self.memory_bytes
+        }
+
+    @staticmethod
+    def _size_of(value):
+        df = getattr(value, '_df', value)
+        if isinstance(df, (pd.DataFrame, pd.Series)):
+            return int(df.memory_usage(deep=True).sum())
+
+        return len(pickle.dumps(value))
+
+    @staticmethod
+    def _copy(value):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return value.copy()
+
+        return copy.deepcopy(value)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def _remember(self, key, value):
+        size = self._size_of(value)
+        if size > self.memory_budget:
+            return
+
+        self._entries[key] = value
+        self._sizes[key] = size
+        self.memory_bytes += size
+
+        while self.memory_bytes > self.memory_budget:
+            evicted, _ = self._entries.popitem(last=False)
+            self.memory_bytes -= self._sizes.pop(evicted)
+
+    def get(self, key, default=None, copy_func=None):
+        """
+        The result stored under key, or default if there is none.
+
+        :param copy_func: optional function copying a result; by default DataFrame.copy() or copy.deepcopy()
+        """
+        copy_func = self._copy if copy_func is None else copy_func
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy_func(self._entries[key])
+
+        if self.cache_dir is not None and os.path.exists(self._path(key)):
+            with open(self._path(key), 'rb') as f:
+                value = pickle.load(f)
+
+            self._remember(key, value)
+            self.hits += 1
+            self.disk_hits += 1
+            return copy_func(value)
+
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """
+        Store value under key, in memory if it fits the budget and on disk if cache_dir is set.
+        """
+        if key in self._entries:
+            self.memory_bytes -= self._sizes.pop(key)
+            del self._entries[key]
+
+        self._remember(key, value)
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # write to a temporary file first, so a reader never sees a partial pickle
+            temporary_path = f'{self._path(key)}.{os.getpid()}.tmp'
+            with open(temporary_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self._path(key))
+
+    def get_or_compute(self, key, compute, copy_func=None):
+        """
+        The result stored under key if there is one; otherwise compute(), stored under key. Either way, a copy.
+
+        :param key: a content fingerprint of everything the result depends on
+        :param compute: function of no arguments returning the result
+        :param copy_func: optional function copying a result; see get()
+        """
+        missing = object()
+        value = self.get(key, default=missing, copy_func=copy_func)
+        if value is not missing:
+            return value
+
+        value = compute()
+        self.put(key, value)
+        return (self._copy if copy_func is None else copy_func)(value)
+
+    def clear(self, disk=False):
+        """
+        Forget every result held in memory and reset the counters; with disk, also delete the on-disk tier.
+        """
+        self._entries.clear()
+        self._sizes.clear()
+        self.memory_bytes = 0
+        self.hits = self.disk_hits = self.misses = 0
+
+        if disk and self.cache_dir is not None and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+
+# a cache to share between datasets; nothing is memoized unless a dataset is given a cache, e.g.
+# ds._result_cache = RESULT_CACHE for one dataset or ActivityDataSet._result_cache = RESULT_CACHE for all of them
+RESULT_CACHE = ResultCache()
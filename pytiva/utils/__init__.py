@@ -1 +1,2 @@
 from .utils import *
+from .ResultCache import ResultCache, RESULT_CACHE
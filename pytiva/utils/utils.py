@@ -1,6 +1,7 @@
 import hashlib
 import os
 import random
+import numpy as np
 import pandas as pd
 
 
@@ -29,13 +30,14 @@ def hash_and_slash(x, slice_size=200):
     return slashed
 
 
-def hash_cols_in_df(df, cols, hash_func=None):
+def hash_cols_in_df(df, cols, hash_func=None, executor=None):
     """
     # hash these columns, obfuscating their contents
     # but do so in a fashion that makes the same hash for each input value
     :param df: DataFrame
     :param hash_func:
     :param cols:
+    :param executor: optional pytiva.parallel.Executor to hash the distinct values of each column with
     :return: a hashed version of the DataFrame
     """
     df_out = df.copy()
@@ -46,13 +48,102 @@ def hash_cols_in_df(df, cols, hash_func=None):
     for h in cols:
         if h in df_out.columns:
             h_unique_vals = [str(s) for s in df_out[h].unique()]
-            h_hashmap = {v: hash_func(v) for v in h_unique_vals}
+            if executor is None:
+                h_hashmap = {v: hash_func(v) for v in h_unique_vals}
+            else:
+                h_hashmap = dict(zip(h_unique_vals, executor.map(hash_func, h_unique_vals)))
 
             df_out[h] = df_out[h].astype(str).map(h_hashmap)
 
     return df_out
 
 
+def partition_by_strata(df, strata_cols):
+    """
+    Partition the rows of DataFrame df by the combinations of values in strata_cols that actually occur, with one
+    groupby and one stable sort instead of a filter per possible combination.
+
+    Rows with a missing value in any of strata_cols belong to no stratum.
+
+    :param df: DataFrame
+    :param strata_cols: collection of column labels
+    :return: 3-tuple of (list of key tuples in order of first appearance, numpy array of row positions grouped by
+        stratum, numpy array of boundaries), so the rows of stratum i are at positions order[bounds[i]:bounds[i + 1]]
+    """
+    strata_cols = list(strata_cols)
+    codes = df.groupby(strata_cols, sort=False).ngroup().fillna(-1).values.astype(np.int64)
+
+    order = np.argsort(codes, kind='stable')
+    order = order[np.searchsorted(codes[order], 0):]
+    bounds = np.searchsorted(codes[order], np.arange(codes.max(initial=-1) + 2))
+
+    keys = list(df[strata_cols].take(order[bounds[:-1]]).itertuples(index=False, name=None))
+    return keys, order, bounds
+
+
+def iter_strata(df, strata_cols):
+    """
+    Iterate over the combinations of values in strata_cols that occur in DataFrame df, in order of first appearance.
+
+    Yields 2-tuples of (key tuple, row positions); positions are ascending within each stratum, suitable for
+    DataFrame.iloc, and are views into one shared array rather than copies.
+
+    :param df: DataFrame
+    :param strata_cols: collection of column labels
+    """
+    keys, order, bounds = partition_by_strata(df, strata_cols)
+    for i, key in enumerate(keys):
+        yield key, order[bounds[i]:bounds[i + 1]]
+
+
+def _update_fingerprint(digest, part):
+    """
+    Feed part into hashlib digest for content_fingerprint(), descending into lists, tuples, sets and dicts so that
+    the pandas and numpy objects inside them are hashed by value rather than by their (truncated) repr.
+    """
+    if isinstance(part, (pd.Index, np.ndarray)):
+        part = pd.Series(part)
+
+    if isinstance(part, (pd.DataFrame, pd.Series)):
+        digest.update(repr(part.dtypes.to_dict() if isinstance(part, pd.DataFrame) else part.dtype).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(part, index=False).values.tobytes())
+    elif isinstance(part, (list, tuple, set, frozenset, dict)):
+        if isinstance(part, dict):
+            items = sorted(part.items(), key=lambda item: repr(item[0]))
+        elif isinstance(part, (set, frozenset)):
+            items = sorted(part, key=content_fingerprint)
+        else:
+            items = part
+
+        # the container type and length, so that [('a', 1)] and {'a': 1} or ['a', 1] differ
+        digest.update(f'{type(part).__name__}:{len(part)}'.encode('utf-8'))
+        for item in items:
+            digest.update(b'\x01')
+            _update_fingerprint(digest, item)
+    else:
+        digest.update(repr(part).encode('utf-8'))
+
+
+def content_fingerprint(*parts):
+    """
+    A short hex digest identifying the content of parts, for use as a cache key. DataFrames and Series are hashed by
+    value with pandas.util.hash_pandas_object() (index ignored) along with their column labels and dtypes, as are
+    Index objects and numpy arrays, including those nested in lists, tuples, sets and dicts; anything else is hashed
+    by its repr, so other parameters should be plain values.
+
+    :param parts: pandas or numpy objects, or plain values such as strings, numbers, timestamps, lists and dicts
+    :return: str
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        _update_fingerprint(digest, part)
+
+        # separate parts, so that ('ab', 'c') and ('a', 'bc') differ
+        digest.update(b'\x00')
+
+    return digest.hexdigest()
+
+
 def random_timedelta(unit_range=[-1000000, 1000000], unit='S'):
     return pd.to_timedelta(random.randint(*unit_range), unit)
 
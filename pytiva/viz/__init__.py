@@ -1,2 +1,2 @@
-from .gantt import activity_data_to_gantt_data, gantt_plot
+from .gantt import activity_data_to_gantt_data, activity_data_to_gantt_data_by, gantt_plot
 from .lineplots import df_mean_rate_by_category, fig_lineplot_mean_rate_by_category
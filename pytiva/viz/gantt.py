@@ -1,6 +1,10 @@
+from functools import partial
+
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from ..utils import iter_strata
+
 
 def activity_data_to_gantt_data(
         df_data, strata=['activity'], start_col='activity_start',
@@ -26,23 +30,23 @@ def activity_data_to_gantt_data(
     df_gantt = pd.DataFrame(index=df_data.index)
 
     # generate task label entries according to intended stratification
-    # if strata is only ['activity'], this step (inefficiently) duplicates
-    # the existing activity labels
-    for i, row in df_data.iterrows():
-        df_gantt.loc[i, _gantt_task_label] = strata_separator.join(
-            f"{stratum}:{row[stratum]}" if include_label_in_stratification
-            else row[stratum]
-            for stratum in strata
-        )
-
-    # create unique label for each task
+    # if strata is only ['activity'], this step duplicates the existing activity labels
+    labels = [
+        f"{stratum}:" + df_data[stratum].astype(str) if include_label_in_stratification
+        else df_data[stratum]
+        for stratum in strata
+    ]
+    task_labels = labels[0]
+    for label in labels[1:]:
+        task_labels = task_labels + strata_separator + label
+    df_gantt[_gantt_task_label] = task_labels
+
+    # create unique label for each task, numbered in order of start
     # in effect, deal with possibility of repeat labels to not confuse the charting
-    a_counts = {a: 0 for a in df_gantt[_gantt_task_label].unique()}
-    for i, row in df_gantt.iterrows():
-        activity = df_gantt[_gantt_task_label].loc[i]
-        count = a_counts[activity] + 1
-        df_gantt.loc[i, _gantt_task_label] = f"{activity} {count}"
-        a_counts[activity] = count
+    numbered = df_gantt[_gantt_task_label].values.astype(object)
+    for (activity, ), positions in iter_strata(df_gantt, [_gantt_task_label]):
+        numbered[positions] = [f"{activity} {count}" for count in range(1, len(positions) + 1)]
+    df_gantt[_gantt_task_label] = numbered
 
     g_lower_bound = df_data[start_col].min()
 
@@ -53,6 +57,36 @@ def activity_data_to_gantt_data(
     return df_gantt.reset_index(drop=True)
 
 
+def _gantt_data_for_rows(frame, kwargs, positions):
+    # runs in a worker, on the rows at positions of the activity data published in SharedFrame frame
+    return activity_data_to_gantt_data(frame.to_df().iloc[positions], **kwargs)
+
+
+def activity_data_to_gantt_data_by(df_data, by='case_id', executor=None, **kwargs):
+    """
+    activity_data_to_gantt_data() separately for each value of by (e.g. one gantt chart per case), optionally spread
+    over the workers of a pytiva.parallel.Executor with df_data published to them once.
+
+    :param df_data: DataFrame of activity data
+    :param by: column label, or list of labels, to split by
+    :param executor: optional pytiva.parallel.Executor
+    :param kwargs: passed along to activity_data_to_gantt_data()
+    :return: dict of gantt DataFrames, keyed by value of by (a tuple of values if by is a list), in order of first
+        appearance
+    """
+    strata = [by] if isinstance(by, str) else list(by)
+    keys, positions = zip(*iter_strata(df_data, strata)) if len(df_data) > 0 else ((), ())
+    keys = [key[0] for key in keys] if isinstance(by, str) else list(keys)
+
+    if executor is None:
+        return {key: activity_data_to_gantt_data(df_data.iloc[p], **kwargs) for key, p in zip(keys, positions)}
+
+    with executor.share(df_data) as frame:
+        gantt_dfs = executor.map(partial(_gantt_data_for_rows, frame, kwargs), positions)
+
+    return dict(zip(keys, gantt_dfs))
+
+
 def gantt_plot(gantt_df, filepath_out=None, task_col='gtask', start_col='gstart',
                duration_col='gduration', figsize=(20, 30), hide_xaxis_label=True,
                title=None):
@@ -0,0 +1,61 @@
+import unittest
+import os
+import numpy as np
+import pandas as pd
+
+# local module to be tested
+from pytiva.activity import ActivityArray, ActivityDataSet
+
+# local test config
+import testconfig
+
+
+class TestActivityArray(unittest.TestCase):
+
+    def setUp(self):
+        self.ds_activity = ActivityDataSet(pd.read_csv(
+            os.path.join(testconfig.WD, testconfig.TESTDATA['DS_ACTIVITY']),
+            parse_dates=['activity_start', 'activity_end']
+        ))
+
+    def test_round_trip_shares_memory(self):
+        arr = self.ds_activity.to_activity_array(category_cols=['activity', 'case_id'])
+        self.assertTrue(np.shares_memory(arr.starts, self.ds_activity._df['activity_start'].values))
+
+        rebuilt = ActivityDataSet.from_activity_array(arr)
+        self.assertTrue(np.shares_memory(arr.ends, rebuilt._df['activity_end'].values))
+        self.assertTrue(all(rebuilt['case_id'].astype(str) == self.ds_activity['case_id'].astype(str)))
+        self.assertTrue(all(rebuilt['duration'] == self.ds_activity['duration']))
+
+    def test_merge_keeps_strata_codes(self):
+        arr = self.ds_activity.to_activity_array(category_cols=['case_id'])
+        merged = ActivityDataSet.from_activity_array(arr.merge(by=['case_id']))
+        expected = self.ds_activity.fetch_unduplicated_concurrency(strata=['case_id'])
+        self.assertTrue(all(merged['activity_start'] == expected['activity_start']))
+        self.assertTrue(all(merged['activity_end'] == expected['activity_end']))
+
+        for case_id, df_case in merged._df.groupby('case_id', observed=True):
+            original = self.ds_activity._df[self.ds_activity._df['case_id'] == case_id]
+            self.assertTrue(df_case['activity_start'].min() == original['activity_start'].min())
+
+    def test_offset_and_cap_duration(self):
+        arr = self.ds_activity.to_activity_array()
+        offset = arr.offset(pd.to_timedelta(5, unit='Min'), apply_to_start=False)
+        self.assertTrue(all(offset.ends - arr.ends == pd.to_timedelta(5, unit='Min').value))
+        self.assertTrue(offset.starts is arr.starts)
+
+        maximum_duration = pd.to_timedelta(30, unit='Min')
+        capped = arr.cap_duration(maximum_duration)
+        durations = capped.end_datetimes - capped.start_datetimes
+        self.assertTrue(durations.max() == maximum_duration)
+
+        # timezone-aware columns are held as UTC and come back in their timezone
+        df = self.ds_activity._df[['activity_start', 'activity_end']].apply(lambda c: c.dt.tz_localize('Etc/GMT+5'))
+        offset = ActivityArray.from_df(df).offset(pd.to_timedelta(5, unit='Min')).to_df()
+        pd.testing.assert_series_equal(offset['activity_start'], df['activity_start'] + pd.to_timedelta(5, unit='Min'))
+        pd.testing.assert_series_equal(offset['activity_end'], df['activity_end'])
+
+
+# in a script file
+if __name__ == '__main__':
+    unittest.main()
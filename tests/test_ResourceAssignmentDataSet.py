@@ -63,6 +63,47 @@ class TestResourceAssignmentDataSet(unittest.TestCase):
         ds_resources.limit_by_list('assignment', self.ps_dictionary.keys())
         self.assertIsInstance(ds_resources, ResourceAssignmentDataSet)
 
+    def test_generate_capacity_sweep_matches_slots(self):
+        ds_resources = pytiva.staffing.ResourceAssignmentDataSet(self.df_staffing_data_long)
+        ds_resources.limit_by_list('assignment', self.ps_dictionary.keys())
+        for freq in ['1H', '15Min']:
+            swept = ds_resources.generate_capacity_tsds(self.ps_dictionary, freq=freq)
+            slotted = ds_resources.generate_capacity_tsds(self.ps_dictionary, freq=freq, engine='slots')
+            pd.testing.assert_frame_equal(swept._df, slotted._df, check_freq=False)
+
+    def test_generate_capacity_misaligned_and_empty_shifts(self):
+        ps_dictionary = {
+            'early': ProviderShift(pd.to_timedelta('7H10Min'), pd.to_timedelta('8H20Min'), label='early'),
+            'late': ProviderShift(pd.to_timedelta('12H45Min'), pd.to_timedelta('9H'), label='late', capacity=0.5)
+        }
+        ds_resources = ResourceAssignmentDataSet(pd.DataFrame({
+            'assignment': ['early', 'late', 'early'],
+            'date': pd.to_datetime(['2021-10-01', '2021-10-01', '2021-10-02'])
+        }))
+
+        for freq in ['1H', '15Min', '7Min']:
+            swept = ds_resources.generate_capacity_tsds(ps_dictionary, freq=freq)
+            slotted = ds_resources.generate_capacity_tsds(ps_dictionary, freq=freq, engine='slots')
+            pd.testing.assert_frame_equal(swept._df, slotted._df, check_freq=False)
+
+        # slots run from each shift's start, as many as fit whole; on the hourly grid from 07:10, the late shift's
+        # slots (at 45 minutes past) are not counted
+        capacity = ds_resources.generate_capacity_tsds(ps_dictionary, freq='1H')['capacity']
+        self.assertEqual(capacity[pd.Timestamp('2021-10-01 07:10')], 1)
+        self.assertEqual(capacity[pd.Timestamp('2021-10-01 14:10')], 1)
+        self.assertEqual(capacity[pd.Timestamp('2021-10-01 15:10')], 0)
+
+        # shifts without a whole slot give no capacity
+        ps_dictionary['empty'] = ProviderShift(pd.to_timedelta('7H'), pd.to_timedelta('0H'), label='empty')
+        ds_empty = ResourceAssignmentDataSet(pd.DataFrame({'assignment': ['empty'],
+                                                           'date': pd.to_datetime(['2021-10-01'])}))
+        for engine in ['sweep', 'slots']:
+            self.assertEqual(len(ds_empty.generate_capacity_tsds(ps_dictionary, engine=engine)._df), 0)
+
+        ds_resources.limit_to_ps_in_dict({})
+        for engine in ['sweep', 'slots']:
+            self.assertEqual(len(ds_resources.generate_capacity_tsds(ps_dictionary, engine=engine)._df), 0)
+
 
 # in a script file
 if __name__ == '__main__':
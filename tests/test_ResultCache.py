@@ -0,0 +1,76 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+# local module to be tested
+from pytiva.activity import ActivityDataSet
+from pytiva.utils import ResultCache, content_fingerprint
+
+# local test config
+import testconfig
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.df_activity_test_data = pd.read_csv(
+            os.path.join(testconfig.WD, testconfig.TESTDATA['DS_ACTIVITY']),
+            parse_dates=['activity_start', 'activity_end']
+        )
+        self.ds_activity = ActivityDataSet(self.df_activity_test_data)
+        self.ds_activity._result_cache = ResultCache()
+
+    def test_fingerprint_follows_content(self):
+        df = self.df_activity_test_data
+        self.assertEqual(content_fingerprint(df, 'a'), content_fingerprint(df.copy(), 'a'))
+        self.assertNotEqual(content_fingerprint(df, 'a'), content_fingerprint(df, 'b'))
+        self.assertNotEqual(content_fingerprint(df), content_fingerprint(df.iloc[1:]))
+
+        # arrays nested in containers are hashed by value, not by their truncated repr
+        values = np.arange(10000)
+        changed = values.copy()
+        changed[5000] = -1
+        self.assertNotEqual(content_fingerprint([values]), content_fingerprint([changed]))
+        self.assertNotEqual(content_fingerprint({'a': values}), content_fingerprint({'a': changed}))
+        self.assertEqual(content_fingerprint({'a': 1, 'b': [values]}), content_fingerprint({'b': [values], 'a': 1}))
+
+    def test_caching_is_opt_in(self):
+        ds_activity = ActivityDataSet(self.df_activity_test_data)
+        self.assertIsNone(ds_activity._result_cache)
+
+    def test_repeated_calls_hit_and_return_copies(self):
+        cache = self.ds_activity._result_cache
+        ts_first = self.ds_activity.concurrency_ts()
+        ts_first.iloc[0, 0] = -1
+
+        ts_second = self.ds_activity.concurrency_ts()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertNotEqual(ts_second.iloc[0, 0], -1)
+
+        self.ds_activity.fetch_unduplicated_concurrency(strata=['case_id'])
+        self.ds_activity.fetch_unduplicated_concurrency(strata=['case_id'])
+        self.ds_activity.fetch_unduplicated_concurrency(strata=['activity'])
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+
+        # changing the data changes the fingerprint
+        self.ds_activity.remove_activities(self.ds_activity['activity'] == 'medication')
+        self.ds_activity.concurrency_ts()
+        self.assertEqual(cache.misses, 4)
+
+    def test_memory_budget_and_disk_tier(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.ds_activity._result_cache = ResultCache(memory_budget=0, cache_dir=cache_dir)
+            ds_unduplicated = self.ds_activity.fetch_unduplicated_concurrency(strata=['case_id'])
+            self.assertEqual(len(self.ds_activity._result_cache), 0)
+
+            self.ds_activity._result_cache = ResultCache(cache_dir=cache_dir)
+            ds_from_disk = self.ds_activity.fetch_unduplicated_concurrency(strata=['case_id'])
+            self.assertEqual(self.ds_activity._result_cache.disk_hits, 1)
+            self.assertTrue(ds_from_disk._df.equals(ds_unduplicated._df))
+
+
+# in a script file
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,11 @@
 import unittest
 import os
+import numpy as np
 import pandas as pd
 
 # local module to be tested
-from pytiva.activity import ActivityDataSet
+from pytiva.activity import ActivityDataSet, ConcurrencyDeltaMap, WeeklyProfileAccumulator, WeeklyQuantileSketch, \
+    value_between_row_values, iter_chunked_concurrency, concurrent_weekly_activity
 
 # local test config
 import testconfig
@@ -27,6 +29,445 @@ class TestActivityTimeSeries(unittest.TestCase):
         ts_concurrency = self.ds_activity.concurrency_ts()
         self.assertTrue(all(ts_concurrency == self.ts_concurrency_test_data))
 
+    def test_sweep_concurrency_matches_apply(self):
+        ds_subset = ActivityDataSet(self.df_activity_test_data[:150])
+        for include_left, include_right in [(True, False), (False, True), (True, True), (False, False)]:
+            kwargs = {'include_left': include_left, 'include_right': include_right}
+            ts_sweep = ds_subset.concurrency_ts(**kwargs)
+            ts_apply = ds_subset.concurrency_ts(
+                engine='apply', mp=False,
+                func=lambda row, value, left, right: value_between_row_values(row, value, left, right, **kwargs)
+            )
+            pd.testing.assert_frame_equal(ts_sweep, ts_apply)
+
+    def test_interval_index_matches_scan(self):
+        df = self.ds_activity._df
+        starts, ends = df['activity_start'], df['activity_end']
+        for ts in df['activity_start'].sample(25, random_state=0):
+            expected = (starts <= ts) & (ts < ends)
+            self.assertEqual(list(self.ds_activity.active_at(ts)), list(expected.values.nonzero()[0]))
+
+            window_end = ts + pd.to_timedelta(90, unit='Min')
+            expected = (starts < window_end) & (ends > ts)
+            self.assertEqual(list(self.ds_activity.overlapping(ts, window_end)), list(expected.values.nonzero()[0]))
+
+    def test_interval_index_invalidated(self):
+        ts = self.ds_activity['activity_start'].iloc[0]
+        before = self.ds_activity.active_at(ts)
+        self.ds_activity.apply_offset(pd.to_timedelta(1, unit='D'))
+        self.ds_activity.apply_offset(pd.to_timedelta(1, unit='D'), apply_to_start=False)
+        self.assertFalse(set(before) <= set(self.ds_activity.active_at(ts)))
+
+        ds_excluded = self.ds_activity.limit_by_list('activity', ['activity A'])
+        # excluded activities are normalized as a new ActivityDataSet would be
+        self.assertTrue(ds_excluded._df.index.equals(pd.RangeIndex(len(ds_excluded._df))))
+        self.assertEqual(list(ds_excluded.columns), sorted(ds_excluded.columns))
+        df = self.ds_activity._df
+        window_end = ts + pd.to_timedelta(30, unit='D')
+        expected = (df['activity_start'] < window_end) & (df['activity_end'] > ts)
+        self.assertEqual(list(self.ds_activity.overlapping(ts, window_end)), list(expected.values.nonzero()[0]))
+
+        # replacing the start or end column, through the DataSet or on the held DataFrame, drops the index too
+        self.ds_activity.activity_start = self.ds_activity.activity_start - pd.to_timedelta(2, unit='D')
+        df = self.ds_activity._df
+        expected = (df['activity_start'] <= ts) & (ts < df['activity_end'])
+        self.assertEqual(list(self.ds_activity.active_at(ts)), list(expected.values.nonzero()[0]))
+        self.ds_activity._df['activity_end'] = self.ds_activity._df['activity_start']
+        self.assertEqual(len(self.ds_activity.active_at(ts)), 0)
+
+    def test_iter_strata_visits_observed_combinations(self):
+        df = self.ds_activity._df
+        strata = ['case_id', 'activity']
+        visited = list(self.ds_activity.iter_strata(strata))
+        self.assertEqual(len(visited), len(df.groupby(strata)))
+        self.assertEqual(sum(len(positions) for key, positions in visited), len(df))
+        for key, positions in visited[:25]:
+            expected = (df['case_id'] == key[0]) & (df['activity'] == key[1])
+            self.assertEqual(list(positions), list(expected.values.nonzero()[0]))
+
+    def test_weighted_concurrency(self):
+        df = self.ds_activity._df
+        df['effort'] = df['activity'].map({'activity A': 1.5, 'activity B': 0.5}).fillna(1.)
+        ts_weighted = self.ds_activity.concurrency_ts(weight_col='effort')['concurrent_activity_weight']
+        for ts in ts_weighted.sample(25, random_state=0).index:
+            active = (df['activity_start'] <= ts) & (ts < df['activity_end'])
+            self.assertAlmostEqual(ts_weighted[ts], df.loc[active, 'effort'].sum())
+
+        df['effort'] = 1
+        ts_counted = self.ds_activity.concurrency_ts()['concurrent_activity_count']
+        self.assertTrue(all(self.ds_activity.concurrency_ts(weight_col='effort')['concurrent_activity_weight'] ==
+                            ts_counted))
+
+    def test_chunked_concurrency_matches_in_memory(self):
+        ts_concurrency = self.ds_activity.concurrency_ts()
+        for kwargs in [{}, {'window': '7D'}, {'memory_budget': 64 * 250}]:
+            ts_chunked = pd.concat(list(self.ds_activity.iter_concurrency_chunks(**kwargs)))
+            pd.testing.assert_frame_equal(ts_chunked, ts_concurrency, check_dtype=False, check_freq=False)
+
+        df_sorted = self.df_activity_test_data.sort_values('activity_start')
+        chunks = (df_sorted.iloc[i:i + 500] for i in range(0, len(df_sorted), 500))
+        ts_chunked = pd.concat(list(iter_chunked_concurrency(chunks)))
+        pd.testing.assert_frame_equal(ts_chunked, ts_concurrency, check_dtype=False, check_freq=False)
+
+        with self.assertRaises(Exception):
+            list(iter_chunked_concurrency([df_sorted.iloc[500:], df_sorted.iloc[:500]]))
+
+        # pieces stay within the memory budget, however few activity chunks there are
+        pieces = list(self.ds_activity.iter_concurrency_chunks(window='365D', memory_budget=32 * 1000))
+        self.assertLessEqual(max(len(piece) for piece in pieces), 1000)
+        pd.testing.assert_frame_equal(pd.concat(pieces), ts_concurrency, check_dtype=False, check_freq=False)
+
+        # unduplicated chunk by chunk, the same as unduplicating everything first
+        ts_unduplicated = self.ds_activity.fetch_unduplicated_concurrency(strata=['case_id']).concurrency_ts()
+        for kwargs in [{}, {'window': '7D'}, {'memory_budget': 64 * 250}]:
+            pieces = self.ds_activity.iter_concurrency_chunks(unduplicate_by=['case_id'], **kwargs)
+            ts_chunked = pd.concat(list(pieces))
+            pd.testing.assert_frame_equal(ts_chunked, ts_unduplicated, check_dtype=False, check_freq=False)
+
+        ds_empty = ActivityDataSet(self.df_activity_test_data.iloc[:0])
+        self.assertEqual(list(ds_empty.iter_concurrency_chunks()), [])
+
+    def test_incremental_concurrency(self):
+        df_sorted = self.df_activity_test_data.sort_values('activity_start').reset_index(drop=True)
+        ds_incremental = ActivityDataSet(df_sorted[:3000])
+        ds_incremental.concurrency_deltas
+        first_added = ds_incremental.add_activities(df_sorted[3000:4000])
+        ds_incremental.add_activities(df_sorted[4000:])
+
+        # only the range the new activities can have changed is read off the delta map
+        ts_reference = self.ds_activity.concurrency_ts()
+        pd.testing.assert_frame_equal(ds_incremental.concurrency_ts(start=first_added), ts_reference[first_added:],
+                                      check_dtype=False, check_freq=False)
+        self.assertEqual(len(ds_incremental._df_pending), 2)
+        pd.testing.assert_frame_equal(ds_incremental.concurrency_ts(), ts_reference)
+        self.assertIsNone(ds_incremental._df_pending)
+
+        ds_incremental.remove_activities(ds_incremental['activity'] == 'activity B')
+        ds_rebuilt = ActivityDataSet(ds_incremental._df)
+        pd.testing.assert_frame_equal(ds_incremental.concurrency_ts(), ds_rebuilt.concurrency_ts())
+        self.assertTrue(all(ds_incremental.concurrency_deltas.levels == ds_rebuilt.concurrency_deltas.levels))
+
+        # small segments, so that adding and removing splits, rebuilds and drops them
+        deltas = ConcurrencyDeltaMap(df_sorted['activity_start'][:3000], df_sorted['activity_end'][:3000],
+                                     segment_size=64)
+        deltas.add(df_sorted['activity_start'][3000:], df_sorted['activity_end'][3000:])
+        deltas.remove(df_sorted['activity_start'][:1000], df_sorted['activity_end'][:1000])
+        deltas_rebuilt = ConcurrencyDeltaMap(df_sorted['activity_start'][1000:], df_sorted['activity_end'][1000:])
+        self.assertTrue(all(deltas.times == deltas_rebuilt.times) and all(deltas.levels == deltas_rebuilt.levels))
+
+        # missing points are not underway, as with the sweep
+        points = np.array([deltas.times[len(deltas) // 2], np.datetime64('NaT')], dtype='datetime64[ns]')
+        self.assertEqual(list(deltas.level_at(points)), [deltas.levels[len(deltas) // 2], 0])
+
+    def test_concurrency_after_editing_columns(self):
+        self.ds_activity.concurrency_ts()
+        self.ds_activity.activity_end = self.ds_activity.activity_end + pd.to_timedelta(1, unit='H')
+        ds_fresh = ActivityDataSet(self.ds_activity._df)
+        ts_fresh = ds_fresh.concurrency_ts()
+        pd.testing.assert_frame_equal(self.ds_activity.concurrency_ts(), ts_fresh)
+
+        start = ts_fresh.index[len(ts_fresh) // 2]
+        pd.testing.assert_frame_equal(self.ds_activity.concurrency_ts(start=start), ts_fresh[start:],
+                                      check_dtype=False, check_freq=False)
+
+        # changes made on the held DataFrame directly are counted by the default path too
+        self.ds_activity._df['activity_end'] = self.ds_activity._df['activity_end'] + pd.to_timedelta(1, unit='H')
+        pd.testing.assert_frame_equal(self.ds_activity.concurrency_ts(),
+                                      ActivityDataSet(self.ds_activity._df).concurrency_ts())
+
+    def test_run_length_concurrency(self):
+        ts_concurrency = self.ds_activity.concurrency_ts()
+        rl_concurrency = self.ds_activity.concurrency_ts(run_length=True)
+        self.assertLess(len(rl_concurrency), len(ts_concurrency))
+
+        dense = rl_concurrency.densify(self.ds_activity._default_resolution)
+        self.assertTrue(all(dense.values == ts_concurrency['concurrent_activity_count'].values))
+
+        for how in ['max', 'min']:
+            by_hour = rl_concurrency.resample('H', how=how)
+            expected = getattr(ts_concurrency['concurrent_activity_count'].resample('H'), how)()
+            self.assertTrue(all(by_hour.values == expected.values))
+
+        self.assertAlmostEqual(rl_concurrency.mean(freq=self.ds_activity._default_resolution),
+                               ts_concurrency['concurrent_activity_count'].mean())
+        self.assertAlmostEqual(rl_concurrency.time_weighted_mean(),
+                               ts_concurrency['concurrent_activity_count'].iloc[:-1].mean())
+
+    def test_concurrency_by_matches_slices(self):
+        ts_by_activity = self.ds_activity.concurrency_by('activity')
+        ts_concurrency = self.ds_activity.concurrency_ts()
+        self.assertTrue(all(ts_by_activity['total'].values == ts_concurrency['concurrent_activity_count'].values))
+
+        for activity in self.df_activity_test_data['activity'].unique():
+            ts_slice = ActivityDataSet(
+                self.df_activity_test_data[self.df_activity_test_data['activity'] == activity]
+            ).concurrency_ts()
+            self.assertTrue(all(
+                ts_by_activity[activity].reindex(ts_slice.index).values ==
+                ts_slice['concurrent_activity_count'].values
+            ))
+
+        # at a coarser resolution, the exact count at each timestamp
+        ts_coarse = self.ds_activity.concurrency_by('activity', resolution='7Min')
+        self.assertTrue(all(ts_coarse['total'].values ==
+                            ts_concurrency['concurrent_activity_count'].reindex(ts_coarse.index).values))
+
+    def test_concurrency_by_looks_up_strata(self):
+        df_cases = pd.read_csv(os.path.join(testconfig.WD, testconfig.TESTDATA['DS_CASES']))
+        ts_by_location = self.ds_activity.concurrency_by('location', lookup=df_cases)
+        self.assertEqual(set(ts_by_location.columns), set(df_cases['location'].unique()) | {'total'})
+
+        with self.assertRaises(Exception):
+            self.ds_activity.concurrency_by('location')
+
+    def test_exceedances_match_dense_scan(self):
+        ts_concurrency = self.ds_activity.concurrency_ts()['concurrent_activity_count']
+        df_exceedances = self.ds_activity.exceedances(10)
+
+        above = ts_concurrency > 10
+        episodes = ts_concurrency[above].groupby((above != above.shift()).cumsum()[above])
+        self.assertEqual(len(df_exceedances), len(episodes))
+        self.assertTrue(all(df_exceedances['peak'].values == episodes.max().values))
+        self.assertTrue(all(df_exceedances['start'].values == episodes.apply(lambda x: x.index[0]).values))
+
+        for _, episode in df_exceedances.iterrows():
+            df_rows = self.ds_activity._df.iloc[episode['rows']]
+            self.assertTrue(all(df_rows['activity_start'] < episode['end']))
+            self.assertTrue(all(df_rows['activity_end'] > episode['start']))
+
+    def test_peaks_are_separated(self):
+        df_peaks = self.ds_activity.peaks(5, min_separation='1D')
+        self.assertEqual(len(df_peaks), 5)
+        self.assertEqual(df_peaks['peak'].iloc[0], self.ds_activity.concurrency_ts()['concurrent_activity_count'].max())
+        self.assertTrue(all(df_peaks['peak'].values == [len(r) for r in df_peaks['rows']]))
+
+        starts = df_peaks['start'].sort_values()
+        self.assertTrue(all(starts.diff().dropna() >= pd.Timedelta('1D')))
+
+    def test_concurrency_distribution_matches_dense_series(self):
+        ts_concurrency = self.ds_activity.concurrency_ts()['concurrent_activity_count'].iloc[:-1]
+        minutes_at_level = ts_concurrency.value_counts().sort_index()
+
+        df_distribution = self.ds_activity.concurrency_distribution()
+        self.assertTrue(all(abs(df_distribution['total'].values * 60 - minutes_at_level.values) < 1e-6))
+
+        df_by_hour_of_week = self.ds_activity.concurrency_distribution(by='hour_of_week')
+        self.assertEqual(df_by_hour_of_week.shape[1], 7 * 24)
+        self.assertTrue(all(abs(df_by_hour_of_week.sum(axis=1) - df_distribution['total']) < 1e-6))
+
+        df_at_least = self.ds_activity.concurrency_distribution(by='day_of_week', normalize=True, at_least=True)
+        self.assertTrue(all(df_at_least.iloc[0] == 1))
+
+    def test_interval_set_operations(self):
+        ds_a = ActivityDataSet(pd.DataFrame({
+            'room': ['1', '1', '2'],
+            'activity_start': pd.to_datetime(['2022-01-01 08:00', '2022-01-01 09:30', '2022-01-01 08:00']),
+            'activity_end': pd.to_datetime(['2022-01-01 10:00', '2022-01-01 11:00', '2022-01-01 09:00'])
+        }))
+        ds_b = ActivityDataSet(pd.DataFrame({
+            'room': ['1', '2'],
+            'activity_start': pd.to_datetime(['2022-01-01 10:30', '2022-01-01 08:30']),
+            'activity_end': pd.to_datetime(['2022-01-01 12:00', '2022-01-01 08:45'])
+        }))
+
+        def spans(ds):
+            return [(r, str(s.time()), str(e.time())) for r, s, e in
+                    ds[['room', 'activity_start', 'activity_end']].itertuples(index=False, name=None)]
+
+        self.assertEqual(spans(ds_a.union(ds_b, by=['room'])),
+                         [('1', '08:00:00', '12:00:00'), ('2', '08:00:00', '09:00:00')])
+        self.assertEqual(spans(ds_a.intersect(ds_b, by=['room'])),
+                         [('1', '10:30:00', '11:00:00'), ('2', '08:30:00', '08:45:00')])
+        self.assertEqual(spans(ds_a.subtract(ds_b, by=['room'])),
+                         [('1', '08:00:00', '10:30:00'), ('2', '08:00:00', '08:30:00'), ('2', '08:45:00', '09:00:00')])
+        self.assertEqual(spans(ds_b.complement(within=('2022-01-01 08:00', '2022-01-01 13:00'), by=['room'])),
+                         [('1', '08:00:00', '10:30:00'), ('1', '12:00:00', '13:00:00'),
+                          ('2', '08:00:00', '08:30:00'), ('2', '08:45:00', '13:00:00')])
+
+        df_activity_a = self.df_activity_test_data[self.df_activity_test_data['activity'] == 'activity A']
+        ds_activity_a = ActivityDataSet(df_activity_a)
+        ds_idle = ds_activity_a.complement()
+        self.assertEqual(len(ds_idle.intersect(ds_activity_a)._df), 0)
+        self.assertEqual(ds_idle.union(ds_activity_a)._df.shape[0], 1)
+
+    def test_overlap_join_matches_cross_merge(self):
+        df_meds = self.df_activity_test_data[self.df_activity_test_data['activity'] == 'medication']
+        df_other = self.df_activity_test_data[self.df_activity_test_data['activity'] != 'medication']
+        ds_meds, ds_other = ActivityDataSet(df_meds), ActivityDataSet(df_other)
+
+        df_cross = ds_other._df.assign(row=range(len(ds_other._df))).merge(
+            ds_meds._df, how='cross', suffixes=('_left', '_right'))
+        df_cross = df_cross[
+            (df_cross['activity_start_left'] < df_cross['activity_end_right']) &
+            (df_cross['activity_start_right'] < df_cross['activity_end_left']) &
+            (df_cross['activity_start_left'] < df_cross['activity_end_left']) &
+            (df_cross['activity_start_right'] < df_cross['activity_end_right'])
+        ]
+
+        def pairs(df):
+            return sorted(zip(df['activity_start_left'], df['activity_end_left'], df['activity_start_right'],
+                              df['activity_end_right'], df['case_id_left'], df['case_id_right']))
+
+        df_joined = ds_other.overlap_join(ds_meds)
+        self.assertEqual(pairs(df_joined), pairs(df_cross))
+        self.assertTrue(all(df_joined['overlap_duration'] > pd.Timedelta(0)))
+
+        df_joined_by_case = ds_other.overlap_join(ds_meds, on=['case_id'])
+        df_cross_by_case = df_cross[df_cross['case_id_left'] == df_cross['case_id_right']]
+        self.assertEqual(len(df_joined_by_case), len(df_cross_by_case))
+
+        df_left_joined = ds_other.overlap_join(ds_meds, on=['case_id'], how='left')
+        unmatched = df_left_joined['overlap_start'].isna()
+        self.assertEqual(len(df_left_joined) - unmatched.sum(), len(df_joined_by_case))
+        self.assertEqual(unmatched.sum(), len(ds_other._df) - df_cross_by_case['row'].nunique())
+
+    def test_concurrency_pyramid_keeps_extremes(self):
+        ts_concurrency = self.ds_activity.concurrency_ts()['concurrent_activity_count']
+        pyramid = self.ds_activity.concurrency_pyramid()
+
+        df_hourly = pyramid.level('H')
+        self.assertTrue(all(df_hourly['max'].values == ts_concurrency.resample('H').max().values))
+        self.assertTrue(all(df_hourly['min'].values == ts_concurrency.resample('H').min().values))
+
+        df_year = pyramid.query(max_points=500)
+        self.assertEqual(df_year.attrs['freq'], 'D')
+        self.assertEqual(df_year['max'].max(), ts_concurrency.max())
+
+        df_minutes = pyramid.query('2021-11-01 10:00', '2021-11-01 12:00', max_points=500)
+        self.assertIsNone(df_minutes.attrs['freq'])
+
+    def test_enforce_maximum_duration_by_group(self):
+        df_cases = pd.read_csv(os.path.join(testconfig.WD, testconfig.TESTDATA['DS_CASES']))
+        durations = self.ds_activity['duration'].copy()
+        df_keys = self.df_activity_test_data.merge(df_cases.drop_duplicates('case_id')[['case_id', 'location']],
+                                                   how='left', on='case_id')
+        limits = durations.groupby([df_keys['activity'], df_keys['location']], dropna=False) \
+            .transform(lambda d: d.quantile(0.9))
+
+        self.ds_activity.enforce_maximum_duration(by=['activity', 'location'], quantile=0.9, lookup=df_cases)
+        self.assertTrue((self.ds_activity['duration'] == durations.where(durations <= limits, limits)).all())
+
+        # per-group limits given directly; groups without one stay as they were
+        self.ds_activity.enforce_maximum_duration({'medication': '5Min'}, by='activity')
+        max_durations = self.ds_activity._df.groupby('activity')['duration'].max()
+        self.assertEqual(max_durations['medication'], pd.to_timedelta(5, unit='Min'))
+        self.assertGreater(max_durations['activity A'], pd.to_timedelta(5, unit='Min'))
+
+    def test_offset_and_maximum_duration_keep_timezone(self):
+        df = self.df_activity_test_data.copy()
+        for column in ['activity_start', 'activity_end']:
+            df[column] = df[column].dt.tz_localize('Etc/GMT+5')
+        ds_activity = ActivityDataSet(df)
+
+        ds_activity.apply_offset(pd.to_timedelta(2, unit='Min'))
+        ds_activity.enforce_maximum_duration('5Min')
+        pd.testing.assert_series_equal(ds_activity['activity_start'],
+                                       df['activity_start'] + pd.to_timedelta(2, unit='Min'))
+        self.assertEqual(str(ds_activity['activity_end'].dt.tz), 'Etc/GMT+5')
+        self.assertTrue((ds_activity['duration'] <= pd.to_timedelta(5, unit='Min')).all())
+
+    def test_distinct_concurrency_matches_unduplication(self):
+        df = self.df_activity_test_data.copy()
+        # a touching pair within one case, and an activity without a case
+        touching = {'activity': 'activity A', 'activity_start': df['activity_end'][0],
+                    'activity_end': df['activity_end'][0] + pd.to_timedelta(9, unit='Min'), 'case_id': df['case_id'][0]}
+        df.loc[len(df)] = pd.Series(touching)
+        df.loc[1, 'case_id'] = None
+        ds_activity = ActivityDataSet(df)
+
+        for key in ['case_id', ['case_id', 'activity']]:
+            strata = [key] if isinstance(key, str) else key
+            two_step = ds_activity.fetch_unduplicated_concurrency(strata=strata).concurrency_ts()
+            pd.testing.assert_frame_equal(ds_activity.distinct_concurrency(key), two_step)
+
+        run_length = ds_activity.distinct_concurrency(run_length=True)
+        self.assertEqual(run_length.max(), ds_activity.distinct_concurrency().max().iloc[0])
+
+    def test_overlap_matrix_matches_minute_masks(self):
+        ds_activity = ActivityDataSet(self.df_activity_test_data[:400])
+        matrix = ds_activity.overlap_matrix(by='activity', within='case_id')
+
+        expected = pd.DataFrame(0.0, index=matrix.index, columns=matrix.columns)
+        for case_id, df_case in ds_activity._df.groupby('case_id'):
+            minutes = pd.date_range(df_case['activity_start'].min(), df_case['activity_end'].max(), freq='1Min')
+            masks = {activity: np.zeros(len(minutes), dtype=bool) for activity in matrix.index}
+            for activity, start, end in df_case[['activity', 'activity_start', 'activity_end']].values:
+                masks[activity] |= (minutes >= start) & (minutes < end)
+            for a in masks:
+                for b in masks:
+                    expected.loc[a, b] += (masks[a] & masks[b]).sum() / 60
+
+        self.assertTrue(np.allclose(matrix.values, expected.values))
+
+        by_row = ds_activity.overlap_matrix(normalize='row')
+        self.assertTrue(np.allclose(np.diag(by_row), 1))
+        self.assertTrue(np.allclose(by_row.values, matrix.values / np.diag(matrix)[:, None]))
+
+    def test_binned_concurrency_is_exact(self):
+        counts = self.ds_activity.concurrency_ts()['concurrent_activity_count']
+        # minute-level counts are exact for this data; nothing is underway outside of them
+        days = pd.date_range(counts.index.min().normalize(), counts.index.max().normalize() + pd.Timedelta('1D'),
+                             freq='1Min', inclusive='left')
+        counts = counts.reindex(days, fill_value=0)
+
+        for resolution in ['15Min', 'H']:
+            binned = self.ds_activity.concurrency_ts(resolution=resolution, how=['mean', 'max', 'min'])
+            expected = counts.resample(resolution).agg(['mean', 'max', 'min']).loc[binned.index]
+            self.assertTrue(np.allclose(binned.values, expected.values))
+
+        hourly_mean = self.ds_activity.concurrency_ts(resolution='H', how='mean')
+        self.assertEqual(list(hourly_mean.columns), ['concurrent_activity_count'])
+        self.assertTrue(np.allclose(hourly_mean.values[:, 0], binned['mean'].values))
+
+        with self.assertRaises(Exception):
+            self.ds_activity.concurrency_ts(run_length=True, how='mean')
+
+    def test_weekly_profile_accumulator_matches_groupby(self):
+        ts_concurrency = self.ds_activity.concurrency_ts()
+        df_weekly = concurrent_weekly_activity(ts_concurrency)
+
+        accumulator = WeeklyProfileAccumulator()
+        for i in range(0, len(ts_concurrency), 20000):
+            accumulator.update(ts_concurrency.iloc[i:i + 20000])
+        self.assertTrue(((accumulator.mean_table() - df_weekly).abs() < 1e-9).all().all())
+
+        merged = WeeklyProfileAccumulator().update(ts_concurrency.iloc[:70000])
+        merged.merge(WeeklyProfileAccumulator().update(ts_concurrency.iloc[70000:]))
+        self.assertTrue(((merged.std_table() - accumulator.std_table()).abs() < 1e-9).all().all())
+        self.assertEqual(merged.n_table().values.sum(), len(ts_concurrency))
+
+    def test_weekly_quantile_sketch_matches_groupby(self):
+        ts_concurrency = self.ds_activity.concurrency_ts()
+        sketch = WeeklyQuantileSketch(cell_minutes=60)
+        for ts_chunk in self.ds_activity.iter_concurrency_chunks():
+            sketch.update(ts_chunk)
+
+        merged = WeeklyQuantileSketch(cell_minutes=60).update(ts_concurrency.iloc[:70000])
+        merged.merge(WeeklyQuantileSketch(cell_minutes=60).update(ts_concurrency.iloc[70000:]))
+
+        counts = ts_concurrency['concurrent_activity_count']
+        by_cell = counts.groupby([counts.index.hour * 60, counts.index.day_name()])
+        for q in [0.5, 0.95]:
+            df_expected = by_cell.quantile(q).unstack()[sketch.quantile_table(q).columns]
+            self.assertTrue(((sketch.quantile_table(q).values - df_expected.values) == 0).all())
+            self.assertTrue(((merged.quantile_table(q).values - df_expected.values) == 0).all())
+
+        with self.assertRaises(Exception):
+            merged.merge(WeeklyQuantileSketch(cell_minutes=15))
+
+        # with a wide range of values, bins are merged to stay within max_bins, and quantiles stay within a bin width
+        rng = np.random.default_rng(0)
+        wide = pd.Series(rng.integers(-5000, 20000, len(counts)) * 1.5, index=counts.index)
+        bounded = WeeklyQuantileSketch(cell_minutes=60, max_bins=64).update(wide.iloc[:70000])
+        bounded.merge(WeeklyQuantileSketch(cell_minutes=60, max_bins=64).update(wide.iloc[70000:] / 100))
+        self.assertLessEqual(bounded.counts.shape[1], 64)
+        self.assertEqual(bounded.n_table().values.sum(), len(wide))
+
+        exact = pd.concat([wide.iloc[:70000], wide.iloc[70000:] / 100])
+        by_wide_cell = exact.groupby([exact.index.hour * 60, exact.index.day_name()])
+        df_expected = by_wide_cell.quantile(0.9).unstack()[bounded.quantile_table(0.9).columns]
+        self.assertTrue((np.abs(bounded.quantile_table(0.9).values - df_expected.values) <= bounded.width).all())
+
 
 # in a script file
 if __name__ == '__main__':
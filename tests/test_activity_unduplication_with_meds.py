@@ -29,6 +29,22 @@ class TestActivityTimeSeries(unittest.TestCase):
 
         self.assertTrue(all(big_df == self.unduplicated_med_activity_by_case_df))
 
+    def test_merge_engine_matches_concurrency_engine(self):
+        three_minutes = pd.to_timedelta(3, unit='Min')
+        ads = self.med_ds.to_activity_dataset(offset_before=three_minutes, offset_after=three_minutes)
+        merged = ads.fetch_unduplicated_concurrency(strata=['case_id'])
+        from_concurrency = ads.fetch_unduplicated_concurrency(strata=['case_id'], engine='concurrency')
+        pd.testing.assert_frame_equal(merged._df, from_concurrency._df)
+
+    def test_merge_gap(self):
+        three_minutes = pd.to_timedelta(3, unit='Min')
+        merge_gap = pd.to_timedelta(30, unit='Min')
+        ads = self.med_ds.to_activity_dataset(offset_before=three_minutes, offset_after=three_minutes)
+        ads._df['case_id'] = 'single stratum'
+        gapped = ads.fetch_unduplicated_concurrency(strata=['case_id'], merge_gap=merge_gap)._df
+        self.assertTrue(len(gapped) < len(ads.fetch_unduplicated_concurrency(strata=['case_id'])._df))
+        self.assertTrue(all(gapped['activity_start'].iloc[1:].values - gapped['activity_end'].iloc[:-1].values > merge_gap))
+
     def test_meds_to_activity_dataset(self):
         """
         Test that a meds dataset will be appropriately converted to an activity dataset across a small range of
@@ -4,7 +4,7 @@ import os
 import pandas as pd
 
 # local module to be tested
-from pytiva.anesthesia import AnesthesiaCaseEventsDataSet
+from pytiva.anesthesia import AnesthesiaCaseEventsDataSet, AnesthesiaCaseDataSet, EventActivityDefinition
 from pytiva.activity import ActivityDataSet
 
 # local test config
@@ -33,6 +33,21 @@ class TestAnesthesiaCaseEventsDataSet(unittest.TestCase):
         ads_ref_df = ActivityDataSet(pd.read_csv(os.path.join(testconfig.WD, testconfig.TESTDATA['ADS_EVENTS_ONLY'])))._df
         self.assertTrue(all(activity_df == ads_ref_df))
 
+    def test_definition_caps_duration_by_case_column(self):
+        ds = AnesthesiaCaseEventsDataSet(self.df_ref)
+        ds_cases = AnesthesiaCaseDataSet(pd.read_csv(os.path.join(testconfig.WD, testconfig.TESTDATA['DS_CASES'])))
+        h = open(os.path.join(testconfig.WD, testconfig.TESTDATA['EVENT_BASED_ACTIVITY_DEFINITIONS']), "r")
+        definition = json.load(h)[0]
+        h.close()
+
+        uncapped = EventActivityDefinition(**definition).apply_to_ds(ds)
+        capped = EventActivityDefinition(max_duration_quantile=0.5, max_duration_by=['location'],
+                                         **definition).apply_to_ds(ds, ds_cases=ds_cases)
+        self.assertEqual(len(capped._df), len(uncapped._df))
+        self.assertTrue((capped['duration'] <= uncapped['duration']).all())
+        self.assertTrue((capped['duration'] < uncapped['duration']).any())
+        self.assertNotIn('location', capped._df.columns)
+
 
 # in a script file
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
 import unittest
 import json
 import os
+import pandas as pd
 
 # local module to be tested
 from pytiva.anesthesia import datasets_from_csv_data, AnesthesiaStudy
@@ -42,6 +43,22 @@ class TestAnesthesiaStudy(unittest.TestCase):
         study.process_study_config(comp['CONFIG'])
         self.assertTrue(study._member_ds_and_counts == comp['MEMBERS'])
 
+    def test_fused_unduplicate_concurrency(self):
+        datasets = datasets_from_csv_data(testconfig.TESTDATA_CSV_DICT_FOR_DATASETS)
+        study = AnesthesiaStudy(**datasets)
+        three_minutes = pd.to_timedelta(3, unit='Min')
+        study.ds_activity = study.ds_case_meds.to_activity_dataset(offset_before=three_minutes,
+                                                                   offset_after=three_minutes)
+
+        two_step = study.unduplicate_concurrency()
+        pd.testing.assert_frame_equal(study.unduplicate_concurrency(fused=True), two_step)
+
+        with self.assertRaises(Exception):
+            study.unduplicate_concurrency(fused=True, engine='apply')
+
+        ts_chunked = pd.concat(list(study.iter_unduplicated_concurrency(window='7D')))
+        pd.testing.assert_frame_equal(ts_chunked, two_step, check_dtype=False, check_freq=False)
+
 
 # in a script file
 if __name__ == '__main__':
@@ -1,9 +1,10 @@
 import unittest
 import os
+import numpy as np
 import pandas as pd
 
 # local module to be tested
-from pytiva.dataset import DataSet
+from pytiva.dataset import DataSet, TimeSeriesDataSet, RunLengthSeries
 
 # local test config
 import testconfig
@@ -56,6 +57,49 @@ class TestDataSet(unittest.TestCase):
         ds = DataSet(self.df_ref, index_column=index_column)
         self.assertTrue(ds.index.name == index_column)
 
+    def test_from_validated_wraps_without_copying(self):
+        ds = DataSet(self.df_ref)
+        ds_wrapped = DataSet.from_validated(ds._df)
+        self.assertIs(ds_wrapped._df, ds._df)
+
+        ds_excluded = ds.limit_by_list('activity', ['activity A'])
+        self.assertIsInstance(ds_excluded, DataSet)
+        self.assertEqual(len(ds_excluded._df) + len(ds._df), len(self.df_ref))
+        self.assertFalse(any(ds_excluded['activity'] == 'activity A'))
+
+        # mutable attributes are copied rather than shared with the derived object
+        ds.notes = ['kept']
+        ds_excluded = ds.limit_by_list('activity', [])
+        ds_excluded.notes.append('excluded only')
+        self.assertEqual(ds.notes, ['kept'])
+
+    def test_run_length_time_series_densifies_to_dense(self):
+        data = pd.DataFrame(
+            {'capacity': [1, 2, 2, 0, 3]},
+            index=pd.to_datetime(['2023-01-01 00:05', '2023-01-01 00:06', '2023-01-01 00:07', '2023-01-01 00:20',
+                                  '2023-01-01 01:00'])
+        )
+        tsds_dense = TimeSeriesDataSet(data, start_dt='2023-01-01', end_dt='2023-01-01 02:00')
+        tsds_run_length = TimeSeriesDataSet(data, start_dt='2023-01-01', end_dt='2023-01-01 02:00', run_length=True)
+        self.assertEqual(len(tsds_run_length._df), 6)
+        pd.testing.assert_frame_equal(tsds_run_length.densify(), tsds_dense._df, check_freq=False)
+
+        hourly_max = tsds_run_length.to_run_length('capacity').resample('H', how='max')
+        self.assertEqual(list(hourly_max.values), [2, 3, 0])
+
+    def test_run_length_rolling_matches_dense_rolling(self):
+        values = np.repeat(np.random.default_rng(0).integers(0, 9, 500), 7)
+        dense = pd.Series(values, index=pd.date_range('2023-01-01', periods=len(values), freq='T'))
+        series = RunLengthSeries.from_series(dense)
+
+        # windows [t - window, t) hold the dense samples up to, but not including, t
+        rolling_max = series.rolling_max('30Min')
+        self.assertTrue(all(rolling_max.values == dense.rolling('30Min').max().shift(1).iloc[1:].values))
+
+        rolling_mean = series.rolling_mean('2H', stride='15Min')
+        expected = dense.rolling('2H').mean().shift(1).reindex(rolling_mean.index)
+        self.assertTrue(np.allclose(rolling_mean.values, expected.values))
+
 
 # in a script file
 if __name__ == '__main__':
@@ -0,0 +1,107 @@
+import unittest
+import os
+import pickle
+import pandas as pd
+
+# local module to be tested
+from pytiva.activity import ActivityDataSet
+from pytiva.parallel import Executor, SharedFrame, EXECUTOR, PROCESS_EXECUTOR
+from pytiva.utils import hash_cols_in_df
+from pytiva.viz import activity_data_to_gantt_data, activity_data_to_gantt_data_by
+
+# local test config
+import testconfig
+
+
+def _frame_summary(args):
+    frame, column = args
+    df = frame.to_df()
+    return len(df), df[column].iloc[-1]
+
+
+class TestParallel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.executors = [Executor('serial'), Executor('thread', n_workers=2), Executor('process', n_workers=2)]
+
+    @classmethod
+    def tearDownClass(cls):
+        for executor in cls.executors + [PROCESS_EXECUTOR]:
+            executor.close()
+
+    def setUp(self):
+        self.df_activity_test_data = pd.read_csv(
+            os.path.join(testconfig.WD, testconfig.TESTDATA['DS_ACTIVITY']),
+            parse_dates=['activity_start', 'activity_end']
+        )
+        self.ds_activity = ActivityDataSet(self.df_activity_test_data)
+
+    def test_map_keeps_order(self):
+        for executor in self.executors:
+            self.assertEqual(executor.map(abs, range(-50, 50)), [abs(i) for i in range(-50, 50)])
+
+        with self.assertRaises(Exception):
+            Executor('gpu')
+
+        # parallel work is opt-in
+        self.assertFalse(EXECUTOR.parallel)
+
+    def test_shared_frame_round_trip(self):
+        df = self.ds_activity._df.copy()
+        df['activity'] = df['activity'].astype('category')
+        df.loc[3, 'case_id'] = None
+
+        with SharedFrame(df) as frame:
+            self.assertEqual(len(frame), len(df))
+            pd.testing.assert_frame_equal(frame.to_df(), df)
+
+            # distinct values travel in shared memory too, so tasks carry no data however many there are
+            labels = pd.DataFrame({'label': [f'label {i}' for i in range(10000)]})
+            with SharedFrame(labels) as label_frame:
+                self.assertLess(len(pickle.dumps(label_frame)), 1000)
+
+            executor = self.executors[2]
+            for column in df.columns:
+                rows, last = executor.map(_frame_summary, [(frame, column), (frame, column)])[0]
+                self.assertEqual((rows, last), (len(df), df[column].iloc[-1]))
+
+    def test_workloads_match_serial(self):
+        ds_subset = ActivityDataSet(self.df_activity_test_data[:60])
+        self.ds_activity = ActivityDataSet(self.df_activity_test_data[:120])
+        ts_sweep = ds_subset.concurrency_ts()
+        cc_serial = self.ds_activity.concurrency_by(['activity', 'case_id'])
+        unduplicated = self.ds_activity.fetch_unduplicated_concurrency(strata=['case_id'])
+        gantt_expected = {case_id: activity_data_to_gantt_data(df)
+                          for case_id, df in self.ds_activity._df.groupby('case_id', sort=False)}
+
+        # mp=True (the default) starts one process pool and keeps it for later calls
+        pd.testing.assert_frame_equal(ds_subset.concurrency_ts(engine='apply'), ts_sweep)
+        pool = PROCESS_EXECUTOR._pool
+        pd.testing.assert_frame_equal(ds_subset.concurrency_ts(engine='apply'), ts_sweep)
+        self.assertIs(PROCESS_EXECUTOR._pool, pool)
+
+        for executor in self.executors[1:]:
+            ts_apply = ds_subset.concurrency_ts(engine='apply', executor=executor)
+            pd.testing.assert_frame_equal(ts_apply, ts_sweep)
+
+            cc_parallel = self.ds_activity.concurrency_by(['activity', 'case_id'], executor=executor)
+            pd.testing.assert_frame_equal(cc_parallel, cc_serial)
+
+            from_concurrency = self.ds_activity.fetch_unduplicated_concurrency(strata=['case_id'],
+                                                                               engine='concurrency',
+                                                                               executor=executor)
+            pd.testing.assert_frame_equal(from_concurrency._df, unduplicated._df)
+
+            gantt_by_case = activity_data_to_gantt_data_by(self.ds_activity._df, executor=executor)
+            self.assertEqual(list(gantt_by_case), list(gantt_expected))
+            for case_id, df_gantt in gantt_expected.items():
+                pd.testing.assert_frame_equal(gantt_by_case[case_id], df_gantt)
+
+            df_hashed = hash_cols_in_df(self.ds_activity._df, ['case_id'], executor=executor)
+            self.assertEqual(df_hashed['case_id'].nunique(), self.ds_activity['case_id'].nunique())
+
+
+# in a script file
+if __name__ == '__main__':
+    unittest.main()